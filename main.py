@@ -7,14 +7,24 @@ from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQu
 
 from src.config.settings import settings
 from src.database.models import db
+from src.database.request_log import request_log
+from src.services.server_registry import server_registry
 from src.bot.handlers.start import start_command
-from src.bot.handlers.config import handle_phone_config, handle_laptop_config, handle_router_config
+from src.bot.handlers.config import (
+    handle_phone_config,
+    handle_laptop_config,
+    handle_router_config,
+    handle_all_devices_config
+)
 from src.bot.handlers.admin import (
     stats_command, users_command, reboot_command,
     handle_stats, handle_users, handle_reboot_server,
-    handle_reboot_confirm, handle_reboot_cancel
+    handle_reboot_confirm, handle_reboot_cancel,
+    handle_users_page, USERS_PAGE_CALLBACK,
+    handle_pool_stats, POOL_STATS_CALLBACK
 )
 from src.bot.filters import authorized_users_filter, admin_filter
+from src.bot.jobs import consistency_check_job, maintenance_job, peer_sync_job
 from src.utils.logger import logger
 
 
@@ -25,7 +35,8 @@ async def post_init(application: Application) -> None:
     Args:
         application: Экземпляр приложения
     """
-    # Инициализируем базу данных
+    # Открываем пул подключений и инициализируем базу данных
+    await db.open()
     await db.init_db()
     logger.info("База данных инициализирована")
     
@@ -37,9 +48,30 @@ async def post_init(application: Application) -> None:
         logger.error(f"Ошибка валидации настроек: {e}")
         raise
     
+    # Сверяем локальную генерацию ключей с wg pubkey основного сервера
+    await server_registry.default.verify_local_keygen()
+    logger.info(f"Серверов AmneziaWG: {len(server_registry)}, размещение: {server_registry.policy}")
+    
     logger.info("Бот успешно запущен")
 
 
+async def post_shutdown(application: Application) -> None:
+    """
+    Освобождение ресурсов при остановке бота
+    
+    Args:
+        application: Экземпляр приложения
+    """
+    # Записываем отложенные изменения и закрываем сессии со всеми серверами
+    await server_registry.close()
+    
+    # Записываем накопленную историю запросов и закрываем пул подключений
+    await request_log.close()
+    await db.close()
+    
+    logger.info("Бот остановлен")
+
+
 async def error_handler(update: object, context) -> None:
     """
     Обработчик ошибок
@@ -67,6 +99,7 @@ def main() -> None:
         Application.builder()
         .token(settings.BOT_TOKEN)
         .post_init(post_init)
+        .post_shutdown(post_shutdown)
         .build()
     )
     
@@ -95,6 +128,12 @@ def main() -> None:
             handle_router_config
         )
     )
+    application.add_handler(
+        MessageHandler(
+            filters.TEXT & filters.Regex("^📦 Все устройства$") & authorized_users_filter,
+            handle_all_devices_config
+        )
+    )
     
     # Регистрируем обработчики админ-кнопок
     application.add_handler(
@@ -119,6 +158,33 @@ def main() -> None:
     # Регистрируем обработчики callback query (для inline кнопок)
     application.add_handler(CallbackQueryHandler(handle_reboot_confirm, pattern="^reboot_confirm$"))
     application.add_handler(CallbackQueryHandler(handle_reboot_cancel, pattern="^reboot_cancel$"))
+    application.add_handler(CallbackQueryHandler(handle_users_page, pattern=f"^{USERS_PAGE_CALLBACK}:"))
+    application.add_handler(CallbackQueryHandler(handle_pool_stats, pattern=f"^{POOL_STATS_CALLBACK}$"))
+    
+    # Регистрируем периодические задачи
+    if settings.CONSISTENCY_CHECK_INTERVAL > 0:
+        application.job_queue.run_repeating(
+            consistency_check_job,
+            interval=settings.CONSISTENCY_CHECK_INTERVAL,
+            first=settings.CONSISTENCY_CHECK_INTERVAL,
+            name="consistency_check"
+        )
+    # Сверка peer'ов с базой в процессе бота (вместо отдельного sync_peers --watch)
+    if settings.PEER_SYNC_INTERVAL > 0:
+        application.job_queue.run_repeating(
+            peer_sync_job,
+            interval=settings.PEER_SYNC_INTERVAL,
+            first=10,
+            name="peer_sync",
+            data={}
+        )
+    # Первый запуск вскоре после старта, чтобы частые перезапуски не откладывали обслуживание
+    application.job_queue.run_repeating(
+        maintenance_job,
+        interval=settings.MAINTENANCE_INTERVAL,
+        first=60,
+        name="db_maintenance"
+    )
     
     # Регистрируем обработчик ошибок
     application.add_error_handler(error_handler)
@@ -2,15 +2,23 @@
 Обработчики админ-команд
 """
 import asyncio
+import html
+from typing import Any, Dict, Optional, Tuple
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from datetime import datetime
 
-from src.database.repository import UserRepository, ConfigRepository, RequestRepository
+from src.config.settings import settings
+from src.database.repository import UserRepository, RequestRepository
+from src.services.server_registry import server_registry
 from src.utils.logger import logger
 from src.utils.decorators import admin_only, log_action
 
 
+# callback_data кнопки статистики пулов адресов
+POOL_STATS_CALLBACK = "pool_stats"
+
+
 @admin_only
 @log_action("admin_stats")
 async def handle_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -42,7 +50,22 @@ async def handle_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
                 icon = device_icons.get(device_type, "📄")
                 stats_text += f"{icon} {device_type}: {count}\n"
         
-        await update.message.reply_text(stats_text, parse_mode='HTML')
+        if stats['requests_by_action']:
+            stats_text += "\n<b>Запросы по действиям:</b>\n"
+            for action, count in stats['requests_by_action'].items():
+                stats_text += f"• {action}: {count}\n"
+        
+        activity = await RequestRepository.get_daily_activity(7)
+        if activity:
+            stats_text += "\n<b>Запросы за 7 дней:</b>\n"
+            for day, count in activity.items():
+                stats_text += f"📅 {day}: {count}\n"
+        
+        # Пулы адресов требуют обращений к серверам - показываются по кнопке
+        reply_markup = InlineKeyboardMarkup([
+            [InlineKeyboardButton("🌐 Пулы адресов", callback_data=POOL_STATS_CALLBACK)]
+        ])
+        await update.message.reply_text(stats_text, parse_mode='HTML', reply_markup=reply_markup)
         
         logger.info(f"Статистика отправлена администратору {update.effective_user.id}")
         
@@ -55,64 +78,149 @@ async def handle_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
 
 
 @admin_only
-@log_action("admin_users")
-async def handle_users(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def handle_pool_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
-    Обработчик запроса списка пользователей
+    Обработчик кнопки статистики пулов адресов клиентов
     
     Args:
         update: Объект обновления
         context: Контекст бота
     """
+    query = update.callback_query
+    await query.answer()
+    
     try:
-        # Получаем всех пользователей
-        users = await UserRepository.get_all_users()
+        # Пулы адресов клиентов (запрашиваются со всех серверов одновременно)
+        pools = await server_registry.gather(lambda manager: manager.get_pool_stats())
         
-        if not users:
-            await update.message.reply_text("📭 Пользователей пока нет.")
-            return
+        stats_text = ""
+        for server_id, pool in pools.items():
+            if isinstance(pool, Exception):
+                logger.warning(f"Не удалось получить статистику пула адресов сервера {server_id}: {pool}")
+                stats_text += f"⚠️ Сервер {server_id} недоступен\n\n"
+                continue
+            
+            title = "Пул адресов" if len(pools) == 1 else f"Пул адресов сервера {server_id}"
+            stats_text += f"<b>{title}:</b>\n"
+            stats_text += f"🌐 Сеть: <code>{pool['network']}</code>\n"
+            stats_text += f"📦 Занято: {pool['used']} из {pool['capacity']} ({pool['utilisation']:.1%})\n"
+            stats_text += f"🧩 Фрагментация: {pool['fragmentation']:.1%}\n\n"
         
-        # Формируем сообщение
-        users_text = f"👥 <b>Список пользователей ({len(users)})</b>\n\n"
+        await query.message.reply_text(stats_text or "📭 Серверы не настроены.", parse_mode='HTML')
         
-        for user in users:
-            # Получаем конфиги пользователя
-            configs = await ConfigRepository.get_user_configs(user['id'])
-            
-            username = user['username'] or "без username"
-            user_name = user['first_name'] or "Без имени"
-            
-            users_text += f"👤 <b>{user_name}</b> (@{username})\n"
-            users_text += f"   ID: <code>{user['telegram_id']}</code>\n"
-            users_text += f"   Конфигов: {len(configs)}\n"
-            
-            if configs:
-                devices = [c['device_type'] for c in configs]
-                device_icons = {
-                    "phone": "📱",
-                    "laptop": "💻",
-                    "router": "🌐"
-                }
-                devices_str = " ".join([f"{device_icons.get(d, '📄')}{d}" for d in devices])
-                users_text += f"   Устройства: {devices_str}\n"
-            
-            # Дата регистрации
-            created_at = user.get('created_at', '')
-            if created_at:
-                users_text += f"   Создан: {created_at}\n"
-            
-            users_text += "\n"
+    except Exception as e:
+        logger.error(f"Ошибка при получении статистики пулов адресов: {e}", exc_info=True)
+        await query.message.reply_text(
+            "❌ Ошибка при получении статистики пулов адресов.\n"
+            "Попробуйте позже."
+        )
+
+
+# Максимальная длина сообщения Telegram
+MESSAGE_LIMIT = 4096
+
+# Префикс callback_data кнопок листания списка пользователей
+USERS_PAGE_CALLBACK = "users_page"
+
+
+def _format_user(user: Dict[str, Any]) -> str:
+    """
+    Блок одного пользователя в списке
+    
+    Args:
+        user: Пользователь со счетчиком конфигов и списком устройств
+        
+    Returns:
+        str: HTML текст блока
+    """
+    username = html.escape(user['username'] or "без username")
+    user_name = html.escape(user['first_name'] or "Без имени")
+    
+    text = f"👤 <b>{user_name}</b> (@{username})\n"
+    text += f"   ID: <code>{user['telegram_id']}</code>\n"
+    text += f"   Конфигов: {user['configs_count']}\n"
+    
+    if user['device_types']:
+        device_icons = {
+            "phone": "📱",
+            "laptop": "💻",
+            "router": "🌐"
+        }
+        devices_str = " ".join([f"{device_icons.get(d, '📄')}{d}" for d in user['device_types']])
+        text += f"   Устройства: {devices_str}\n"
+    
+    # Дата регистрации
+    created_at = user.get('created_at', '')
+    if created_at:
+        text += f"   Создан: {created_at}\n"
+    
+    return text + "\n"
+
+
+async def _render_users_page(
+    cursor_id: Optional[int] = None,
+    newer: bool = False
+) -> Tuple[str, Optional[InlineKeyboardMarkup]]:
+    """
+    Текст и кнопки листания одной страницы списка пользователей
+    
+    Страница всегда помещается в одно сообщение: блоки пользователей не
+    разрезаются, а не поместившиеся переходят на соседнюю страницу.
+    
+    Args:
+        cursor_id: ID пользователя, от которого строится страница
+        newer: Листание к более новым пользователям (кнопка ◀)
         
-        # Отправляем сообщение (может быть длинным)
-        if len(users_text) > 4096:
-            # Разбиваем на части
-            for i in range(0, len(users_text), 4096):
-                await update.message.reply_text(
-                    users_text[i:i+4096],
-                    parse_mode='HTML'
-                )
+    Returns:
+        Tuple[str, Optional[InlineKeyboardMarkup]]: (текст, кнопки)
+    """
+    page = await UserRepository.get_users_page(cursor_id, newer, settings.USERS_PAGE_SIZE)
+    
+    # Курсор устарел (пользователи удалены) - показываем первую страницу
+    if not page['users'] and cursor_id is not None:
+        page = await UserRepository.get_users_page(limit=settings.USERS_PAGE_SIZE)
+    
+    users = page['users']
+    if not users:
+        return "📭 Пользователей пока нет.", None
+    
+    header = f"👥 <b>Список пользователей ({page['total']})</b>\n\n"
+    blocks = [_format_user(user) for user in users]
+    
+    # Отбрасываем блоки со стороны, противоположной курсору
+    while len(blocks) > 1 and len(header) + sum(len(block) for block in blocks) > MESSAGE_LIMIT:
+        if newer:
+            blocks.pop(0)
+            users = users[1:]
+            page['has_newer'] = True
         else:
-            await update.message.reply_text(users_text, parse_mode='HTML')
+            blocks.pop()
+            users = users[:-1]
+            page['has_older'] = True
+    
+    buttons = []
+    if page['has_newer']:
+        buttons.append(InlineKeyboardButton("◀", callback_data=f"{USERS_PAGE_CALLBACK}:newer:{users[0]['id']}"))
+    if page['has_older']:
+        buttons.append(InlineKeyboardButton("▶", callback_data=f"{USERS_PAGE_CALLBACK}:older:{users[-1]['id']}"))
+    
+    reply_markup = InlineKeyboardMarkup([buttons]) if buttons else None
+    return header + "".join(blocks), reply_markup
+
+
+@admin_only
+@log_action("admin_users")
+async def handle_users(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Обработчик запроса списка пользователей (первая страница)
+    
+    Args:
+        update: Объект обновления
+        context: Контекст бота
+    """
+    try:
+        users_text, reply_markup = await _render_users_page()
+        await update.message.reply_text(users_text, parse_mode='HTML', reply_markup=reply_markup)
         
         logger.info(f"Список пользователей отправлен администратору {update.effective_user.id}")
         
@@ -124,6 +232,27 @@ async def handle_users(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         )
 
 
+@admin_only
+async def handle_users_page(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Обработчик кнопок листания списка пользователей (◀ ▶)
+    
+    Args:
+        update: Объект обновления
+        context: Контекст бота
+    """
+    query = update.callback_query
+    await query.answer()
+    
+    try:
+        _, direction, cursor_id = query.data.split(":")
+        users_text, reply_markup = await _render_users_page(int(cursor_id), newer=direction == "newer")
+        await query.edit_message_text(users_text, parse_mode='HTML', reply_markup=reply_markup)
+        
+    except Exception as e:
+        logger.error(f"Ошибка при листании списка пользователей: {e}", exc_info=True)
+
+
 @admin_only
 @log_action("admin_stats_command")
 async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
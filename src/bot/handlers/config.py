@@ -1,9 +1,11 @@
 """
 Обработчики для получения конфигураций
 """
-from telegram import Update
+from telegram import InputMediaDocument, Update
+from telegram.error import TelegramError
 from telegram.ext import ContextTypes
 
+from src.database.repository import ConfigRepository
 from src.services.config_generator import config_generator
 from src.utils.logger import logger
 from src.utils.decorators import authorized_only, log_action
@@ -49,6 +51,108 @@ async def handle_router_config(update: Update, context: ContextTypes.DEFAULT_TYP
     await _send_config(update, "router", "🌐 Роутер")
 
 
+@authorized_only
+@log_action("get_all_configs")
+async def handle_all_devices_config(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Обработчик запроса конфигов для всех устройств одним сообщением
+    
+    Args:
+        update: Объект обновления
+        context: Контекст бота
+    """
+    user = update.effective_user
+    
+    status_message = await update.message.reply_text(
+        "⏳ Генерирую конфигурации для всех устройств...\n"
+        "Это может занять несколько секунд."
+    )
+    
+    try:
+        safe_username = user.username or generate_safe_username(
+            first_name=user.first_name,
+            last_name=user.last_name,
+            telegram_id=user.id
+        )
+        
+        # Недостающие конфиги выдаются одной операцией на сервере
+        configs = await config_generator.generate_bundle(
+            telegram_id=user.id,
+            username=safe_username,
+            first_name=user.first_name,
+            last_name=user.last_name
+        )
+        
+        documents = []
+        for device_type, config in configs.items():
+            filename = _config_filename(user, device_type)
+            documents.append((config, filename, config_generator.content_hash(config['content'], filename)))
+        
+        caption = (
+            "✅ Конфигурации для всех устройств готовы!\n\n"
+            "📝 Импортируйте нужный файл в приложение AmneziaWG на каждом устройстве.\n"
+            "🔒 Храните конфигурации в безопасности."
+        )
+        
+        messages = None
+        if any(config['tg_file_hash'] == file_hash for config, _, file_hash in documents):
+            # Уже загружавшиеся файлы отправляем по file_id, остальные загружаем
+            try:
+                messages = await update.message.reply_media_group(
+                    media=[
+                        InputMediaDocument(media=config['tg_file_id'])
+                        if config['tg_file_id'] and config['tg_file_hash'] == file_hash
+                        else InputMediaDocument(media=config['content'], filename=filename)
+                        for config, filename, file_hash in documents
+                    ],
+                    caption=caption
+                )
+            except TelegramError as e:
+                logger.warning(f"Не удалось отправить конфиги по file_id, загружаем заново: {e}")
+        
+        if messages is None:
+            messages = await update.message.reply_media_group(
+                media=[
+                    InputMediaDocument(media=config['content'], filename=filename)
+                    for config, filename, _ in documents
+                ],
+                caption=caption
+            )
+        
+        await status_message.delete()
+        
+        for (config, _, file_hash), message in zip(documents, messages):
+            if message.document and message.document.file_id != config['tg_file_id']:
+                try:
+                    await ConfigRepository.set_file_id(config['config_id'], message.document.file_id, file_hash)
+                except Exception as e:
+                    logger.warning(f"Не удалось сохранить file_id конфига: {e}")
+        
+        logger.info(f"Конфигурации всех устройств отправлены пользователю {user.id}")
+        
+    except Exception as e:
+        logger.error(f"Ошибка при генерации конфигураций для {user.id}: {e}", exc_info=True)
+        
+        await status_message.edit_text(
+            f"❌ Ошибка при генерации конфигураций.\n\n"
+            f"Пожалуйста, попробуйте позже или обратитесь к администратору."
+        )
+
+
+def _config_filename(user, device_type: str) -> str:
+    """
+    Имя файла конфигурации для отправки
+    
+    Args:
+        user: Пользователь Telegram
+        device_type: Тип устройства
+        
+    Returns:
+        str: Имя файла
+    """
+    return f"{user.username or f'user{user.id}'}{device_type.capitalize()}.conf"
+
+
 async def _send_config(update: Update, device_type: str, device_name: str) -> None:
     """
     Генерация и отправка конфигурации пользователю
@@ -75,7 +179,7 @@ async def _send_config(update: Update, device_type: str, device_name: str) -> No
         )
         
         # Генерируем конфигурацию
-        config_path = await config_generator.generate_client_config(
+        config = await config_generator.generate_client_config(
             telegram_id=user.id,
             username=safe_username,
             device_type=device_type,
@@ -83,22 +187,39 @@ async def _send_config(update: Update, device_type: str, device_name: str) -> No
             last_name=user.last_name
         )
         
-        # Отправляем файл
-        with open(config_path, 'rb') as config_file:
-            await update.message.reply_document(
-                document=config_file,
-                filename=f"{user.username or f'user{user.id}'}{device_type.capitalize()}.conf",
-                caption=f"✅ Конфигурация для {device_name} готова!\n\n"
-                        f"📝 Импортируйте этот файл в приложение AmneziaWG.\n"
-                        f"🔒 Храните конфигурацию в безопасности."
+        filename = _config_filename(user, device_type)
+        caption = (
+            f"✅ Конфигурация для {device_name} готова!\n\n"
+            f"📝 Импортируйте этот файл в приложение AmneziaWG.\n"
+            f"🔒 Храните конфигурацию в безопасности."
+        )
+        file_hash = config_generator.content_hash(config['content'], filename)
+        
+        sent = False
+        if config['tg_file_id'] and config['tg_file_hash'] == file_hash:
+            # Тот же файл уже загружался - отправляем по file_id без загрузки
+            try:
+                await update.message.reply_document(document=config['tg_file_id'], caption=caption)
+                sent = True
+            except TelegramError as e:
+                logger.warning(f"Не удалось отправить конфиг по file_id, загружаем заново: {e}")
+        
+        if not sent:
+            # Отправляем файл прямо из памяти
+            message = await update.message.reply_document(
+                document=config['content'],
+                filename=filename,
+                caption=caption
             )
+            try:
+                await ConfigRepository.set_file_id(config['config_id'], message.document.file_id, file_hash)
+            except Exception as e:
+                # Конфиг уже отправлен - без кэша следующая отправка просто загрузит файл
+                logger.warning(f"Не удалось сохранить file_id конфига: {e}")
         
         # Удаляем сообщение о статусе
         await status_message.delete()
         
-        # Удаляем временный файл
-        await config_generator.cleanup_config_file(config_path)
-        
         logger.info(f"Конфигурация {device_type} успешно отправлена пользователю {user.id}")
         
     except Exception as e:
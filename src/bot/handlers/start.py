@@ -45,7 +45,8 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
             "Выберите тип устройства:\n"
             "📱 Для телефона - конфиг для мобильного устройства\n"
             "💻 Для ноутбука - конфиг для компьютера/ноутбука\n"
-            "🌐 Для роутера - конфиг для роутера\n\n"
+            "🌐 Для роутера - конфиг для роутера\n"
+            "📦 Все устройства - все три конфига одним сообщением\n\n"
             "Для каждого типа устройства создается отдельная конфигурация.\n"
             "Если конфиг уже был создан ранее, вы получите существующий."
         )
@@ -0,0 +1,128 @@
+"""
+Периодические задачи бота (JobQueue)
+"""
+from typing import Any, Dict, List
+
+from telegram.ext import ContextTypes
+
+from src.bot.handlers.admin import MESSAGE_LIMIT
+from src.config.settings import settings
+from src.database.maintenance import run_maintenance
+from src.services.config_generator import config_generator
+from src.services.peer_sync import sync_server, cleanup_empty_users
+from src.services.server_registry import server_registry
+from src.utils.logger import logger
+
+
+# Сколько имен перечислять в одной строке отчета
+REPORT_NAMES_LIMIT = 10
+
+
+def _names(names: List[str]) -> str:
+    """Перечисление имен с сокращением длинного списка"""
+    shown = ", ".join(names[:REPORT_NAMES_LIMIT])
+    if len(names) > REPORT_NAMES_LIMIT:
+        shown += f" и еще {len(names) - REPORT_NAMES_LIMIT}"
+    return shown
+
+
+def _format_sync_report(server_id: str, result: Dict[str, Any]) -> List[str]:
+    """
+    Строки отчета администратору о сверке сервера
+    
+    Args:
+        server_id: Идентификатор сервера
+        result: Результат sync_server
+        
+    Returns:
+        List[str]: Строки отчета (пусто - расхождений не было)
+    """
+    lines = []
+    if result['restored']:
+        lines.append(f"🔄 [{server_id}] Восстановлено peer'ов: {len(result['restored'])} ({_names(result['restored'])})")
+    if result['deleted']:
+        lines.append(f"🗑️ [{server_id}] Удалены через приложение: {len(result['deleted'])} ({_names(result['deleted'])})")
+    for name, error in list(result['failed'].items())[:REPORT_NAMES_LIMIT]:
+        lines.append(f"❌ [{server_id}] {name}: {error}")
+    if len(result['failed']) > REPORT_NAMES_LIMIT:
+        lines.append(f"❌ [{server_id}] И еще ошибок: {len(result['failed']) - REPORT_NAMES_LIMIT}")
+    return lines
+
+
+async def consistency_check_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Сверка peer'ов интерфейса с wg0.conf на всех серверах одновременно
+    
+    Args:
+        context: Контекст бота
+    """
+    results = await server_registry.gather(lambda manager: manager.mutator.check_consistency())
+    
+    for server_id, result in results.items():
+        if isinstance(result, Exception):
+            logger.error(f"Ошибка сверки конфигурации интерфейса сервера {server_id}: {result}", exc_info=result)
+
+
+async def peer_sync_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Сверка peer'ов всех серверов с базой бота
+    
+    Выполняется в процессе бота с его кэшами, пулом подключений и очередью
+    изменений серверов, поэтому не конкурирует с выдачей конфигов за
+    wg0.conf и clientsTable. Без изменений источников сервер не читается.
+    Расхождения и недоступность сервера сообщаются администратору;
+    о недоступности - один раз до восстановления.
+    
+    Args:
+        context: Контекст бота (context.job.data - {server_id: ошибка}
+            для недоступных серверов)
+    """
+    unavailable = context.job.data
+    results = await server_registry.gather(sync_server)
+    
+    report = []
+    deleted = False
+    for server_id, result in results.items():
+        if isinstance(result, Exception):
+            logger.error(f"Ошибка сверки peer'ов сервера {server_id}: {result}")
+            if server_id not in unavailable:
+                report.append(f"⚠️ [{server_id}] Сверка peer'ов невозможна: {result}")
+            unavailable[server_id] = str(result)
+            continue
+        
+        if unavailable.pop(server_id, None) is not None:
+            report.append(f"✅ [{server_id}] Сверка peer'ов снова выполняется")
+        
+        report.extend(_format_sync_report(server_id, result))
+        deleted = deleted or bool(result['deleted'])
+    
+    if deleted:
+        usernames = await cleanup_empty_users(config_generator.active_users())
+        if usernames:
+            report.append(f"👤 Удалены пользователи без конфигов: {len(usernames)} ({_names(usernames)})")
+    
+    if not report or not settings.ADMIN_ID:
+        return
+    
+    text = "\n".join(report)
+    if len(text) > MESSAGE_LIMIT:
+        text = text[:MESSAGE_LIMIT - 1] + "…"
+    
+    try:
+        await context.bot.send_message(chat_id=settings.ADMIN_ID, text=text)
+    except Exception as e:
+        logger.error(f"Не удалось отправить отчет сверки администратору: {e}")
+
+
+async def maintenance_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Обслуживание базы данных: свертка старой истории запросов, ANALYZE,
+    incremental_vacuum
+    
+    Args:
+        context: Контекст бота
+    """
+    try:
+        await run_maintenance()
+    except Exception as e:
+        logger.error(f"Ошибка обслуживания базы данных: {e}", exc_info=True)
@@ -12,7 +12,8 @@ def get_device_keyboard() -> ReplyKeyboardMarkup:
         ReplyKeyboardMarkup: Клавиатура
     """
     keyboard = [
-        [KeyboardButton("📱 Для телефона"), KeyboardButton("💻 Для ноутбука"), KeyboardButton("🌐 Для роутера")]
+        [KeyboardButton("📱 Для телефона"), KeyboardButton("💻 Для ноутбука"), KeyboardButton("🌐 Для роутера")],
+        [KeyboardButton("📦 Все устройства")]
     ]
     
     return ReplyKeyboardMarkup(
@@ -31,6 +32,7 @@ def get_admin_keyboard() -> ReplyKeyboardMarkup:
     """
     keyboard = [
         [KeyboardButton("📱 Для телефона"), KeyboardButton("💻 Для ноутбука"), KeyboardButton("🌐 Для роутера")],
+        [KeyboardButton("📦 Все устройства")],
         [KeyboardButton("📊 Статистика"), KeyboardButton("👥 Пользователи"), KeyboardButton("🔄 Перезагрузить сервер")]
     ]
     
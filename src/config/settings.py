@@ -20,14 +20,54 @@ class Settings:
         for user_id in os.getenv("USERS", "").split(",") 
         if user_id.strip()
     ]
+    # Количество пользователей на странице списка /users
+    USERS_PAGE_SIZE: int = int(os.getenv("USERS_PAGE_SIZE", "20"))
     
     # AmneziaWG Configuration
     AWG_CONTAINER: str = os.getenv("AWG_CONTAINER", "amnezia-awg")
     AWG_CONFIG_PATH: str = os.getenv("AWG_CONFIG_PATH", "/opt/amnezia/awg")
+    # Каталог хоста, смонтированный в AWG_CONFIG_PATH контейнера (для inotify в sync_peers --watch)
+    AWG_HOST_CONFIG_PATH: str = os.getenv("AWG_HOST_CONFIG_PATH", "")
     SERVER_ENDPOINT: str = os.getenv("SERVER_ENDPOINT", "")
     SERVER_PUBLIC_KEY: str = os.getenv("SERVER_PUBLIC_KEY", "")
     PRESHARED_KEY: str = os.getenv("PRESHARED_KEY", "")
     
+    # Несколько серверов: JSON файл с описанием серверов (пусто - один сервер из переменных выше)
+    SERVERS_FILE: str = os.getenv("SERVERS_FILE", "")
+    # Размещение новых peer'ов: least_peers (меньше peer'ов) или weighted (с учетом weight сервера)
+    PLACEMENT_POLICY: str = os.getenv("PLACEMENT_POLICY", "least_peers")
+    
+    # Бэкенд сервера: docker (контейнер), host (wg и конфиги на хосте) или fake (в памяти)
+    AWG_BACKEND: str = os.getenv("AWG_BACKEND", "docker")
+    WG_BINARY: str = os.getenv("WG_BINARY", "wg")
+    
+    # Способ работы с контейнером: session (постоянный docker exec) или api (Docker Engine API)
+    DOCKER_TRANSPORT: str = os.getenv("DOCKER_TRANSPORT", "session")
+    DOCKER_SOCKET: str = os.getenv("DOCKER_SOCKET", "/var/run/docker.sock")
+    
+    # Окно группировки одновременных добавлений peer'ов (мс)
+    PEER_BATCH_WINDOW_MS: int = int(os.getenv("PEER_BATCH_WINDOW_MS", "5"))
+    
+    # Пауза перед записью накопленных изменений clientsTable (секунды)
+    CLIENTS_TABLE_FLUSH_DELAY: float = float(os.getenv("CLIENTS_TABLE_FLUSH_DELAY", "1.0"))
+    
+    # Режим наблюдения sync_peers: опрос отпечатков (секунды) и ожидание конца серии изменений (мс)
+    WATCH_POLL_INTERVAL: float = float(os.getenv("WATCH_POLL_INTERVAL", "30"))
+    WATCH_DEBOUNCE_MS: int = int(os.getenv("WATCH_DEBOUNCE_MS", "500"))
+    
+    # Предельный интервал проверки файлов сервера, которые не меняются (секунды);
+    # peer'ы интерфейса опрашиваются раз в WATCH_POLL_INTERVAL всегда
+    WATCH_POLL_MAX_INTERVAL: float = float(os.getenv("WATCH_POLL_MAX_INTERVAL", "300"))
+    
+    # Интервал сверки интерфейса с wg0.conf (секунды, 0 - отключена)
+    CONSISTENCY_CHECK_INTERVAL: int = int(os.getenv("CONSISTENCY_CHECK_INTERVAL", "300"))
+    
+    # Интервал сверки peer'ов с базой внутри бота (секунды, 0 - отключена)
+    PEER_SYNC_INTERVAL: int = int(os.getenv("PEER_SYNC_INTERVAL", "30"))
+    
+    # Пользователи без конфигов моложе этого срока не удаляются: первый конфиг еще выдается (секунды)
+    EMPTY_USER_GRACE_SECONDS: int = int(os.getenv("EMPTY_USER_GRACE_SECONDS", "600"))
+    
     # Network Configuration
     CLIENT_NETWORK: str = os.getenv("CLIENT_NETWORK", "10.8.1.0/24")
     CLIENT_IP_START: str = os.getenv("CLIENT_IP_START", "10.8.1.17")
@@ -48,6 +88,27 @@ class Settings:
     
     # Database
     DATABASE_PATH: str = os.getenv("DATABASE_PATH", "data/database.db")
+    # Пул подключений: количество читателей (писатель всегда один)
+    DB_READERS: int = int(os.getenv("DB_READERS", "3"))
+    # Ожидание блокировки базы другим процессом (мс)
+    DB_BUSY_TIMEOUT_MS: int = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+    # Размер кэша подготовленных запросов на подключение
+    DB_CACHED_STATEMENTS: int = int(os.getenv("DB_CACHED_STATEMENTS", "256"))
+    
+    # История запросов: запись пачками по количеству событий или по таймеру (мс)
+    REQUEST_LOG_BATCH_SIZE: int = int(os.getenv("REQUEST_LOG_BATCH_SIZE", "100"))
+    REQUEST_LOG_FLUSH_MS: int = int(os.getenv("REQUEST_LOG_FLUSH_MS", "500"))
+    # Предел буфера и поведение при переполнении: drop (отбросить) или block (ждать записи)
+    REQUEST_LOG_MAX_PENDING: int = int(os.getenv("REQUEST_LOG_MAX_PENDING", "10000"))
+    REQUEST_LOG_OVERFLOW: str = os.getenv("REQUEST_LOG_OVERFLOW", "drop")
+    
+    # Обслуживание БД: срок хранения подробной истории запросов (дни, 0 - хранить всю)
+    REQUESTS_RETENTION_DAYS: int = int(os.getenv("REQUESTS_RETENTION_DAYS", "30"))
+    # Интервал обслуживания (секунды) и количество строк, удаляемых одной транзакцией
+    MAINTENANCE_INTERVAL: int = int(os.getenv("MAINTENANCE_INTERVAL", "86400"))
+    MAINTENANCE_BATCH_SIZE: int = int(os.getenv("MAINTENANCE_BATCH_SIZE", "5000"))
+    # Страниц, освобождаемых incremental_vacuum за один запуск (0 - все свободные)
+    MAINTENANCE_VACUUM_PAGES: int = int(os.getenv("MAINTENANCE_VACUUM_PAGES", "2000"))
     
     # Logging
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
@@ -59,11 +120,16 @@ class Settings:
         required_fields = [
             ("BOT_TOKEN", cls.BOT_TOKEN),
             ("ADMIN_ID", cls.ADMIN_ID),
-            ("SERVER_ENDPOINT", cls.SERVER_ENDPOINT),
-            ("SERVER_PUBLIC_KEY", cls.SERVER_PUBLIC_KEY),
-            ("PRESHARED_KEY", cls.PRESHARED_KEY),
         ]
         
+        # С SERVERS_FILE параметры серверов проверяются при загрузке реестра
+        if not cls.SERVERS_FILE:
+            required_fields += [
+                ("SERVER_ENDPOINT", cls.SERVER_ENDPOINT),
+                ("SERVER_PUBLIC_KEY", cls.SERVER_PUBLIC_KEY),
+                ("PRESHARED_KEY", cls.PRESHARED_KEY),
+            ]
+        
         missing = []
         for field_name, field_value in required_fields:
             if not field_value or field_value == "0":
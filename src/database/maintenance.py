@@ -0,0 +1,173 @@
+"""
+Обслуживание базы данных
+
+Запросы старше REQUESTS_RETENTION_DAYS сворачиваются в requests_daily
+(количество по пользователю, устройству, действию и дню) и удаляются
+пачками по MAINTENANCE_BATCH_SIZE строк. Каждая пачка - отдельная короткая
+транзакция, поэтому запись истории и выдача конфигов ждут не дольше одной
+пачки. После свертки обновляется статистика планировщика (ANALYZE) и
+возвращается свободное место (incremental_vacuum).
+"""
+import asyncio
+from typing import Any, Dict
+
+from src.config.settings import settings
+from src.database.models import db
+from src.utils.logger import logger
+
+
+async def rollup_requests(retention_days: int, batch_size: int) -> int:
+    """
+    Свертка и удаление запросов старше retention_days дней
+    
+    Свертка идет по целым дням (UTC), повторный запуск добавляет
+    количество к уже свернутым дням.
+    
+    Args:
+        retention_days: Срок хранения подробной истории (дни)
+        batch_size: Количество строк, обрабатываемых одной транзакцией
+        
+    Returns:
+        int: Количество свернутых запросов
+    """
+    total = 0
+    
+    while True:
+        async with db.write() as conn:
+            cursor = await conn.execute("SELECT date('now', ?)", (f"-{retention_days} days",))
+            cutoff = (await cursor.fetchone())[0]
+            
+            # Граница пачки по id: старые запросы лежат в начале таблицы
+            cursor = await conn.execute(
+                "SELECT MAX(id) FROM (SELECT id FROM requests WHERE timestamp < ? ORDER BY id LIMIT ?)",
+                (cutoff, batch_size)
+            )
+            last_id = (await cursor.fetchone())[0]
+            if last_id is None:
+                break
+            
+            await conn.execute("""
+                INSERT INTO requests_daily (user_id, device_type, action, day, count)
+                SELECT user_id, device_type, action, date(timestamp), COUNT(*)
+                FROM requests
+                WHERE id <= ? AND timestamp < ?
+                GROUP BY user_id, device_type, action, date(timestamp)
+                ON CONFLICT(user_id, device_type, action, day)
+                DO UPDATE SET count = count + excluded.count
+            """, (last_id, cutoff))
+            
+            cursor = await conn.execute(
+                "DELETE FROM requests WHERE id <= ? AND timestamp < ?",
+                (last_id, cutoff)
+            )
+            total += cursor.rowcount
+        
+        # Пропускаем ожидающие записи бота между пачками
+        await asyncio.sleep(0)
+    
+    return total
+
+
+async def analyze() -> None:
+    """Обновление статистики планировщика запросов"""
+    async with db.write() as conn:
+        await conn.execute("ANALYZE")
+
+
+async def incremental_vacuum(pages: int) -> int:
+    """
+    Возврат свободных страниц файла базы
+    
+    Args:
+        pages: Максимум освобождаемых страниц (0 - все свободные)
+        
+    Returns:
+        int: Количество освобожденных страниц
+    """
+    async with db.write() as conn:
+        if await db._pragma(conn, "auto_vacuum") != 2:
+            logger.debug("incremental_vacuum недоступен: база не переведена в режим auto_vacuum = INCREMENTAL")
+            return 0
+        
+        before = await db._pragma(conn, "freelist_count")
+        
+        # execute выполняет один шаг PRAGMA (одна страница), executescript - до конца
+        await conn.executescript(f"PRAGMA incremental_vacuum({max(0, pages)});")
+        
+        return before - await db._pragma(conn, "freelist_count")
+
+
+async def vacuum() -> None:
+    """
+    Полная перестройка файла базы (VACUUM)
+    
+    Переводит существующую базу в режим auto_vacuum = INCREMENTAL.
+    Блокирует запись на все время работы, поэтому выполняется только
+    вручную.
+    """
+    async with db.write() as conn:
+        await db._pragma(conn, "auto_vacuum = INCREMENTAL")
+        await conn.commit()
+        await conn.execute("VACUUM")
+
+
+async def get_status() -> Dict[str, Any]:
+    """
+    Состояние истории запросов и файла базы
+    
+    Returns:
+        Dict[str, Any]: Количество строк, диапазон дат и свободные страницы
+    """
+    async with db.read() as conn:
+        cursor = await conn.execute("SELECT COUNT(*), MIN(timestamp) FROM requests")
+        raw_rows, oldest_raw = await cursor.fetchone()
+        
+        cursor = await conn.execute("SELECT COUNT(*), COALESCE(SUM(count), 0), MIN(day) FROM requests_daily")
+        daily_rows, daily_requests, oldest_day = await cursor.fetchone()
+        
+        return {
+            "raw_rows": raw_rows,
+            "oldest_raw": oldest_raw,
+            "daily_rows": daily_rows,
+            "daily_requests": daily_requests,
+            "oldest_day": oldest_day,
+            "page_count": await db._pragma(conn, "page_count"),
+            "page_size": await db._pragma(conn, "page_size"),
+            "freelist_count": await db._pragma(conn, "freelist_count"),
+            "auto_vacuum": await db._pragma(conn, "auto_vacuum")
+        }
+
+
+async def run_maintenance(
+    retention_days: int = None,
+    batch_size: int = None,
+    vacuum_pages: int = None
+) -> Dict[str, int]:
+    """
+    Полный цикл обслуживания: свертка истории, ANALYZE, incremental_vacuum
+    
+    Args:
+        retention_days: Срок хранения подробной истории (по умолчанию из настроек)
+        batch_size: Размер пачки удаления (по умолчанию из настроек)
+        vacuum_pages: Страниц для incremental_vacuum (по умолчанию из настроек)
+        
+    Returns:
+        Dict[str, int]: Количество свернутых запросов и освобожденных страниц
+    """
+    retention_days = settings.REQUESTS_RETENTION_DAYS if retention_days is None else retention_days
+    batch_size = settings.MAINTENANCE_BATCH_SIZE if batch_size is None else batch_size
+    vacuum_pages = settings.MAINTENANCE_VACUUM_PAGES if vacuum_pages is None else vacuum_pages
+    
+    rolled_up = 0
+    if retention_days > 0:
+        rolled_up = await rollup_requests(retention_days, max(1, batch_size))
+    
+    await analyze()
+    freed_pages = await incremental_vacuum(vacuum_pages)
+    
+    logger.info(
+        f"Обслуживание БД: свернуто запросов {rolled_up}, "
+        f"освобождено страниц {freed_pages}"
+    )
+    
+    return {"rolled_up": rolled_up, "freed_pages": freed_pages}
@@ -1,15 +1,141 @@
 """
 Модели базы данных SQLite
+
+Подключения открываются один раз и переиспользуются: один писатель
+(записи выполняются по очереди) и несколько читателей. В режиме WAL
+читатели не блокируются писателем, в том числе писателем из другого
+процесса (инструменты работают с той же базой, что и бот).
 """
+import asyncio
 import aiosqlite
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Optional
+from typing import AsyncIterator, Dict, List, Optional
 from datetime import datetime
 
 from src.config.settings import settings
 from src.utils.logger import logger
 
 
+# Фактические значения счетчиков stats_counters: (имя, значение).
+# Используется для первичного заполнения и проверки счетчиков
+STATS_COUNTERS_QUERY = """
+    SELECT 'users', COUNT(*) FROM users
+    UNION ALL
+    SELECT 'configs', COUNT(*) FROM configs
+    UNION ALL
+    SELECT 'requests', (SELECT COUNT(*) FROM requests) + (SELECT COALESCE(SUM(count), 0) FROM requests_daily)
+    UNION ALL
+    SELECT 'configs:device:' || device_type, COUNT(*) FROM configs GROUP BY device_type
+    UNION ALL
+    SELECT 'requests:action:' || action, SUM(n) FROM (
+        SELECT action, COUNT(*) AS n FROM requests GROUP BY action
+        UNION ALL
+        SELECT action, SUM(count) AS n FROM requests_daily GROUP BY action
+    ) GROUP BY action
+"""
+
+# Триггеры, поддерживающие stats_counters при вставке и удалении строк.
+# Свернутые запросы (requests_daily) учитываются со своим количеством,
+# поэтому свертка не меняет счетчики
+STATS_TRIGGERS = {
+    "trg_users_insert": """
+        AFTER INSERT ON users BEGIN
+            INSERT INTO stats_counters (name, value) VALUES ('users', 1)
+            ON CONFLICT(name) DO UPDATE SET value = value + 1;
+        END
+    """,
+    "trg_users_delete": """
+        AFTER DELETE ON users BEGIN
+            UPDATE stats_counters SET value = value - 1 WHERE name = 'users';
+        END
+    """,
+    "trg_configs_insert": """
+        AFTER INSERT ON configs BEGIN
+            INSERT INTO stats_counters (name, value) VALUES ('configs', 1)
+            ON CONFLICT(name) DO UPDATE SET value = value + 1;
+            INSERT INTO stats_counters (name, value) VALUES ('configs:device:' || NEW.device_type, 1)
+            ON CONFLICT(name) DO UPDATE SET value = value + 1;
+        END
+    """,
+    "trg_configs_delete": """
+        AFTER DELETE ON configs BEGIN
+            UPDATE stats_counters SET value = value - 1
+            WHERE name IN ('configs', 'configs:device:' || OLD.device_type);
+        END
+    """,
+    "trg_configs_device_update": """
+        AFTER UPDATE OF device_type ON configs
+        WHEN OLD.device_type IS NOT NEW.device_type BEGIN
+            UPDATE stats_counters SET value = value - 1 WHERE name = 'configs:device:' || OLD.device_type;
+            INSERT INTO stats_counters (name, value) VALUES ('configs:device:' || NEW.device_type, 1)
+            ON CONFLICT(name) DO UPDATE SET value = value + 1;
+        END
+    """,
+    "trg_requests_insert": """
+        AFTER INSERT ON requests BEGIN
+            INSERT INTO stats_counters (name, value) VALUES ('requests', 1)
+            ON CONFLICT(name) DO UPDATE SET value = value + 1;
+            INSERT INTO stats_counters (name, value) VALUES ('requests:action:' || NEW.action, 1)
+            ON CONFLICT(name) DO UPDATE SET value = value + 1;
+        END
+    """,
+    "trg_requests_delete": """
+        AFTER DELETE ON requests BEGIN
+            UPDATE stats_counters SET value = value - 1
+            WHERE name IN ('requests', 'requests:action:' || OLD.action);
+        END
+    """,
+    "trg_requests_daily_insert": """
+        AFTER INSERT ON requests_daily BEGIN
+            INSERT INTO stats_counters (name, value) VALUES ('requests', NEW.count)
+            ON CONFLICT(name) DO UPDATE SET value = value + NEW.count;
+            INSERT INTO stats_counters (name, value) VALUES ('requests:action:' || NEW.action, NEW.count)
+            ON CONFLICT(name) DO UPDATE SET value = value + NEW.count;
+        END
+    """,
+    "trg_requests_daily_update": """
+        AFTER UPDATE OF count ON requests_daily BEGIN
+            UPDATE stats_counters SET value = value + NEW.count - OLD.count
+            WHERE name IN ('requests', 'requests:action:' || NEW.action);
+        END
+    """,
+    "trg_requests_daily_delete": """
+        AFTER DELETE ON requests_daily BEGIN
+            UPDATE stats_counters SET value = value - OLD.count
+            WHERE name IN ('requests', 'requests:action:' || OLD.action);
+        END
+    """,
+}
+
+# Триггеры, увеличивающие ревизию конфигов сервера (config_revisions) при
+# любом изменении, влияющем на сверку. PRAGMA data_version для этого не
+# подходит: он действует в пределах подключения и не сохраняется между
+# запусками
+CONFIG_REVISION_TRIGGERS = {
+    "trg_configs_revision_insert": """
+        AFTER INSERT ON configs BEGIN
+            INSERT INTO config_revisions (server_id, revision) VALUES (NEW.server_id, 1)
+            ON CONFLICT(server_id) DO UPDATE SET revision = revision + 1;
+        END
+    """,
+    "trg_configs_revision_delete": """
+        AFTER DELETE ON configs BEGIN
+            INSERT INTO config_revisions (server_id, revision) VALUES (OLD.server_id, 1)
+            ON CONFLICT(server_id) DO UPDATE SET revision = revision + 1;
+        END
+    """,
+    "trg_configs_revision_update": """
+        AFTER UPDATE OF client_public_key, client_ip, config_name, server_id ON configs BEGIN
+            INSERT INTO config_revisions (server_id, revision) VALUES (OLD.server_id, 1)
+            ON CONFLICT(server_id) DO UPDATE SET revision = revision + 1;
+            INSERT INTO config_revisions (server_id, revision) VALUES (NEW.server_id, 1)
+            ON CONFLICT(server_id) DO UPDATE SET revision = revision + 1;
+        END
+    """,
+}
+
+
 class Database:
     """Класс для работы с базой данных"""
     
@@ -22,12 +148,153 @@ class Database:
         """
         self.db_path = db_path or settings.DATABASE_PATH
         
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._readers: List[aiosqlite.Connection] = []
+        self._idle_readers: Optional[asyncio.Queue] = None
+        self._write_lock: Optional[asyncio.Lock] = None
+        self._open_lock: Optional[asyncio.Lock] = None
+    
+    async def _connect(self) -> aiosqlite.Connection:
+        """
+        Открытие подключения с настройками пула
+        
+        Returns:
+            aiosqlite.Connection: Подключение к базе данных
+        """
+        conn = await aiosqlite.connect(self.db_path, cached_statements=settings.DB_CACHED_STATEMENTS)
+        conn.row_factory = aiosqlite.Row
+        try:
+            await self._pragma(conn, f"busy_timeout = {settings.DB_BUSY_TIMEOUT_MS}")
+            await self._pragma(conn, "synchronous = NORMAL")
+        except Exception:
+            await conn.close()
+            raise
+        return conn
+    
+    @staticmethod
+    async def _pragma(conn: aiosqlite.Connection, pragma: str) -> Optional[str]:
+        """
+        Выполнение PRAGMA с закрытием курсора
+        
+        Незакрытый курсор PRAGMA удерживает блокировку базы.
+        
+        Args:
+            conn: Подключение к базе данных
+            pragma: Текст после PRAGMA
+            
+        Returns:
+            Optional[str]: Значение, возвращенное PRAGMA
+        """
+        async with conn.execute(f"PRAGMA {pragma}") as cursor:
+            row = await cursor.fetchone()
+        return row[0] if row else None
+    
+    async def open(self) -> None:
+        """
+        Открытие пула подключений: один писатель и DB_READERS читателей
+        
+        Бот открывает пул при запуске, инструменты - при первом запросе.
+        """
+        if self._open_lock is None:
+            self._open_lock = asyncio.Lock()
+        
+        async with self._open_lock:
+            if self._writer is not None:
+                return
+            
+            # Создаем директорию для БД, если её нет
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+            
+            connections = []
+            try:
+                writer = await self._connect()
+                connections.append(writer)
+                
+                # Новая база создается с incremental_vacuum (до включения WAL,
+                # которое записывает заголовок файла), существующая переходит
+                # на него после VACUUM (src/tools/maintenance.py --vacuum)
+                await self._pragma(writer, "auto_vacuum = INCREMENTAL")
+                
+                # WAL сохраняется в файле базы и действует для всех процессов
+                mode = await self._pragma(writer, "journal_mode = WAL")
+                if mode != "wal":
+                    logger.warning(f"Не удалось включить WAL для БД, режим журнала: {mode}")
+                
+                for _ in range(max(1, settings.DB_READERS)):
+                    connections.append(await self._connect())
+            except Exception:
+                for conn in connections:
+                    await conn.close()
+                raise
+            
+            self._readers = connections[1:]
+            self._idle_readers = asyncio.Queue()
+            for reader in self._readers:
+                self._idle_readers.put_nowait(reader)
+            
+            self._write_lock = asyncio.Lock()
+            self._writer = writer
+            
+            logger.info(f"Пул подключений к БД открыт: 1 писатель, {len(self._readers)} читателей")
+    
+    async def close(self) -> None:
+        """Закрытие пула подключений"""
+        if self._writer is None:
+            return
+        
+        writer, readers = self._writer, self._readers
+        self._writer = None
+        self._readers = []
+        
+        for conn in [writer, *readers]:
+            try:
+                await conn.close()
+            except Exception as e:
+                logger.warning(f"Ошибка закрытия подключения к БД: {e}")
+        
+        logger.info("Пул подключений к БД закрыт")
+    
+    @asynccontextmanager
+    async def read(self) -> AsyncIterator[aiosqlite.Connection]:
+        """
+        Подключение для чтения из пула
+        
+        Yields:
+            aiosqlite.Connection: Свободный читатель
+        """
+        if self._writer is None:
+            await self.open()
+        
+        conn = await self._idle_readers.get()
+        try:
+            yield conn
+        finally:
+            self._idle_readers.put_nowait(conn)
+    
+    @asynccontextmanager
+    async def write(self) -> AsyncIterator[aiosqlite.Connection]:
+        """
+        Подключение для записи: записи выполняются по очереди, изменения
+        фиксируются при выходе из блока и откатываются при ошибке
+        
+        Yields:
+            aiosqlite.Connection: Писатель
+        """
+        if self._writer is None:
+            await self.open()
+        
+        async with self._write_lock:
+            conn = self._writer
+            try:
+                yield conn
+            except BaseException:
+                await conn.rollback()
+                raise
+            await conn.commit()
+        
     async def init_db(self) -> None:
         """Создание таблиц базы данных"""
-        # Создаем директорию для БД, если её нет
-        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
-        
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.write() as db:
             # Таблица пользователей
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS users (
@@ -51,6 +318,9 @@ class Database:
                     client_ip TEXT NOT NULL,
                     config_name TEXT NOT NULL,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    tg_file_id TEXT,
+                    tg_file_hash TEXT,
+                    server_id TEXT NOT NULL DEFAULT 'default',
                     FOREIGN KEY (user_id) REFERENCES users (id),
                     UNIQUE(user_id, device_type)
                 )
@@ -84,19 +354,142 @@ class Database:
                 ON requests(user_id, timestamp)
             """)
             
-            await db.commit()
-            logger.info(f"База данных инициализирована: {self.db_path}")
+            # Активность по дням в /stats и сворачивание старых запросов
+            # выбирают строки по времени без учета пользователя
+            await db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_requests_timestamp 
+                ON requests(timestamp)
+            """)
+            
+            # Миграции существующих баз: file_id документа Telegram и хэш
+            # отправленного содержимого для повторной отправки без загрузки
+            await self._add_missing_columns(db, "configs", {
+                "tg_file_id": "TEXT",
+                "tg_file_hash": "TEXT"
+            })
+            
+            # Сервер, на котором размещен peer: существующие конфиги
+            # относятся к серверу из переменных окружения
+            await self._add_missing_columns(db, "configs", {
+                "server_id": "TEXT NOT NULL DEFAULT 'default'"
+            })
+            
+            await db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_configs_server 
+                ON configs(server_id)
+            """)
+            
+            # Свернутая по дням история запросов старше REQUESTS_RETENTION_DAYS
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS requests_daily (
+                    user_id INTEGER NOT NULL,
+                    device_type TEXT NOT NULL,
+                    action TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (user_id, device_type, action, day)
+                ) WITHOUT ROWID
+            """)
+            
+            await db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_requests_daily_day 
+                ON requests_daily(day)
+            """)
+            
+            # Счетчики статистики, поддерживаемые триггерами
+            await self._create_stats_counters(db)
+            
+            # Отпечатки источников последней сверки каждого сервера
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    server_id TEXT NOT NULL,
+                    task TEXT NOT NULL,
+                    fingerprint TEXT NOT NULL,
+                    summary TEXT,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (server_id, task)
+                ) WITHOUT ROWID
+            """)
+            
+            # Ревизия конфигов сервера, поддерживаемая триггерами
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS config_revisions (
+                    server_id TEXT PRIMARY KEY,
+                    revision INTEGER NOT NULL DEFAULT 0
+                ) WITHOUT ROWID
+            """)
+            
+            for name, body in CONFIG_REVISION_TRIGGERS.items():
+                await db.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+        
+        logger.info(f"База данных инициализирована: {self.db_path}")
     
-    async def get_connection(self) -> aiosqlite.Connection:
+    async def _create_stats_counters(self, conn: aiosqlite.Connection) -> None:
         """
-        Получение подключения к БД
+        Создание таблицы stats_counters и триггеров
         
-        Returns:
-            aiosqlite.Connection: Подключение к базе данных
+        При первом создании таблица заполняется фактическими значениями.
+        
+        Args:
+            conn: Подключение к базе данных (внутри транзакции записи)
         """
-        conn = await aiosqlite.connect(self.db_path)
-        conn.row_factory = aiosqlite.Row
-        return conn
+        cursor = await conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stats_counters'"
+        )
+        exists = await cursor.fetchone() is not None
+        
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS stats_counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+        """)
+        
+        for name, body in STATS_TRIGGERS.items():
+            await conn.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+        
+        if not exists:
+            await self._fill_stats_counters(conn)
+            logger.info("Миграция БД: счетчики статистики заполнены")
+    
+    @staticmethod
+    async def _fill_stats_counters(conn: aiosqlite.Connection) -> None:
+        """
+        Заполнение stats_counters фактическими значениями
+        
+        Args:
+            conn: Подключение к базе данных (внутри транзакции записи)
+        """
+        await conn.execute("DELETE FROM stats_counters")
+        await conn.execute(f"INSERT INTO stats_counters (name, value) {STATS_COUNTERS_QUERY}")
+    
+    async def rebuild_stats_counters(self) -> None:
+        """Пересчет stats_counters по фактическим данным"""
+        async with self.write() as conn:
+            await self._fill_stats_counters(conn)
+        logger.info("Счетчики статистики пересчитаны")
+    
+    @staticmethod
+    async def _add_missing_columns(
+        conn: aiosqlite.Connection,
+        table: str,
+        columns: Dict[str, str]
+    ) -> None:
+        """
+        Добавление колонок, которых нет в существующей таблице
+        
+        Args:
+            conn: Подключение к базе данных
+            table: Имя таблицы
+            columns: {имя колонки: тип и ограничения}
+        """
+        cursor = await conn.execute(f"PRAGMA table_info({table})")
+        existing = {row[1] for row in await cursor.fetchall()}
+        
+        for name, definition in columns.items():
+            if name not in existing:
+                await conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+                logger.info(f"Миграция БД: добавлена колонка {table}.{name}")
 
 
 # Глобальный экземпляр базы данных
@@ -1,11 +1,12 @@
 """
 Репозиторий для работы с базой данных
 """
-import aiosqlite
-from typing import Optional, List, Dict, Any
+import json
+from typing import Optional, Iterable, List, Dict, Any, Set
 from datetime import datetime
 
 from src.database.models import db
+from src.database.request_log import request_log
 from src.utils.logger import logger
 
 
@@ -31,8 +32,7 @@ class UserRepository:
         Returns:
             int: ID созданного пользователя
         """
-        async with aiosqlite.connect(db.db_path) as conn:
-            conn.row_factory = aiosqlite.Row
+        async with db.write() as conn:
             cursor = await conn.execute(
                 """
                 INSERT OR IGNORE INTO users (telegram_id, username, first_name, last_name)
@@ -40,7 +40,6 @@ class UserRepository:
                 """,
                 (telegram_id, username, first_name, last_name)
             )
-            await conn.commit()
             
             # Получаем ID пользователя
             cursor = await conn.execute(
@@ -64,8 +63,7 @@ class UserRepository:
         Returns:
             Optional[Dict[str, Any]]: Данные пользователя или None
         """
-        async with aiosqlite.connect(db.db_path) as conn:
-            conn.row_factory = aiosqlite.Row
+        async with db.read() as conn:
             cursor = await conn.execute(
                 "SELECT * FROM users WHERE telegram_id = ?",
                 (telegram_id,)
@@ -81,11 +79,125 @@ class UserRepository:
         Returns:
             List[Dict[str, Any]]: Список пользователей
         """
-        async with aiosqlite.connect(db.db_path) as conn:
-            conn.row_factory = aiosqlite.Row
+        async with db.read() as conn:
             cursor = await conn.execute("SELECT * FROM users ORDER BY created_at DESC")
             rows = await cursor.fetchall()
             return [dict(row) for row in rows]
+    
+    @staticmethod
+    async def get_users_page(
+        cursor_id: Optional[int] = None,
+        newer: bool = False,
+        limit: int = 20
+    ) -> Dict[str, Any]:
+        """
+        Страница списка пользователей с их устройствами (новые сначала)
+        
+        Пагинация по ключу: страница начинается сразу после cursor_id,
+        поэтому запрос не зависит от номера страницы. Устройства
+        собираются тем же запросом через GROUP_CONCAT.
+        
+        Args:
+            cursor_id: ID пользователя, от которого строится страница
+                (None - первая страница)
+            newer: True - пользователи новее cursor_id (предыдущая страница),
+                False - старше cursor_id (следующая страница)
+            limit: Размер страницы
+            
+        Returns:
+            Dict[str, Any]: users (с полями configs_count и device_types),
+                has_newer, has_older, total
+        """
+        if cursor_id is None:
+            where, order, params = "", "DESC", (limit,)
+        elif newer:
+            where, order, params = "WHERE id > ?", "ASC", (cursor_id, limit)
+        else:
+            where, order, params = "WHERE id < ?", "DESC", (cursor_id, limit)
+        
+        async with db.read() as conn:
+            cursor = await conn.execute(f"""
+                SELECT u.*,
+                       COUNT(c.id) AS configs_count,
+                       GROUP_CONCAT(c.device_type) AS device_types
+                FROM (SELECT * FROM users {where} ORDER BY id {order} LIMIT ?) AS u
+                LEFT JOIN configs c ON c.user_id = u.id
+                GROUP BY u.id
+                ORDER BY u.id DESC
+            """, params)
+            users = []
+            for row in await cursor.fetchall():
+                user = dict(row)
+                user['device_types'] = user['device_types'].split(',') if user['device_types'] else []
+                users.append(user)
+            
+            cursor = await conn.execute("SELECT value FROM stats_counters WHERE name = 'users'")
+            row = await cursor.fetchone()
+            total = row[0] if row else len(users)
+            
+            has_newer = has_older = False
+            if users:
+                cursor = await conn.execute(
+                    "SELECT EXISTS(SELECT 1 FROM users WHERE id > ?), EXISTS(SELECT 1 FROM users WHERE id < ?)",
+                    (users[0]['id'], users[-1]['id'])
+                )
+                has_newer, has_older = (bool(value) for value in await cursor.fetchone())
+        
+        return {
+            "users": users,
+            "has_newer": has_newer,
+            "has_older": has_older,
+            "total": total
+        }
+    
+    @staticmethod
+    async def delete_users_without_configs(
+        grace_seconds: int = 0,
+        exclude_telegram_ids: Iterable[int] = ()
+    ) -> List[str]:
+        """
+        Удаление пользователей без конфигураций вместе с историей запросов
+        
+        Выполняется несколькими DELETE ... WHERE NOT EXISTS в одной
+        транзакции: время не зависит от количества пользователей с
+        конфигами, а фиксация одна на весь вызов.
+        
+        Args:
+            grace_seconds: Не удалять пользователей, созданных позже этого
+                срока (первый конфиг еще выдается)
+            exclude_telegram_ids: Пользователи, которым сейчас выдается конфиг
+            
+        Returns:
+            List[str]: Имена удаленных пользователей (username, имя или ID)
+        """
+        conditions = ["NOT EXISTS (SELECT 1 FROM configs c WHERE c.user_id = u.id)"]
+        params = []
+        if grace_seconds > 0:
+            conditions.append("u.created_at < datetime('now', ?)")
+            params.append(f"-{grace_seconds} seconds")
+        exclude = list(exclude_telegram_ids)
+        if exclude:
+            conditions.append(f"u.telegram_id NOT IN ({', '.join('?' * len(exclude))})")
+            params.extend(exclude)
+        
+        # Первый DELETE открывает транзакцию записи, поэтому набор пустых
+        # пользователей не меняется до фиксации
+        empty_users = f"SELECT id FROM users u WHERE {' AND '.join(conditions)}"
+        
+        async with db.write() as conn:
+            await conn.execute(f"DELETE FROM requests WHERE user_id IN ({empty_users})", params)
+            await conn.execute(f"DELETE FROM requests_daily WHERE user_id IN ({empty_users})", params)
+            
+            cursor = await conn.execute(f"""
+                SELECT COALESCE(NULLIF(username, ''), NULLIF(first_name, ''), 'ID:' || telegram_id)
+                FROM users WHERE id IN ({empty_users})
+            """, params)
+            names = [row[0] for row in await cursor.fetchall()]
+            
+            if names:
+                await conn.execute(f"DELETE FROM users WHERE id IN ({empty_users})", params)
+        
+        return names
 
 
 class ConfigRepository:
@@ -98,7 +210,8 @@ class ConfigRepository:
         client_public_key: str,
         client_private_key: str,
         client_ip: str,
-        config_name: str
+        config_name: str,
+        server_id: str = "default"
     ) -> int:
         """
         Создание конфигурации
@@ -110,23 +223,22 @@ class ConfigRepository:
             client_private_key: Приватный ключ клиента
             client_ip: IP адрес клиента
             config_name: Имя конфигурационного файла
+            server_id: Сервер, на котором размещен peer
             
         Returns:
             int: ID созданной конфигурации
         """
-        async with aiosqlite.connect(db.db_path) as conn:
-            conn.row_factory = aiosqlite.Row
+        async with db.write() as conn:
             cursor = await conn.execute(
                 """
                 INSERT INTO configs 
-                (user_id, device_type, client_public_key, client_private_key, client_ip, config_name)
-                VALUES (?, ?, ?, ?, ?, ?)
+                (user_id, device_type, client_public_key, client_private_key, client_ip, config_name, server_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
                 """,
-                (user_id, device_type, client_public_key, client_private_key, client_ip, config_name)
+                (user_id, device_type, client_public_key, client_private_key, client_ip, config_name, server_id)
             )
-            await conn.commit()
             
-            logger.info(f"Конфигурация создана: user_id={user_id}, device_type={device_type}")
+            logger.info(f"Конфигурация создана: user_id={user_id}, device_type={device_type}, server={server_id}")
             return cursor.lastrowid
     
     @staticmethod
@@ -141,8 +253,7 @@ class ConfigRepository:
         Returns:
             Optional[Dict[str, Any]]: Данные конфигурации или None
         """
-        async with aiosqlite.connect(db.db_path) as conn:
-            conn.row_factory = aiosqlite.Row
+        async with db.read() as conn:
             cursor = await conn.execute(
                 "SELECT * FROM configs WHERE user_id = ? AND device_type = ?",
                 (user_id, device_type)
@@ -150,6 +261,22 @@ class ConfigRepository:
             row = await cursor.fetchone()
             return dict(row) if row else None
     
+    @staticmethod
+    async def set_file_id(config_id: int, file_id: str, file_hash: str) -> None:
+        """
+        Сохранение file_id отправленного документа Telegram
+        
+        Args:
+            config_id: ID конфигурации
+            file_id: file_id документа
+            file_hash: Хэш отправленного содержимого и имени файла
+        """
+        async with db.write() as conn:
+            await conn.execute(
+                "UPDATE configs SET tg_file_id = ?, tg_file_hash = ? WHERE id = ?",
+                (file_id, file_hash, config_id)
+            )
+    
     @staticmethod
     async def get_user_configs(user_id: int) -> List[Dict[str, Any]]:
         """
@@ -161,8 +288,7 @@ class ConfigRepository:
         Returns:
             List[Dict[str, Any]]: Список конфигураций
         """
-        async with aiosqlite.connect(db.db_path) as conn:
-            conn.row_factory = aiosqlite.Row
+        async with db.read() as conn:
             cursor = await conn.execute(
                 "SELECT * FROM configs WHERE user_id = ? ORDER BY created_at DESC",
                 (user_id,)
@@ -178,8 +304,7 @@ class ConfigRepository:
         Returns:
             List[Dict[str, Any]]: Список всех конфигураций
         """
-        async with aiosqlite.connect(db.db_path) as conn:
-            conn.row_factory = aiosqlite.Row
+        async with db.read() as conn:
             cursor = await conn.execute(
                 """
                 SELECT c.*, u.telegram_id, u.username 
@@ -190,32 +315,87 @@ class ConfigRepository:
             )
             rows = await cursor.fetchall()
             return [dict(row) for row in rows]
+    
+    @staticmethod
+    async def get_server_configs(server_id: str) -> List[Dict[str, Any]]:
+        """
+        Получение конфигураций, размещенных на сервере
+        
+        Args:
+            server_id: Идентификатор сервера
+            
+        Returns:
+            List[Dict[str, Any]]: Список конфигураций сервера
+        """
+        async with db.read() as conn:
+            cursor = await conn.execute(
+                """
+                SELECT c.*, u.telegram_id, u.username 
+                FROM configs c
+                JOIN users u ON c.user_id = u.id
+                WHERE c.server_id = ?
+                ORDER BY c.created_at DESC
+                """,
+                (server_id,)
+            )
+            rows = await cursor.fetchall()
+            return [dict(row) for row in rows]
+    
+    @staticmethod
+    async def get_used_ips(server_id: str, client_ips: Iterable[str]) -> Set[str]:
+        """
+        Адреса из списка, которые еще заняты конфигурациями сервера
+        
+        Args:
+            server_id: Идентификатор сервера
+            client_ips: Проверяемые IP адреса
+            
+        Returns:
+            Set[str]: Адреса, на которые ссылаются записи configs
+        """
+        client_ips = list(client_ips)
+        if not client_ips:
+            return set()
+        
+        async with db.read() as conn:
+            cursor = await conn.execute(
+                f"""
+                SELECT DISTINCT client_ip FROM configs
+                WHERE server_id = ? AND client_ip IN ({', '.join('?' * len(client_ips))})
+                """,
+                (server_id, *client_ips)
+            )
+            return {row[0] for row in await cursor.fetchall()}
+    
+    @staticmethod
+    async def delete_config(config_id: int) -> None:
+        """
+        Удаление конфигурации из базы (peer на сервере не затрагивается)
+        
+        Args:
+            config_id: ID конфигурации
+        """
+        async with db.write() as conn:
+            await conn.execute("DELETE FROM configs WHERE id = ?", (config_id,))
 
 
 class RequestRepository:
     """Репозиторий для работы с историей запросов"""
     
     @staticmethod
-    async def log_request(user_id: int, device_type: str, action: str) -> int:
+    async def log_request(user_id: int, device_type: str, action: str) -> None:
         """
         Логирование запроса пользователя
         
+        Запись выполняется отложенно пачками (src/database/request_log.py),
+        поэтому запрос появляется в таблице в течение REQUEST_LOG_FLUSH_MS.
+        
         Args:
             user_id: ID пользователя
             device_type: Тип устройства
             action: Выполненное действие
-            
-        Returns:
-            int: ID записи
         """
-        async with aiosqlite.connect(db.db_path) as conn:
-            conn.row_factory = aiosqlite.Row
-            cursor = await conn.execute(
-                "INSERT INTO requests (user_id, device_type, action) VALUES (?, ?, ?)",
-                (user_id, device_type, action)
-            )
-            await conn.commit()
-            return cursor.lastrowid
+        await request_log.log(user_id, device_type, action)
     
     @staticmethod
     async def get_user_requests(user_id: int, limit: int = 50) -> List[Dict[str, Any]]:
@@ -229,8 +409,7 @@ class RequestRepository:
         Returns:
             List[Dict[str, Any]]: История запросов
         """
-        async with aiosqlite.connect(db.db_path) as conn:
-            conn.row_factory = aiosqlite.Row
+        async with db.read() as conn:
             cursor = await conn.execute(
                 """
                 SELECT * FROM requests 
@@ -254,8 +433,7 @@ class RequestRepository:
         Returns:
             List[Dict[str, Any]]: История запросов
         """
-        async with aiosqlite.connect(db.db_path) as conn:
-            conn.row_factory = aiosqlite.Row
+        async with db.read() as conn:
             cursor = await conn.execute(
                 """
                 SELECT r.*, u.telegram_id, u.username 
@@ -269,42 +447,151 @@ class RequestRepository:
             rows = await cursor.fetchall()
             return [dict(row) for row in rows]
     
+    @staticmethod
+    async def get_daily_activity(days: int = 7) -> Dict[str, int]:
+        """
+        Количество запросов по дням: подробная история и свернутые дни
+        
+        Args:
+            days: Количество последних дней (включая текущий)
+            
+        Returns:
+            Dict[str, int]: {день (YYYY-MM-DD): количество запросов}
+        """
+        since = f"-{max(1, days) - 1} days"
+        async with db.read() as conn:
+            cursor = await conn.execute("""
+                SELECT day, SUM(n) FROM (
+                    SELECT date(timestamp) AS day, COUNT(*) AS n
+                    FROM requests
+                    WHERE timestamp >= date('now', ?)
+                    GROUP BY day
+                    UNION ALL
+                    SELECT day, SUM(count) AS n
+                    FROM requests_daily
+                    WHERE day >= date('now', ?)
+                    GROUP BY day
+                )
+                GROUP BY day
+                ORDER BY day
+            """, (since, since))
+            rows = await cursor.fetchall()
+            return {row[0]: row[1] for row in rows}
+    
     @staticmethod
     async def get_statistics() -> Dict[str, Any]:
         """
         Получение статистики использования бота
         
+        Значения берутся из stats_counters, которые поддерживаются
+        триггерами, поэтому время запроса не зависит от размера таблиц.
+        
         Returns:
             Dict[str, Any]: Статистика
         """
-        async with aiosqlite.connect(db.db_path) as conn:
-            conn.row_factory = aiosqlite.Row
-            # Общее количество пользователей
-            cursor = await conn.execute("SELECT COUNT(*) FROM users")
-            total_users = (await cursor.fetchone())[0]
-            
-            # Общее количество конфигураций
-            cursor = await conn.execute("SELECT COUNT(*) FROM configs")
-            total_configs = (await cursor.fetchone())[0]
+        async with db.read() as conn:
+            cursor = await conn.execute("SELECT name, value FROM stats_counters ORDER BY name")
+            counters = {row[0]: row[1] for row in await cursor.fetchall()}
+        
+        def group(prefix: str) -> Dict[str, int]:
+            return {
+                name[len(prefix):]: value
+                for name, value in counters.items()
+                if name.startswith(prefix) and value
+            }
+        
+        return {
+            "total_users": counters.get("users", 0),
+            "total_configs": counters.get("configs", 0),
+            "total_requests": counters.get("requests", 0),
+            "configs_by_type": group("configs:device:"),
+            "requests_by_action": group("requests:action:")
+        }
+
+
+class SyncStateRepository:
+    """Репозиторий состояния последних сверок серверов"""
+    
+    @staticmethod
+    async def get_config_revision(server_id: str) -> int:
+        """
+        Ревизия конфигов сервера
+        
+        Увеличивается триггерами при добавлении, удалении и изменении
+        конфигов сервера.
+        
+        Args:
+            server_id: Идентификатор сервера
             
-            # Общее количество запросов
-            cursor = await conn.execute("SELECT COUNT(*) FROM requests")
-            total_requests = (await cursor.fetchone())[0]
+        Returns:
+            int: Ревизия (0 - конфиги сервера не менялись)
+        """
+        async with db.read() as conn:
+            cursor = await conn.execute(
+                "SELECT revision FROM config_revisions WHERE server_id = ?",
+                (server_id,)
+            )
+            row = await cursor.fetchone()
+            return row[0] if row else 0
+    
+    @staticmethod
+    async def get_state(server_id: str, task: str) -> Optional[Dict[str, Any]]:
+        """
+        Состояние последней сверки
+        
+        Args:
+            server_id: Идентификатор сервера
+            task: Вид сверки
             
-            # Конфигурации по типам устройств
+        Returns:
+            Optional[Dict[str, Any]]: fingerprint, summary, updated_at или None
+        """
+        async with db.read() as conn:
             cursor = await conn.execute(
+                "SELECT fingerprint, summary, updated_at FROM sync_state WHERE server_id = ? AND task = ?",
+                (server_id, task)
+            )
+            row = await cursor.fetchone()
+        
+        if not row:
+            return None
+        
+        return {
+            "fingerprint": json.loads(row['fingerprint']),
+            "summary": json.loads(row['summary']) if row['summary'] else {},
+            "updated_at": row['updated_at']
+        }
+    
+    @staticmethod
+    async def save_state(
+        server_id: str,
+        task: str,
+        fingerprint: Dict[str, Any],
+        summary: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """
+        Сохранение состояния сверки
+        
+        Args:
+            server_id: Идентификатор сервера
+            task: Вид сверки
+            fingerprint: Отпечатки источников после сверки
+            summary: Итоги сверки
+        """
+        async with db.write() as conn:
+            await conn.execute(
                 """
-                SELECT device_type, COUNT(*) as count 
-                FROM configs 
-                GROUP BY device_type
-                """
+                INSERT INTO sync_state (server_id, task, fingerprint, summary, updated_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(server_id, task) DO UPDATE SET
+                    fingerprint = excluded.fingerprint,
+                    summary = excluded.summary,
+                    updated_at = excluded.updated_at
+                """,
+                (
+                    server_id,
+                    task,
+                    json.dumps(fingerprint, sort_keys=True),
+                    json.dumps(summary or {}, ensure_ascii=False)
+                )
             )
-            configs_by_type = {row[0]: row[1] for row in await cursor.fetchall()}
-            
-            return {
-                "total_users": total_users,
-                "total_configs": total_configs,
-                "total_requests": total_requests,
-                "configs_by_type": configs_by_type
-            }
-
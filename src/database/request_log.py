@@ -0,0 +1,169 @@
+"""
+Буферизованная запись истории запросов
+
+События накапливаются в памяти и записываются в таблицу requests одной
+транзакцией (executemany): каждые REQUEST_LOG_BATCH_SIZE событий, не реже
+раза в REQUEST_LOG_FLUSH_MS и при остановке. Выдача конфига не ждет
+записи истории в базу.
+"""
+import asyncio
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from src.config.settings import settings
+from src.database.models import db
+from src.utils.logger import logger
+
+
+class RequestLogWriter:
+    """Буфер записи истории запросов с ограниченным размером"""
+    
+    # Поведение при заполненном буфере: отбросить событие или ждать записи
+    OVERFLOW_POLICIES = ("drop", "block")
+    
+    def __init__(
+        self,
+        batch_size: int = 100,
+        flush_interval_ms: float = 500,
+        max_pending: int = 10000,
+        overflow: str = "drop"
+    ):
+        """
+        Инициализация буфера
+        
+        Args:
+            batch_size: Количество событий, при котором запись выполняется сразу
+            flush_interval_ms: Максимальная задержка записи (мс)
+            max_pending: Максимальное количество событий в буфере
+            overflow: drop (отбросить новое событие) или block (ждать записи)
+        """
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise Exception(f"Неизвестная политика переполнения: {overflow} (допустимо: drop, block)")
+        
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_pending = max(self.batch_size, max_pending)
+        self.overflow = overflow
+        
+        # (user_id, device_type, action, timestamp)
+        self._pending: List[Tuple[int, str, str, str]] = []
+        self.dropped = 0
+        
+        self._worker: Optional[asyncio.Task] = None
+        self._full: Optional[asyncio.Event] = None
+        self._space: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._closing = False
+    
+    def _start(self) -> None:
+        """Запуск фоновой записи при первом событии"""
+        if self._full is None:
+            self._full = asyncio.Event()
+            self._space = asyncio.Event()
+            self._space.set()
+            self._flush_lock = asyncio.Lock()
+        
+        if self._worker is None or self._worker.done():
+            self._closing = False
+            self._worker = asyncio.create_task(self._run())
+    
+    async def log(self, user_id: int, device_type: str, action: str) -> None:
+        """
+        Добавление события в буфер
+        
+        Args:
+            user_id: ID пользователя
+            device_type: Тип устройства
+            action: Выполненное действие
+        """
+        self._start()
+        
+        while len(self._pending) >= self.max_pending:
+            if self.overflow == "drop":
+                self.dropped += 1
+                if self.dropped == 1 or self.dropped % 1000 == 0:
+                    logger.warning(f"Буфер истории запросов заполнен, отброшено событий: {self.dropped}")
+                return
+            
+            # Ожидаем, пока запись освободит место
+            self._full.set()
+            self._space.clear()
+            await self._space.wait()
+        
+        # Время события, а не записи (формат CURRENT_TIMESTAMP SQLite)
+        timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        self._pending.append((user_id, device_type, action, timestamp))
+        
+        if len(self._pending) >= self.batch_size:
+            self._full.set()
+    
+    async def _run(self) -> None:
+        """Цикл записи: по заполнению пачки или по таймеру"""
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Ошибка записи истории запросов: {e}", exc_info=True)
+    
+    async def flush(self) -> int:
+        """
+        Немедленная запись накопленных событий одной транзакцией
+        
+        Returns:
+            int: Количество записанных событий
+        """
+        if self._flush_lock is None:
+            return 0
+        
+        async with self._flush_lock:
+            self._full.clear()
+            if not self._pending:
+                return 0
+            
+            batch, self._pending = self._pending, []
+            self._space.set()
+            
+            try:
+                async with db.write() as conn:
+                    await conn.executemany(
+                        "INSERT INTO requests (user_id, device_type, action, timestamp) VALUES (?, ?, ?, ?)",
+                        batch
+                    )
+            except Exception as e:
+                # Возвращаем события в буфер для повторной записи (в пределах max_pending)
+                room = max(0, self.max_pending - len(self._pending))
+                self._pending[:0] = batch[:room]
+                if len(batch) > room:
+                    self.dropped += len(batch) - room
+                logger.error(f"Не удалось записать историю запросов ({len(batch)} событий): {e}")
+                return 0
+        
+        logger.debug(f"История запросов записана: {len(batch)} событий")
+        return len(batch)
+    
+    async def close(self) -> None:
+        """Запись оставшихся событий и остановка фоновой записи"""
+        if self._worker is not None and not self._worker.done():
+            self._closing = True
+            self._full.set()
+            await self._worker
+        self._worker = None
+        
+        await self.flush()
+        
+        if self.dropped:
+            logger.warning(f"Событий истории запросов отброшено: {self.dropped}")
+
+
+# Глобальный буфер истории запросов
+request_log = RequestLogWriter(
+    batch_size=settings.REQUEST_LOG_BATCH_SIZE,
+    flush_interval_ms=settings.REQUEST_LOG_FLUSH_MS,
+    max_pending=settings.REQUEST_LOG_MAX_PENDING,
+    overflow=settings.REQUEST_LOG_OVERFLOW
+)
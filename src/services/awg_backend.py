@@ -0,0 +1,666 @@
+"""
+Бэкенды доступа к серверу AmneziaWG
+
+Менеджер работает с сервером через узкий интерфейс: чтение и запись
+файлов конфигурации, применение peer'ов, список peer'ов интерфейса и
+статистика. Реализации:
+- docker - контейнер AmneziaWG (постоянная сессия `docker exec` или Docker Engine API)
+- host - `wg`/`awg` и каталог конфигурации доступны на хосте, файлы читаются напрямую
+- fake - состояние в памяти для тестов и бенчмарков
+"""
+import asyncio
+import hashlib
+import ipaddress
+import os
+import shlex
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from src.config.settings import settings
+from src.services.container_shell import ContainerShell
+from src.services.docker_api import DockerAPIClient
+from src.services.server_profile import ServerProfile
+from src.services.wg_config import WgServerConfig
+from src.utils import wg_keys
+from src.utils.logger import logger
+
+
+class AWGBackend(ABC):
+    """Интерфейс доступа к серверу AmneziaWG"""
+    
+    name = ""
+    
+    def __init__(self, interface: str = "wg0"):
+        """
+        Инициализация бэкенда
+        
+        Args:
+            interface: Имя интерфейса WireGuard
+        """
+        self.interface = interface
+    
+    @abstractmethod
+    async def read_file(
+        self,
+        path: str,
+        fingerprint: Optional[str] = None,
+        missing_ok: bool = False
+    ) -> Tuple[str, Optional[str]]:
+        """
+        Чтение файла, только если изменился его отпечаток
+        
+        Args:
+            path: Путь к файлу
+            fingerprint: Известный отпечаток файла
+            missing_ok: Считать отсутствующий файл пустым
+            
+        Returns:
+            Tuple[str, Optional[str]]: (отпечаток, содержимое или None если файл не изменился).
+                Содержимое возвращается без изменений, включая переводы строк
+                в конце: модель wg0.conf сериализуется обратно байт в байт
+        """
+    
+    @abstractmethod
+    async def file_fingerprint(self, path: str) -> Optional[str]:
+        """
+        Отпечаток файла (размер, mtime, inode)
+        
+        Args:
+            path: Путь к файлу
+            
+        Returns:
+            Optional[str]: Отпечаток или None при ошибке
+        """
+    
+    @abstractmethod
+    async def write_file(self, path: str, content: str) -> None:
+        """
+        Атомарная запись файла
+        
+        Args:
+            path: Путь к файлу
+            content: Содержимое
+            
+        Raises:
+            Exception: При ошибке записи
+        """
+    
+    @abstractmethod
+    async def append_file(self, path: str, text: str) -> None:
+        """
+        Дозапись в конец файла
+        
+        Args:
+            path: Путь к файлу
+            text: Дописываемый фрагмент
+            
+        Raises:
+            Exception: При ошибке записи
+        """
+    
+    @abstractmethod
+    async def set_peers(
+        self,
+        added: List[Dict[str, str]],
+        removed: List[str],
+        preshared_key: str
+    ) -> None:
+        """
+        Инкрементальное применение peer'ов к интерфейсу
+        
+        Args:
+            added: Добавленные peer'ы с ключами public_key и ip
+            removed: Публичные ключи удаленных peer'ов
+            preshared_key: Общий ключ
+            
+        Raises:
+            Exception: Если изменения не применены
+        """
+    
+    @abstractmethod
+    async def sync_config(self, config_path: str) -> None:
+        """
+        Полная синхронизация интерфейса с файлом конфигурации
+        
+        Args:
+            config_path: Путь к wg0.conf
+            
+        Raises:
+            Exception: Если синхронизация не удалась
+        """
+    
+    @abstractmethod
+    async def list_peers(self) -> Dict[str, Set[str]]:
+        """
+        Peer'ы интерфейса
+        
+        Returns:
+            Dict[str, Set[str]]: {public_key: AllowedIPs}
+        """
+    
+    @abstractmethod
+    async def dump(self) -> List[Dict[str, Any]]:
+        """
+        Статистика peer'ов интерфейса (без секретных ключей)
+        
+        Returns:
+            List[Dict[str, Any]]: public_key, endpoint, allowed_ips,
+            latest_handshake, transfer_rx, transfer_tx
+        """
+    
+    @abstractmethod
+    async def generate_private_key(self) -> str:
+        """Генерация приватного ключа средствами сервера (`wg genkey`)"""
+    
+    @abstractmethod
+    async def derive_public_key(self, private_key: str) -> str:
+        """Вычисление публичного ключа средствами сервера (`wg pubkey`)"""
+    
+    async def peers_fingerprint(self) -> Optional[str]:
+        """
+        Отпечаток набора peer'ов интерфейса
+        
+        Меняется при добавлении и удалении peer'ов, в том числе при
+        перезапуске контейнера, который очищает интерфейс.
+        
+        Returns:
+            Optional[str]: Отпечаток или None при ошибке
+        """
+        try:
+            peers = await self.list_peers()
+        except Exception:
+            return None
+        
+        lines = sorted(f"{key} {' '.join(sorted(ips))}" for key, ips in peers.items())
+        return hashlib.sha256("\n".join(lines).encode()).hexdigest()
+    
+    async def close(self) -> None:
+        """Освобождение ресурсов бэкенда"""
+
+
+class ShellBackend(AWGBackend):
+    """Общая часть бэкендов, выполняющих команды `wg` в оболочке"""
+    
+    # Количество peer'ов в одной команде wg set
+    APPLY_CHUNK_SIZE = 200
+    
+    def __init__(self, interface: str = "wg0", wg_binary: str = "wg"):
+        """
+        Инициализация бэкенда
+        
+        Args:
+            interface: Имя интерфейса WireGuard
+            wg_binary: Утилита управления (wg или awg)
+        """
+        super().__init__(interface)
+        self.wg = wg_binary
+    
+    @abstractmethod
+    async def run(self, command: str) -> Tuple[str, str, int]:
+        """
+        Выполнение shell-команды
+        
+        Args:
+            command: Команда
+            
+        Returns:
+            Tuple[str, str, int]: (stdout, stderr, return_code)
+        """
+    
+    async def _run_checked(self, command: str, action: str) -> str:
+        """
+        Выполнение команды с исключением при ошибке
+        
+        Args:
+            command: Команда
+            action: Описание операции для сообщения об ошибке
+            
+        Returns:
+            str: stdout
+        """
+        stdout, stderr, code = await self.run(command)
+        if code != 0:
+            raise Exception(f"Ошибка {action}: {stderr}")
+        return stdout
+    
+    async def set_peers(
+        self,
+        added: List[Dict[str, str]],
+        removed: List[str],
+        preshared_key: str
+    ) -> None:
+        """Применение peer'ов через `wg set` порциями по APPLY_CHUNK_SIZE"""
+        commands = []
+        psk = shlex.quote(preshared_key)
+        
+        for peer in added:
+            commands.append(
+                f"printf '%s\\n' {psk} | {self.wg} set {self.interface} peer {shlex.quote(peer['public_key'])} "
+                f"preshared-key /dev/stdin allowed-ips {shlex.quote(peer['ip'])}/32"
+            )
+        for public_key in removed:
+            commands.append(f"{self.wg} set {self.interface} peer {shlex.quote(public_key)} remove")
+        
+        # Ограничиваем длину одной команды (лимит размера аргумента sh -c)
+        for i in range(0, len(commands), self.APPLY_CHUNK_SIZE):
+            chunk = commands[i:i + self.APPLY_CHUNK_SIZE]
+            await self._run_checked(" && ".join(chunk), "применения через wg set")
+    
+    async def sync_config(self, config_path: str) -> None:
+        """Синхронизация через `wg syncconf`, при ошибке - `wg setconf`"""
+        quoted = shlex.quote(config_path)
+        # Без pipefail ошибка strip передала бы в syncconf пустую конфигурацию
+        sync_cmd = (
+            f"conf=$({self.wg}-quick strip {quoted}) && "
+            f"printf '%s\\n' \"$conf\" | {self.wg} syncconf {self.interface} /dev/stdin"
+        )
+        stdout, stderr, code = await self.run(sync_cmd)
+        
+        if code == 0:
+            logger.info("Изменения успешно применены через syncconf")
+            return
+        
+        logger.warning(f"Не удалось применить через syncconf: {stderr}, пробуем альтернативный метод")
+        await self._run_checked(f"{self.wg} setconf {self.interface} {quoted}", "применения через setconf")
+        logger.info("Изменения применены через setconf")
+    
+    async def peers_fingerprint(self) -> Optional[str]:
+        """Контрольная сумма `wg show allowed-ips` без передачи списка peer'ов"""
+        # Без pipefail ошибка wg show дала бы контрольную сумму пустого вывода
+        stdout, stderr, code = await self.run(
+            f"out=$({self.wg} show {self.interface} allowed-ips) && printf '%s' \"$out\" | cksum"
+        )
+        return stdout if code == 0 else None
+    
+    async def list_peers(self) -> Dict[str, Set[str]]:
+        """Peer'ы интерфейса из `wg show allowed-ips`"""
+        output = await self._run_checked(f"{self.wg} show {self.interface} allowed-ips", "чтения peer'ов интерфейса")
+        
+        peers = {}
+        for line in output.split('\n'):
+            parts = line.split()
+            if parts:
+                peers[parts[0]] = {ip for ip in parts[1:] if ip != '(none)'}
+        return peers
+    
+    async def dump(self) -> List[Dict[str, Any]]:
+        """Статистика peer'ов из `wg show dump`"""
+        output = await self._run_checked(f"{self.wg} show {self.interface} dump", "чтения статистики интерфейса")
+        
+        peers = []
+        # Первая строка - сам интерфейс (с приватным ключом), пропускаем
+        for line in output.split('\n')[1:]:
+            parts = line.split('\t')
+            if len(parts) < 7:
+                continue
+            peers.append({
+                "public_key": parts[0],
+                "endpoint": None if parts[2] == '(none)' else parts[2],
+                "allowed_ips": [ip for ip in parts[3].split(',') if ip and ip != '(none)'],
+                "latest_handshake": int(parts[4]),
+                "transfer_rx": int(parts[5]),
+                "transfer_tx": int(parts[6])
+            })
+        return peers
+    
+    async def generate_private_key(self) -> str:
+        """Генерация приватного ключа через `wg genkey`"""
+        return await self._run_checked(f"{self.wg} genkey", "генерации приватного ключа")
+    
+    async def derive_public_key(self, private_key: str) -> str:
+        """Вычисление публичного ключа через `wg pubkey`"""
+        # Приватный ключ передается только внутри команды, без записи в файл
+        return await self._run_checked(
+            f"echo {shlex.quote(private_key)} | {self.wg} pubkey",
+            "генерации публичного ключа"
+        )
+
+
+class DockerBackend(ShellBackend):
+    """AmneziaWG в Docker контейнере"""
+    
+    name = "docker"
+    
+    def __init__(
+        self,
+        container: str,
+        transport: str = "session",
+        socket_path: str = "/var/run/docker.sock",
+        interface: str = "wg0",
+        wg_binary: str = "wg"
+    ):
+        """
+        Инициализация бэкенда
+        
+        Args:
+            container: Имя контейнера
+            transport: session (постоянный docker exec) или api (Docker Engine API)
+            socket_path: Путь к сокету Docker для транспорта api
+            interface: Имя интерфейса WireGuard
+            wg_binary: Утилита управления (wg или awg)
+        """
+        super().__init__(interface, wg_binary)
+        self.container = container
+        
+        # Оба транспорта предоставляют execute, write_file и close
+        if transport == "api":
+            self.transport = DockerAPIClient(container, socket_path)
+        else:
+            self.transport = ContainerShell(container)
+    
+    @staticmethod
+    def _stat_command(path: str) -> str:
+        """
+        Команда получения отпечатка файла (размер, mtime, inode)
+        
+        Args:
+            path: Путь к файлу в контейнере
+            
+        Returns:
+            str: Команда stat
+        """
+        return f"stat -c '%s %Y %i' {shlex.quote(path)}"
+    
+    async def run(self, command: str) -> Tuple[str, str, int]:
+        """Выполнение команды внутри контейнера"""
+        try:
+            return await self.transport.execute(command)
+        except Exception as e:
+            logger.error(f"Ошибка выполнения команды '{command}': {e}")
+            raise
+    
+    async def read_file(
+        self,
+        path: str,
+        fingerprint: Optional[str] = None,
+        missing_ok: bool = False
+    ) -> Tuple[str, Optional[str]]:
+        """Проверка отпечатка и чтение файла одним вызовом в контейнер"""
+        quoted = shlex.quote(path)
+        read_cmd = (
+            f"fp=$({self._stat_command(path)}) || exit 1; echo \"$fp\"; "
+            f"[ \"$fp\" = {shlex.quote(fingerprint or '')} ] || {{ cat {quoted} && printf .; }}"
+        )
+        if missing_ok:
+            read_cmd = f"[ -e {quoted} ] || exit 0; {read_cmd}"
+        
+        output, stderr, code = await self.run(read_cmd)
+        
+        if code != 0:
+            raise Exception(f"Ошибка чтения {path}: {stderr}")
+        
+        new_fingerprint, _, content = output.partition('\n')
+        if fingerprint is not None and new_fingerprint == fingerprint:
+            return new_fingerprint, None
+        # Транспорт обрезает пробелы по краям вывода: точка после cat
+        # сохраняет переводы строк в конце файла
+        return new_fingerprint, content[:-1] if content.endswith('.') else content
+    
+    async def file_fingerprint(self, path: str) -> Optional[str]:
+        """Отпечаток файла в контейнере"""
+        fingerprint, stderr, code = await self.run(self._stat_command(path))
+        return fingerprint if code == 0 else None
+    
+    async def write_file(self, path: str, content: str) -> None:
+        """Атомарная запись файла в контейнер"""
+        try:
+            stdout, stderr, code = await self.transport.write_file(path, content)
+        except Exception as e:
+            logger.error(f"Ошибка записи файла '{path}': {e}")
+            raise
+        
+        if code != 0:
+            raise Exception(f"Ошибка записи {path}: {stderr}")
+    
+    async def append_file(self, path: str, text: str) -> None:
+        """Дозапись в файл контейнера"""
+        await self._run_checked(
+            f"printf '%s' {shlex.quote(text)} >> {shlex.quote(path)}",
+            f"дозаписи {path}"
+        )
+    
+    async def close(self) -> None:
+        """Закрытие сессии с контейнером"""
+        await self.transport.close()
+
+
+class HostBackend(ShellBackend):
+    """AmneziaWG на хосте: файлы читаются напрямую, `wg` запускается локально"""
+    
+    name = "host"
+    
+    @staticmethod
+    def _stat(path: str) -> Optional[str]:
+        """
+        Отпечаток файла в том же формате, что и `stat -c '%s %Y %i'`
+        
+        Args:
+            path: Путь к файлу
+            
+        Returns:
+            Optional[str]: Отпечаток или None, если файла нет
+        """
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return f"{st.st_size} {int(st.st_mtime)} {st.st_ino}"
+    
+    async def run(self, command: str) -> Tuple[str, str, int]:
+        """Выполнение команды на хосте"""
+        process = await asyncio.create_subprocess_shell(
+            command,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        stdout, stderr = await process.communicate()
+        return (
+            stdout.decode("utf-8", errors="replace").strip(),
+            stderr.decode("utf-8", errors="replace").strip(),
+            process.returncode
+        )
+    
+    async def read_file(
+        self,
+        path: str,
+        fingerprint: Optional[str] = None,
+        missing_ok: bool = False
+    ) -> Tuple[str, Optional[str]]:
+        """Чтение файла с диска, если изменился отпечаток"""
+        def read() -> Tuple[str, Optional[str]]:
+            new_fingerprint = self._stat(path)
+            if new_fingerprint is None:
+                if missing_ok:
+                    return "", "" if fingerprint != "" else None
+                raise Exception(f"Ошибка чтения {path}: файл не найден")
+            
+            if fingerprint is not None and new_fingerprint == fingerprint:
+                return new_fingerprint, None
+            with open(path, encoding="utf-8") as f:
+                return new_fingerprint, f.read()
+        
+        return await asyncio.to_thread(read)
+    
+    async def file_fingerprint(self, path: str) -> Optional[str]:
+        """Отпечаток файла на диске"""
+        return await asyncio.to_thread(self._stat, path)
+    
+    async def write_file(self, path: str, content: str) -> None:
+        """Атомарная запись через временный файл и переименование"""
+        if not content.endswith("\n"):
+            content += "\n"
+        
+        def write() -> None:
+            tmp_path = f"{path}.tmp"
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        
+        await asyncio.to_thread(write)
+    
+    async def append_file(self, path: str, text: str) -> None:
+        """Дозапись в файл на диске"""
+        def append() -> None:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(text)
+        
+        await asyncio.to_thread(append)
+
+
+class FakeBackend(AWGBackend):
+    """Сервер в памяти: для тестов и бенчмарков без Docker"""
+    
+    name = "fake"
+    
+    def __init__(
+        self,
+        files: Optional[Dict[str, str]] = None,
+        interface: str = "wg0",
+        latency: float = 0.0
+    ):
+        """
+        Инициализация бэкенда
+        
+        Args:
+            files: Начальное содержимое файлов {путь: текст}
+            interface: Имя интерфейса WireGuard
+            latency: Имитация задержки каждого обращения к серверу (секунды)
+        """
+        super().__init__(interface)
+        self.files: Dict[str, str] = dict(files or {})
+        self.peers: Dict[str, Set[str]] = {}
+        self.latency = latency
+        self.calls = 0
+        self._versions: Dict[str, int] = {}
+    
+    @classmethod
+    def with_server(cls, config_path: str, network: str, **kwargs) -> "FakeBackend":
+        """
+        Бэкенд с пустым сервером: wg0.conf только с секцией [Interface]
+        
+        Args:
+            config_path: Каталог конфигурации сервера
+            network: Сеть клиентов (адрес сервера - первый адрес сети)
+            
+        Returns:
+            FakeBackend: Бэкенд
+        """
+        interface = ipaddress.IPv4Network(network, strict=False)
+        server_config = (
+            "[Interface]\n"
+            f"PrivateKey = {wg_keys.generate_private_key()}\n"
+            f"Address = {interface.network_address + 1}/{interface.prefixlen}\n"
+            "ListenPort = 51820\n"
+        )
+        return cls(files={f"{config_path}/wg0.conf": server_config}, **kwargs)
+    
+    async def _call(self) -> None:
+        """Учет обращения к серверу"""
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+    
+    def _fingerprint(self, path: str) -> str:
+        return f"{len(self.files[path])} {self._versions.get(path, 0)}"
+    
+    def _touch(self, path: str) -> None:
+        self._versions[path] = self._versions.get(path, 0) + 1
+    
+    async def read_file(
+        self,
+        path: str,
+        fingerprint: Optional[str] = None,
+        missing_ok: bool = False
+    ) -> Tuple[str, Optional[str]]:
+        await self._call()
+        if path not in self.files:
+            if missing_ok:
+                return "", "" if fingerprint != "" else None
+            raise Exception(f"Ошибка чтения {path}: файл не найден")
+        
+        new_fingerprint = self._fingerprint(path)
+        if fingerprint is not None and new_fingerprint == fingerprint:
+            return new_fingerprint, None
+        return new_fingerprint, self.files[path]
+    
+    async def file_fingerprint(self, path: str) -> Optional[str]:
+        await self._call()
+        return self._fingerprint(path) if path in self.files else None
+    
+    async def write_file(self, path: str, content: str) -> None:
+        await self._call()
+        self.files[path] = content if content.endswith("\n") else content + "\n"
+        self._touch(path)
+    
+    async def append_file(self, path: str, text: str) -> None:
+        await self._call()
+        self.files[path] = self.files.get(path, "") + text
+        self._touch(path)
+    
+    async def set_peers(
+        self,
+        added: List[Dict[str, str]],
+        removed: List[str],
+        preshared_key: str
+    ) -> None:
+        await self._call()
+        for peer in added:
+            self.peers[peer['public_key']] = {f"{peer['ip']}/32"}
+        for public_key in removed:
+            self.peers.pop(public_key, None)
+    
+    async def sync_config(self, config_path: str) -> None:
+        await self._call()
+        config = WgServerConfig.parse(self.files.get(config_path, ""))
+        self.peers = {key: set(peer.allowed_ips) for key, peer in config.peers.items()}
+    
+    async def list_peers(self) -> Dict[str, Set[str]]:
+        await self._call()
+        return {key: set(ips) for key, ips in self.peers.items()}
+    
+    async def dump(self) -> List[Dict[str, Any]]:
+        await self._call()
+        return [
+            {
+                "public_key": key,
+                "endpoint": None,
+                "allowed_ips": sorted(ips),
+                "latest_handshake": 0,
+                "transfer_rx": 0,
+                "transfer_tx": 0
+            }
+            for key, ips in self.peers.items()
+        ]
+    
+    async def generate_private_key(self) -> str:
+        return wg_keys.generate_private_key()
+    
+    async def derive_public_key(self, private_key: str) -> str:
+        return wg_keys.derive_public_key(private_key)
+
+
+def create_backend(server: ServerProfile) -> AWGBackend:
+    """
+    Создание бэкенда для сервера (AWG_BACKEND или backend в SERVERS_FILE)
+    
+    Args:
+        server: Профиль сервера
+        
+    Returns:
+        AWGBackend: Бэкенд
+    """
+    kind = server.backend
+    if kind == "docker":
+        return DockerBackend(
+            server.container,
+            transport=server.docker_transport,
+            socket_path=server.docker_socket,
+            wg_binary=settings.WG_BINARY
+        )
+    if kind == "host":
+        return HostBackend(wg_binary=settings.WG_BINARY)
+    if kind == "fake":
+        return FakeBackend.with_server(server.config_path, server.network)
+    raise Exception(f"Неизвестный бэкенд сервера {server.id}: {kind} (допустимо: docker, host, fake)")
@@ -2,110 +2,274 @@
 Менеджер AmneziaWG для генерации и управления конфигурациями
 """
 import asyncio
-import json
-from pathlib import Path
-from typing import Optional, Tuple, Dict, Any
+import hashlib
+from typing import Optional, Tuple, Dict, Any, Iterable, List, Set
 
 from src.config.settings import settings
+from src.database.repository import ConfigRepository
+from src.services.awg_backend import AWGBackend, create_backend
+from src.services.clients_table import ClientsTableStore
+from src.services.ip_allocator import IPAllocator
+from src.services.server_mutator import ServerMutator
+from src.services.server_profile import ServerProfile
+from src.services.wg_config import WgServerConfig
+from src.utils import wg_keys
 from src.utils.logger import logger
 
 
 class AmneziaWGManager:
-    """Менеджер для работы с AmneziaWG"""
+    """Менеджер одного сервера AmneziaWG"""
     
-    def __init__(self):
-        """Инициализация менеджера"""
-        self.container = settings.AWG_CONTAINER
-        self.config_path = settings.AWG_CONFIG_PATH
+    def __init__(self, server: Optional[ServerProfile] = None, backend: Optional[AWGBackend] = None):
+        """
+        Инициализация менеджера
+        
+        Args:
+            server: Профиль сервера (по умолчанию из переменных окружения)
+            backend: Бэкенд доступа к серверу (по умолчанию по профилю)
+        """
+        self.server = server or ServerProfile.from_settings()
+        self.config_path = self.server.config_path
+        self.backend = backend or create_backend(self.server)
+        
+        self.local_keygen = True
+        self.allocator: Optional[IPAllocator] = None
+        
+        # Адреса, выданные аллокатором, но еще не добавленные на сервер
+        self._reserved_ips: Set[str] = set()
+        self._allocator_lock = asyncio.Lock()
+        
+        # Кэш разобранного wg0.conf и его отпечаток (размер, mtime, inode)
+        self._server_config: Optional[WgServerConfig] = None
+        self._config_fingerprint: Optional[str] = None
+        self._config_hash: Optional[str] = None
+        
+        # clientsTable с отложенной записью
+        self.clients_table = ClientsTableStore(
+            self.backend,
+            f"{self.config_path}/clientsTable",
+            settings.CLIENTS_TABLE_FLUSH_DELAY
+        )
+        
+        # Единственный писатель wg0.conf и clientsTable
+        self.mutator = ServerMutator(self, settings.PEER_BATCH_WINDOW_MS)
+    
+    async def close(self) -> None:
+        """Запись отложенных изменений и закрытие бэкенда"""
+        try:
+            await self.mutator.close()
+            await self.clients_table.close()
+        finally:
+            await self.backend.close()
+    
+    async def generate_keypair(self) -> Tuple[str, str]:
+        """
+        Генерация пары ключей для клиента
+        
+        Ключи генерируются внутри процесса бота. Если самопроверка при
+        запуске выявила расхождение с `wg pubkey`, используется сервер.
+        
+        Returns:
+            Tuple[str, str]: (private_key, public_key)
+        """
+        if self.local_keygen:
+            return wg_keys.generate_keypair()
+        
+        private_key = await self.backend.generate_private_key()
+        public_key = await self.backend.derive_public_key(private_key)
+        
+        logger.info("Пара ключей успешно сгенерирована на сервере")
+        return private_key, public_key
+    
+    async def verify_local_keygen(self) -> bool:
+        """
+        Самопроверка локальной генерации ключей по `wg pubkey` сервера
+        
+        При расхождении или ошибке проверки генерация ключей
+        переключается на сервер.
+        
+        Returns:
+            bool: True если локальные ключи совпадают с `wg pubkey`
+        """
+        private_key, public_key = wg_keys.generate_keypair()
+        
+        try:
+            expected = await self.backend.derive_public_key(private_key)
+        except Exception as e:
+            logger.warning(f"Не удалось проверить генерацию ключей через wg pubkey: {e}")
+            self.local_keygen = False
+            return self.local_keygen
+        
+        if expected != public_key:
+            logger.error("Локальная генерация ключей не совпадает с wg pubkey, используем сервер")
+            self.local_keygen = False
+        else:
+            logger.info("Локальная генерация ключей проверена через wg pubkey")
+            self.local_keygen = True
+        
+        return self.local_keygen
+    
+    @property
+    def server_config_path(self) -> str:
+        """Путь к wg0.conf на сервере"""
+        return f"{self.config_path}/wg0.conf"
+    
+    async def get_server_config(self) -> WgServerConfig:
+        """
+        Получение разобранной конфигурации сервера
+        
+        Файл перечитывается только если изменился его отпечаток
+        (размер, mtime, inode); проверка и чтение - одно обращение к бэкенду.
+        
+        Returns:
+            WgServerConfig: Модель wg0.conf
+        """
+        cached = self._config_fingerprint if self._server_config is not None else None
+        fingerprint, content = await self.backend.read_file(self.server_config_path, cached)
+        
+        if content is None:
+            return self._server_config
+        
+        content_hash = self._content_hash(content)
+        self._config_fingerprint = fingerprint
+        
+        if self._server_config is not None and content_hash == self._config_hash:
+            # Изменились только метаданные файла
+            return self._server_config
+        
+        if self._server_config is not None:
+            # Файл изменен извне (приложение AmneziaVPN, инструменты) - пересобираем пул адресов
+            logger.info("wg0.conf изменен извне, перечитываем конфигурацию")
+            self.allocator = None
+        
+        self._server_config = WgServerConfig.parse(content)
+        self._config_hash = content_hash
+        logger.debug(f"wg0.conf загружен: {len(self._server_config.peers)} peer(s)")
+        return self._server_config
     
-    async def _execute_command(self, command: str) -> Tuple[str, str, int]:
+    @staticmethod
+    def _content_hash(content: str) -> str:
         """
-        Выполнение команды через asyncio
+        Хэш содержимого wg0.conf (без учета пробелов по краям)
         
         Args:
-            command: Команда для выполнения
+            content: Содержимое файла
             
         Returns:
-            Tuple[str, str, int]: (stdout, stderr, return_code)
+            str: SHA-256 в hex
+        """
+        return hashlib.sha256(content.strip().encode('utf-8')).hexdigest()
+    
+    async def _save_server_config(self, config: WgServerConfig) -> None:
+        """
+        Запись модели конфигурации в wg0.conf целиком
+        
+        Args:
+            config: Модель конфигурации
         """
         try:
-            process = await asyncio.create_subprocess_shell(
-                command,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            stdout, stderr = await process.communicate()
-            
-            return (
-                stdout.decode('utf-8').strip(),
-                stderr.decode('utf-8').strip(),
-                process.returncode
-            )
+            await self.backend.write_file(self.server_config_path, config.serialize())
         except Exception as e:
-            logger.error(f"Ошибка выполнения команды '{command}': {e}")
-            raise
+            raise Exception(f"Ошибка записи конфигурации: {e}")
+        
+        await self._remember_written(config)
     
-    async def generate_keypair(self) -> Tuple[str, str]:
+    async def _remember_written(self, config: WgServerConfig) -> None:
         """
-        Генерация пары ключей для клиента
+        Обновление кэша после собственной записи wg0.conf
+        
+        Args:
+            config: Модель, соответствующая содержимому файла
+        """
+        self._server_config = config
+        self._config_hash = self._content_hash(config.serialize())
+        # Без отпечатка следующее чтение просто перечитает файл
+        self._config_fingerprint = await self.backend.file_fingerprint(self.server_config_path)
+    
+    async def _load_allocator(self) -> IPAllocator:
+        """
+        Построение аллокатора адресов из wg0.conf и таблицы configs
+        
+        Выполняется при первом обращении и после внешнего изменения
+        wg0.conf, в остальное время битовая карта обновляется
+        инкрементально при добавлении и удалении peer'ов.
         
         Returns:
-            Tuple[str, str]: (private_key, public_key)
+            IPAllocator: Аллокатор с отмеченными занятыми адресами
         """
-        # Генерируем приватный ключ
-        private_cmd = f"docker exec {self.container} wg genkey"
-        private_key, stderr, code = await self._execute_command(private_cmd)
+        config = await self.get_server_config()
         
-        if code != 0:
-            raise Exception(f"Ошибка генерации приватного ключа: {stderr}")
+        allocator = IPAllocator(self.server.network, self.server.ip_start)
         
-        # Генерируем публичный ключ из приватного
-        public_cmd = f"echo '{private_key}' | docker exec -i {self.container} wg pubkey"
-        public_key, stderr, code = await self._execute_command(public_cmd)
+        # Адрес интерфейса сервера и все AllowedIPs peer'ов
+        allocator.mark_many(config.used_addresses())
         
-        if code != 0:
-            raise Exception(f"Ошибка генерации публичного ключа: {stderr}")
+        # Адреса из базы бота (peer мог временно пропасть с сервера)
+        rows = await ConfigRepository.get_server_configs(self.server.id)
+        allocator.mark_many(row['client_ip'] for row in rows)
         
-        logger.info("Пара ключей успешно сгенерирована")
-        return private_key, public_key
+        # Адреса, выданные, но еще не записанные на сервер
+        allocator.mark_many(self._reserved_ips)
+        
+        stats = allocator.stats()
+        logger.info(
+            f"Аллокатор адресов сервера {self.server.id} построен: {stats['network']}, "
+            f"занято {stats['used']} из {stats['capacity']}"
+        )
+        return allocator
+    
+    async def get_allocator(self) -> IPAllocator:
+        """
+        Получение аллокатора адресов
+        
+        Аллокатор строится при первом обращении и пересобирается,
+        если wg0.conf был изменен извне.
+        
+        Returns:
+            IPAllocator: Аллокатор адресов
+        """
+        async with self._allocator_lock:
+            await self.get_server_config()
+            if self.allocator is None:
+                self.allocator = await self._load_allocator()
+            return self.allocator
     
     async def get_next_available_ip(self) -> str:
         """
         Получение следующего свободного IP адреса
         
+        Адрес сразу помечается занятым, поэтому повторный вызов
+        не вернет его до освобождения через release_ip.
+        
         Returns:
             str: Свободный IP адрес
         """
-        # Читаем текущую конфигурацию
-        read_cmd = f"docker exec {self.container} cat {self.config_path}/wg0.conf"
-        config_content, stderr, code = await self._execute_command(read_cmd)
-        
-        if code != 0:
-            logger.error(f"Ошибка чтения конфигурации: {stderr}")
-            # Если не можем прочитать, используем стартовый IP
-            return settings.CLIENT_IP_START
-        
-        # Парсим используемые IP
-        used_ips = []
-        for line in config_content.split('\n'):
-            if line.strip().startswith('AllowedIPs'):
-                ip_with_mask = line.split('=')[1].strip()
-                ip = ip_with_mask.split('/')[0]
-                # Извлекаем последний октет
-                last_octet = int(ip.split('.')[-1])
-                used_ips.append(last_octet)
-        
-        # Находим следующий свободный IP
-        network_base = '.'.join(settings.CLIENT_IP_START.split('.')[:-1])
-        start_octet = int(settings.CLIENT_IP_START.split('.')[-1])
-        
-        for i in range(start_octet, 255):
-            if i not in used_ips:
-                next_ip = f"{network_base}.{i}"
-                logger.info(f"Найден свободный IP: {next_ip}")
-                return next_ip
-        
-        raise Exception("Нет доступных IP адресов в сети")
+        allocator = await self.get_allocator()
+        next_ip = allocator.allocate()
+        self._reserved_ips.add(next_ip)
+        logger.info(f"Найден свободный IP: {next_ip}")
+        return next_ip
+    
+    def release_ip(self, client_ip: str) -> None:
+        """
+        Возврат IP адреса в пул
+        
+        Args:
+            client_ip: IP адрес клиента
+        """
+        self._reserved_ips.discard(client_ip)
+        if self.allocator is not None and self.allocator.release(client_ip):
+            logger.info(f"IP адрес освобожден: {client_ip}")
+    
+    async def get_pool_stats(self) -> Dict[str, Any]:
+        """
+        Статистика использования пула адресов
+        
+        Returns:
+            Dict[str, Any]: Емкость, занятость, утилизация и фрагментация пула
+        """
+        allocator = await self.get_allocator()
+        return allocator.stats()
     
     async def add_peer_to_server(
         self,
@@ -116,113 +280,281 @@ class AmneziaWGManager:
         """
         Добавление peer в конфигурацию сервера
         
+        Изменение выполняется через очередь изменений конфигурации и
+        объединяется с другими добавлениями, пришедшими в пределах окна
+        PEER_BATCH_WINDOW_MS. Вызов завершается, когда peer применен.
+        
         Args:
             client_public_key: Публичный ключ клиента
             client_ip: IP адрес клиента
             client_name: Имя клиента
         """
-        # Формируем секцию peer
-        peer_config = f"""
-[Peer]
-PublicKey = {client_public_key}
-PresharedKey = {settings.PRESHARED_KEY}
-AllowedIPs = {client_ip}/32
-"""
+        await self.mutator.add_peer(client_public_key, client_ip, client_name)
+    
+    async def add_peers_to_server(self, peers: List[Dict[str, str]]) -> None:
+        """
+        Добавление группы peer'ов одной операцией
+        
+        Изменяет wg0.conf напрямую - вызывается исполнителем очереди
+        изменений (self.mutator), а не обработчиками.
         
-        # Добавляем peer в конфигурацию
-        append_cmd = f"docker exec {self.container} sh -c 'echo \"{peer_config}\" >> {self.config_path}/wg0.conf'"
-        stdout, stderr, code = await self._execute_command(append_cmd)
+        Args:
+            peers: Список peer'ов с ключами public_key, ip и name
+        """
+        if not peers:
+            return
         
-        if code != 0:
-            raise Exception(f"Ошибка добавления peer в конфигурацию: {stderr}")
+        config = await self.get_server_config()
+        await self._write_peers(config, peers)
         
-        # Обновляем clientsTable
-        await self._update_clients_table(client_public_key, client_ip, client_name)
+        # Обновляем clientsTable (запись в файл выполняется отложенно)
+        await self.clients_table.add(peers)
         
-        # Применяем изменения
-        await self._apply_config_changes()
+        # Применяем только добавленные peer'ы, без перечитывания всего файла
+        await self.apply_peers(added=peers)
+        
+        for peer in peers:
+            logger.info(f"Peer добавлен: {peer['name']} ({peer['ip']})")
+    
+    async def restore_peers_to_server(self, peers: List[Dict[str, str]]) -> Dict[str, Optional[str]]:
+        """
+        Восстановление peer'ов, пропавших с интерфейса, одной операцией
+        
+        Peer'ы, оставшиеся в wg0.conf, только применяются к интерфейсу,
+        отсутствующие дописываются в wg0.conf одной записью, в clientsTable
+        добавляются только недостающие записи. Все peer'ы применяются
+        одним вызовом apply_peers. Изменяет wg0.conf напрямую - снаружи
+        используйте self.mutator.restore_peers().
+        
+        Args:
+            peers: Список peer'ов с ключами public_key, ip и name
+            
+        Returns:
+            Dict[str, Optional[str]]: {public_key: None - восстановлен,
+                иначе причина пропуска}
+        """
+        config = await self.get_server_config()
+        
+        results: Dict[str, Optional[str]] = {}
+        missing = []
+        restored = []
+        taken = {}
+        for peer in peers:
+            public_key = peer['public_key']
+            if config.get_peer(public_key) is None:
+                # Адрес мог быть выдан другому peer'у, пока этот отсутствовал
+                owner = config.get_peer_by_ip(peer['ip'])
+                if owner is not None or peer['ip'] in taken:
+                    other = owner.public_key if owner is not None else taken[peer['ip']]
+                    results[public_key] = f"адрес {peer['ip']} занят peer'ом {other[:16]}..."
+                    continue
+                missing.append(peer)
+            taken[peer['ip']] = public_key
+            restored.append(peer)
+        
+        await self._write_peers(config, missing)
+        
+        clients = await self.clients_table.get_clients()
+        new_clients = [peer for peer in restored if peer['public_key'] not in clients]
+        if new_clients:
+            await self.clients_table.add(new_clients)
+        
+        await self.apply_peers(added=restored)
+        
+        for peer in restored:
+            results[peer['public_key']] = None
+        
+        logger.info(
+            f"Восстановлено peer'ов на сервере {self.server.id}: {len(restored)} "
+            f"(дописано в wg0.conf: {len(missing)}, пропущено: {len(peers) - len(restored)})"
+        )
+        return results
+    
+    async def _write_peers(self, config: WgServerConfig, peers: List[Dict[str, str]]) -> None:
+        """
+        Дозапись секций [Peer] в wg0.conf одной операцией
+        
+        Args:
+            config: Текущая модель wg0.conf
+            peers: Список peer'ов с ключами public_key, ip и name
+        """
+        if not peers:
+            return
+        
+        # Формируем секции peer и дописываем их в конец wg0.conf
+        peer_config = "".join(
+            config.add_peer(peer['public_key'], self.server.preshared_key, peer['ip'])
+            for peer in peers
+        )
+        
+        try:
+            await self.backend.append_file(self.server_config_path, peer_config)
+        except Exception as e:
+            # Модель уже содержит новые секции - сбрасываем кэш
+            self._server_config = None
+            self._config_fingerprint = None
+            raise Exception(f"Ошибка добавления peer в конфигурацию: {e}")
+        
+        await self._remember_written(config)
+        
+        # Адрес может прийти не из аллокатора (восстановление peer'а)
+        for peer in peers:
+            self._reserved_ips.discard(peer['ip'])
+        if self.allocator is not None:
+            self.allocator.mark_many(peer['ip'] for peer in peers)
+    
+    async def remove_peers_from_server(self, public_keys: List[str]) -> List[str]:
+        """
+        Удаление peer'ов из wg0.conf и с интерфейса
+        
+        Изменяет wg0.conf напрямую - снаружи используйте
+        self.mutator.remove_peers(). Адрес возвращается в пул, только
+        если на него не ссылается запись configs: иначе сверка восстановит
+        peer с адресом, уже выданным другому клиенту.
+        
+        Args:
+            public_keys: Публичные ключи удаляемых peer'ов
+            
+        Returns:
+            List[str]: Ключи peer'ов, которые были найдены и удалены
+        """
+        config = await self.get_server_config()
+        
+        removed = []
+        released_ips = []
+        for public_key in public_keys:
+            peer = config.get_peer(public_key)
+            if peer is None:
+                continue
+            released_ips.extend(ip.split('/')[0] for ip in peer.allowed_ips)
+            config.remove_peer(public_key)
+            removed.append(public_key)
+        
+        if not removed:
+            return []
         
-        logger.info(f"Peer добавлен: {client_name} ({client_ip})")
+        await self._save_server_config(config)
+        await self.apply_peers(removed=removed)
+        
+        used_ips = await ConfigRepository.get_used_ips(self.server.id, released_ips)
+        for client_ip in released_ips:
+            if client_ip not in used_ips:
+                self.release_ip(client_ip)
+        if used_ips:
+            logger.info(f"Адреса остаются занятыми до удаления конфигов из базы: {', '.join(sorted(used_ips))}")
+        
+        return removed
     
-    async def _update_clients_table(
+    async def apply_peers(
         self,
-        client_public_key: str,
-        client_ip: str,
-        client_name: str
+        added: Optional[List[Dict[str, str]]] = None,
+        removed: Optional[List[str]] = None
     ) -> None:
         """
-        Обновление таблицы клиентов в JSON формате
+        Инкрементальное применение изменений через `wg set`
+        
+        wg0.conf при этом должен быть уже сохранен - он используется при
+        перезапуске и для полной синхронизации при ошибке или расхождении.
         
         Args:
-            client_public_key: Публичный ключ клиента
-            client_ip: IP адрес клиента
-            client_name: Имя клиента
+            added: Добавленные peer'ы с ключами public_key и ip
+            removed: Публичные ключи удаленных peer'ов
         """
-        # Читаем текущую таблицу клиентов
-        read_cmd = f"docker exec {self.container} cat {self.config_path}/clientsTable"
-        clients_json, stderr, code = await self._execute_command(read_cmd)
-        
-        clients = []
-        if code == 0 and clients_json:
-            try:
-                clients = json.loads(clients_json)
-            except json.JSONDecodeError:
-                logger.warning("Не удалось распарсить clientsTable, создаем новый")
-                clients = []
-        
-        # Добавляем нового клиента (формат как в AmneziaVPN приложении)
-        from datetime import datetime
-        new_client = {
-            "clientId": client_public_key,
-            "userData": {
-                "clientName": client_name,
-                "creationDate": datetime.now().strftime("%a %b %d %H:%M:%S %Y")
-            }
-        }
-        clients.append(new_client)
+        added = added or []
+        removed = removed or []
+        if not added and not removed:
+            return
+        
+        try:
+            await self.backend.set_peers(added, removed, self.server.preshared_key)
+        except Exception as e:
+            logger.warning(f"Не удалось применить изменения через wg set: {e}, выполняем полную синхронизацию")
+            await self._apply_config_changes()
+            return
+        
+        logger.info(f"Изменения применены через wg set: {len(added) + len(removed)} peer(s)")
+    
+    async def check_consistency(self) -> bool:
+        """
+        Сверка peer'ов интерфейса с wg0.conf
         
-        # Записываем обратно
-        clients_json_str = json.dumps(clients, indent=4, ensure_ascii=False)
+        Полная синхронизация выполняется только при обнаружении расхождения.
+        Снаружи используйте self.mutator.check_consistency(): между чтением
+        wg0.conf и интерфейса не должно выполняться изменений.
         
-        # Записываем через временный файл для атомарной операции
-        import tempfile
-        import os
-        temp_file = tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.json')
-        temp_file.write(clients_json_str)
-        temp_file.close()
+        Returns:
+            bool: True если расхождений не было
+        """
+        config = await self.get_server_config()
+        
+        try:
+            live = await self.backend.list_peers()
+        except Exception as e:
+            logger.error(f"Ошибка чтения peer'ов интерфейса сервера {self.server.id}: {e}")
+            return False
         
-        # Копируем файл в контейнер
-        copy_cmd = f"docker cp {temp_file.name} {self.container}:{self.config_path}/clientsTable"
-        stdout, stderr, code = await self._execute_command(copy_cmd)
+        # Ожидаемое состояние из wg0.conf: {public_key: {allowed_ips}}
+        expected = {key: set(peer.allowed_ips) for key, peer in config.peers.items()}
         
-        # Удаляем временный файл
-        os.unlink(temp_file.name)
+        if expected == live:
+            logger.debug("Конфигурация интерфейса совпадает с wg0.conf")
+            return True
         
-        if code != 0:
-            logger.error(f"Ошибка обновления clientsTable: {stderr}")
-        else:
-            logger.info(f"clientsTable обновлен: добавлен {client_name}")
+        missing = len(expected.keys() - live.keys())
+        extra = len(live.keys() - expected.keys())
+        logger.warning(
+            f"Обнаружено расхождение интерфейса с wg0.conf сервера {self.server.id} "
+            f"(нет на интерфейсе: {missing}, лишних: {extra}), выполняем полную синхронизацию"
+        )
+        await self._apply_config_changes()
+        return False
     
-    async def _apply_config_changes(self) -> None:
-        """Применение изменений конфигурации WireGuard"""
-        # Применяем изменения через wg syncconf
-        sync_cmd = f"docker exec {self.container} sh -c 'wg syncconf wg0 <(wg-quick strip {self.config_path}/wg0.conf)'"
-        stdout, stderr, code = await self._execute_command(sync_cmd)
-        
-        if code != 0:
-            logger.warning(f"Не удалось применить через syncconf: {stderr}, пробуем альтернативный метод")
-            # Альтернативный метод - просто применяем setconf
-            alt_cmd = f"docker exec {self.container} wg setconf wg0 {self.config_path}/wg0.conf"
-            stdout, stderr, code = await self._execute_command(alt_cmd)
+    async def get_interface_peers(self) -> Dict[str, Set[str]]:
+        """
+        Peer'ы, фактически настроенные на интерфейсе
+        
+        Returns:
+            Dict[str, Set[str]]: {public_key: AllowedIPs}
+        """
+        return await self.backend.list_peers()
+    
+    async def get_fingerprint(self, sources: Optional[Iterable[str]] = None) -> Dict[str, Optional[str]]:
+        """
+        Отпечатки источников, по которым сверяется сервер
+        
+        Содержимое файлов и список peer'ов не передаются, поэтому
+        отпечатки подходят для частого опроса.
+        
+        Args:
+            sources: Нужные источники (по умолчанию все)
             
-            if code != 0:
-                logger.error(f"Не удалось применить изменения: {stderr}")
-            else:
-                logger.info("Изменения применены через setconf")
-        else:
-            logger.info("Изменения успешно применены через syncconf")
-
-
-# Глобальный экземпляр менеджера
-awg_manager = AmneziaWGManager()
+        Returns:
+            Dict[str, Optional[str]]: wg_config, clients_table, interface
+                (None - источник недоступен)
+        """
+        getters = {
+            "wg_config": lambda: self.backend.file_fingerprint(self.server_config_path),
+            "clients_table": lambda: self.backend.file_fingerprint(self.clients_table.path),
+            "interface": self.backend.peers_fingerprint
+        }
+        names = list(getters) if sources is None else [name for name in getters if name in sources]
+        
+        values = await asyncio.gather(*(getters[name]() for name in names))
+        return dict(zip(names, values))
+    
+    async def get_peer_stats(self) -> List[Dict[str, Any]]:
+        """
+        Статистика peer'ов интерфейса (handshake, трафик)
+        
+        Returns:
+            List[Dict[str, Any]]: Статистика по каждому peer'у
+        """
+        return await self.backend.dump()
+    
+    async def _apply_config_changes(self) -> None:
+        """Полное применение конфигурации WireGuard из wg0.conf"""
+        try:
+            await self.backend.sync_config(self.server_config_path)
+        except Exception as e:
+            logger.error(f"Не удалось применить изменения: {e}")
 
@@ -0,0 +1,237 @@
+"""
+Хранилище clientsTable с отложенной записью
+
+clientsTable используется только для отображения клиентов в приложении
+AmneziaVPN, поэтому изменения накапливаются в памяти и записываются
+одним файлом после паузы (debounce) и при остановке.
+"""
+import asyncio
+import json
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from src.utils.logger import logger
+
+
+class ClientsTableStore:
+    """Кэш clientsTable в памяти с отложенной атомарной записью"""
+    
+    def __init__(self, backend, path: str, flush_delay: float = 1.0):
+        """
+        Инициализация хранилища
+        
+        Args:
+            backend: Бэкенд сервера AmneziaWG (чтение и запись файлов)
+            path: Путь к clientsTable внутри контейнера
+            flush_delay: Пауза перед записью накопленных изменений (секунды)
+        """
+        self.backend = backend
+        self.path = path
+        self.flush_delay = flush_delay
+        
+        self._clients: Optional[Dict[str, Dict[str, Any]]] = None
+        self._fingerprint: Optional[str] = None
+        
+        # Изменения, еще не записанные в файл: применяются повторно,
+        # если файл был изменен извне до записи
+        self._pending: List[Callable[[Dict[str, Dict[str, Any]]], Any]] = []
+        
+        self._lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+    
+    @staticmethod
+    def _parse(content: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Разбор JSON clientsTable в словарь по clientId
+        
+        Args:
+            content: Содержимое файла
+            
+        Returns:
+            Dict[str, Dict[str, Any]]: Клиенты в исходном порядке
+        """
+        if not content.strip():
+            return {}
+        
+        try:
+            clients = json.loads(content)
+        except json.JSONDecodeError:
+            logger.warning("Не удалось распарсить clientsTable, создаем новый")
+            return {}
+        
+        result = {}
+        for index, client in enumerate(clients):
+            # Записи без clientId сохраняем как есть
+            result[client.get('clientId') or f"__no_client_id_{index}"] = client
+        return result
+    
+    async def _refresh(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Загрузка clientsTable, если файл изменился с момента последнего чтения
+        
+        Неподтвержденные изменения применяются поверх свежих данных.
+        
+        Returns:
+            Dict[str, Dict[str, Any]]: Актуальные клиенты
+        """
+        cached = self._fingerprint if self._clients is not None else None
+        fingerprint, content = await self.backend.read_file(self.path, cached, missing_ok=True)
+        
+        if content is not None:
+            if self._clients is not None:
+                logger.info("clientsTable изменен извне, перечитываем")
+            self._clients = self._parse(content)
+            for mutation in self._pending:
+                mutation(self._clients)
+        
+        self._fingerprint = fingerprint
+        return self._clients
+    
+    async def get_clients(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Получение клиентов с учетом еще не записанных изменений
+        
+        Returns:
+            Dict[str, Dict[str, Any]]: Копия словаря {clientId: запись}
+        """
+        async with self._lock:
+            clients = await self._refresh()
+            return dict(clients)
+    
+    async def _mutate(self, mutation: Callable[[Dict[str, Dict[str, Any]]], Any]) -> Any:
+        """
+        Применение изменения в памяти и планирование записи
+        
+        Args:
+            mutation: Функция, изменяющая словарь клиентов
+            
+        Returns:
+            Any: Результат функции изменения
+        """
+        async with self._lock:
+            self._pending.append(mutation)
+            result = None
+            if self._clients is not None:
+                result = mutation(self._clients)
+        
+        self._schedule_flush()
+        return result
+    
+    async def add(self, peers: Iterable[Dict[str, str]]) -> None:
+        """
+        Добавление клиентов (формат как в AmneziaVPN приложении)
+        
+        Args:
+            peers: Peer'ы с ключами public_key и name
+        """
+        creation_date = datetime.now().strftime("%a %b %d %H:%M:%S %Y")
+        entries = [
+            {
+                "clientId": peer['public_key'],
+                "userData": {
+                    "clientName": peer['name'],
+                    "creationDate": creation_date
+                }
+            }
+            for peer in peers
+        ]
+        
+        def mutation(clients: Dict[str, Dict[str, Any]]) -> None:
+            for entry in entries:
+                clients[entry['clientId']] = entry
+        
+        await self._mutate(mutation)
+    
+    async def remove(self, public_keys: Iterable[str]) -> None:
+        """
+        Удаление клиентов по публичному ключу
+        
+        Args:
+            public_keys: Публичные ключи клиентов
+        """
+        keys = set(public_keys)
+        
+        def mutation(clients: Dict[str, Dict[str, Any]]) -> None:
+            for key in keys:
+                clients.pop(key, None)
+        
+        await self._mutate(mutation)
+    
+    async def retain(self, public_keys: Iterable[str]) -> List[Dict[str, Any]]:
+        """
+        Удаление всех клиентов, кроме указанных
+        
+        Args:
+            public_keys: Публичные ключи клиентов, которые нужно оставить
+            
+        Returns:
+            List[Dict[str, Any]]: Удаленные записи
+        """
+        keys = set(public_keys)
+        
+        def mutation(clients: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+            dead = [key for key in clients if key not in keys]
+            return [clients.pop(key) for key in dead]
+        
+        # Без удаляемых записей изменение не планируется: иначе отложенная
+        # запись перезаписала бы файл без изменений
+        async with self._lock:
+            clients = await self._refresh()
+            if all(key in keys for key in clients):
+                return []
+        return await self._mutate(mutation) or []
+    
+    def _schedule_flush(self) -> None:
+        """Планирование записи после паузы"""
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+    
+    async def _delayed_flush(self) -> None:
+        """Запись накопленных изменений после паузы (с повтором при ошибке)"""
+        while True:
+            await asyncio.sleep(self.flush_delay)
+            try:
+                _, ok = await self.flush()
+            except Exception as e:
+                logger.error(f"Ошибка записи clientsTable: {e}", exc_info=True)
+                ok = False
+            
+            if ok and not self._pending:
+                return
+    
+    async def flush(self) -> Tuple[int, bool]:
+        """
+        Немедленная атомарная запись накопленных изменений
+        
+        Returns:
+            Tuple[int, bool]: (количество записанных изменений, успех)
+        """
+        async with self._lock:
+            if not self._pending:
+                return 0, True
+            
+            clients = await self._refresh()
+            content = json.dumps(list(clients.values()), indent=4, ensure_ascii=False)
+            
+            try:
+                await self.backend.write_file(self.path, content)
+            except Exception as e:
+                logger.error(f"Ошибка обновления clientsTable: {e}")
+                return 0, False
+            
+            flushed = len(self._pending)
+            self._pending.clear()
+            self._fingerprint = await self.backend.file_fingerprint(self.path)
+        
+        logger.info(f"clientsTable записан: {flushed} изменений, {len(clients)} клиентов")
+        return flushed, True
+    
+    async def close(self) -> None:
+        """Запись всех изменений перед остановкой"""
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
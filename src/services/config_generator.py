@@ -1,12 +1,13 @@
 """
 Генератор конфигурационных файлов AmneziaWG
 """
-import aiofiles
-from pathlib import Path
-from typing import Dict, Any
+import asyncio
+import hashlib
+from typing import Any, Dict, List, Set, Tuple
 
 from src.config.settings import settings
-from src.services.awg_manager import awg_manager
+from src.services.server_profile import ServerProfile
+from src.services.server_registry import server_registry
 from src.database.repository import UserRepository, ConfigRepository, RequestRepository
 from src.utils.logger import logger
 
@@ -14,10 +15,33 @@ from src.utils.logger import logger
 class ConfigGenerator:
     """Генератор конфигураций для клиентов"""
     
+    # Типы устройств, для которых выдаются конфиги
+    DEVICE_TYPES = ("phone", "laptop", "router")
+    
     def __init__(self):
         """Инициализация генератора"""
-        self.config_dir = Path("data/configs")
-        self.config_dir.mkdir(parents=True, exist_ok=True)
+        # Шаблоны собираются один раз на сервер: при выдаче подставляются только ключ и IP
+        self._templates: Dict[str, Tuple[str, str, str]] = {}
+        
+        # Выполняющиеся генерации по (telegram_id, device_type); запись
+        # удаляется по завершении, поэтому словарь не растет
+        self._inflight: Dict[Tuple[int, str], asyncio.Task] = {}
+        
+        # Пользователи, для которых generate_bundle еще не зарегистрировал
+        # генерации в _inflight: {telegram_id: количество вызовов}
+        self._preparing: Dict[int, int] = {}
+    
+    def active_users(self) -> Set[int]:
+        """
+        Пользователи, которым сейчас выдаются конфиги
+        
+        Такой пользователь может еще не иметь записи в configs, поэтому
+        очистка пустых пользователей его пропускает.
+        
+        Returns:
+            Set[int]: Telegram ID пользователей
+        """
+        return {telegram_id for telegram_id, _ in self._inflight} | set(self._preparing)
     
     async def generate_client_config(
         self,
@@ -26,10 +50,14 @@ class ConfigGenerator:
         device_type: str,
         first_name: str = None,
         last_name: str = None
-    ) -> str:
+    ) -> Dict[str, Any]:
         """
         Генерация конфигурации для клиента
         
+        Одновременные запросы одного пользователя для одного устройства
+        (например, двойное нажатие кнопки) ожидают одну и ту же генерацию
+        и получают ее результат.
+        
         Args:
             telegram_id: Telegram ID пользователя
             username: Username пользователя
@@ -38,80 +66,339 @@ class ConfigGenerator:
             last_name: Фамилия пользователя
             
         Returns:
-            str: Путь к созданному конфигурационному файлу
+            Dict[str, Any]: config_id, content (содержимое файла), а также
+            tg_file_id и tg_file_hash ранее отправленного документа (или None)
         """
-        # Создаем или получаем пользователя в БД
-        user = await UserRepository.get_user_by_telegram_id(telegram_id)
-        if not user:
-            user_id = await UserRepository.create_user(
-                telegram_id=telegram_id,
-                username=username,
-                first_name=first_name,
-                last_name=last_name
+        return await self._single_flight(
+            (telegram_id, device_type),
+            lambda: self._generate_client_config(telegram_id, username, device_type, first_name, last_name)
+        )
+    
+    async def generate_bundle(
+        self,
+        telegram_id: int,
+        username: str,
+        first_name: str = None,
+        last_name: str = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Конфигурации для всех типов устройств пользователя
+        
+        Недостающие конфиги размещаются на одном сервере одной операцией
+        его очереди изменений: одна выдача адресов, одна запись wg0.conf и
+        одно применение на сервере.
+        
+        Args:
+            telegram_id: Telegram ID пользователя
+            username: Username пользователя
+            first_name: Имя пользователя
+            last_name: Фамилия пользователя
+            
+        Returns:
+            Dict[str, Dict[str, Any]]: {device_type: результат как у generate_client_config}
+        """
+        self._preparing[telegram_id] = self._preparing.get(telegram_id, 0) + 1
+        try:
+            user_id = await self._get_user_id(telegram_id, username, first_name, last_name)
+            existing = {
+                config['device_type']: config
+                for config in await ConfigRepository.get_user_configs(user_id)
+            }
+        finally:
+            self._preparing[telegram_id] -= 1
+            if not self._preparing[telegram_id]:
+                del self._preparing[telegram_id]
+        
+        # Устройства, конфиг которых уже выдается отдельным запросом, ожидают его
+        missing = [device_type for device_type in self.DEVICE_TYPES if device_type not in existing]
+        to_issue = [device_type for device_type in missing if (telegram_id, device_type) not in self._inflight]
+        
+        bundle = asyncio.create_task(self._issue_bundle(user_id, telegram_id, username, to_issue)) if to_issue else None
+        
+        async def bundle_item(device_type: str) -> Dict[str, Any]:
+            return (await asyncio.shield(bundle))[device_type]
+        
+        pending = {
+            device_type: self._single_flight(
+                (telegram_id, device_type),
+                lambda device_type=device_type: bundle_item(device_type)
             )
+            for device_type in missing
+        }
+        issued = dict(zip(pending, await asyncio.gather(*pending.values())))
+        
+        results = {}
+        for device_type in self.DEVICE_TYPES:
+            if device_type in issued:
+                results[device_type] = issued[device_type]
+            else:
+                results[device_type] = await self._existing_result(user_id, existing[device_type])
+        return results
+    
+    def _single_flight(self, key: Tuple[int, str], factory) -> asyncio.Future:
+        """
+        Общая задача генерации для (telegram_id, device_type)
+        
+        Args:
+            key: (telegram_id, device_type)
+            factory: Функция, создающая корутину генерации
+            
+        Returns:
+            asyncio.Future: Ожидание результата выполняющейся генерации
+        """
+        task = self._inflight.get(key)
+        
+        if task is None:
+            task = asyncio.create_task(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
         else:
-            user_id = user['id']
+            logger.info(f"Запрос конфига {key[1]} пользователя {key[0]} уже выполняется, ожидаем его")
+        
+        # Отмена одного из ожидающих не прерывает общую генерацию
+        return asyncio.shield(task)
+    
+    async def _get_user_id(
+        self,
+        telegram_id: int,
+        username: str,
+        first_name: str = None,
+        last_name: str = None
+    ) -> int:
+        """
+        Получение или создание пользователя в БД
+        
+        Args:
+            telegram_id: Telegram ID пользователя
+            username: Username пользователя
+            first_name: Имя пользователя
+            last_name: Фамилия пользователя
+            
+        Returns:
+            int: ID пользователя
+        """
+        user = await UserRepository.get_user_by_telegram_id(telegram_id)
+        if user:
+            return user['id']
+        
+        return await UserRepository.create_user(
+            telegram_id=telegram_id,
+            username=username,
+            first_name=first_name,
+            last_name=last_name
+        )
+    
+    async def _generate_client_config(
+        self,
+        telegram_id: int,
+        username: str,
+        device_type: str,
+        first_name: str = None,
+        last_name: str = None
+    ) -> Dict[str, Any]:
+        """
+        Генерация конфигурации для клиента (без дедупликации)
+        
+        Args:
+            telegram_id: Telegram ID пользователя
+            username: Username пользователя
+            device_type: Тип устройства (phone, laptop, router)
+            first_name: Имя пользователя
+            last_name: Фамилия пользователя
+            
+        Returns:
+            Dict[str, Any]: Результат как у generate_client_config
+        """
+        user_id = await self._get_user_id(telegram_id, username, first_name, last_name)
         
         # Проверяем, есть ли уже конфиг для этого устройства
         existing_config = await ConfigRepository.get_config(user_id, device_type)
         
         if existing_config:
-            logger.info(f"Найден существующий конфиг для пользователя {telegram_id}, устройство {device_type}")
-            # Генерируем файл из существующих данных
-            config_path = await self._create_config_file(
-                username=username,
-                device_type=device_type,
-                private_key=existing_config['client_private_key'],
-                client_ip=existing_config['client_ip']
-            )
-            
-            # Логируем запрос
-            await RequestRepository.log_request(user_id, device_type, "existing_config")
+            return await self._existing_result(user_id, existing_config)
+        
+        return await self._issue_config(user_id, telegram_id, username, device_type)
+    
+    async def _existing_result(self, user_id: int, existing_config: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Конфиг из существующей записи БД
+        
+        Args:
+            user_id: ID пользователя
+            existing_config: Строка таблицы configs
             
-            return config_path
+        Returns:
+            Dict[str, Any]: Результат как у generate_client_config
+        """
+        device_type = existing_config['device_type']
+        logger.info(f"Найден существующий конфиг для пользователя {user_id}, устройство {device_type}")
+        
+        # Формируем конфиг из существующих данных
+        config_content = self.render_config(
+            private_key=existing_config['client_private_key'],
+            client_ip=existing_config['client_ip'],
+            server_id=existing_config['server_id']
+        )
         
+        # Логируем запрос
+        await RequestRepository.log_request(user_id, device_type, "existing_config")
+        
+        return {
+            "config_id": existing_config['id'],
+            "content": config_content,
+            "tg_file_id": existing_config.get('tg_file_id'),
+            "tg_file_hash": existing_config.get('tg_file_hash')
+        }
+    
+    async def _issue_config(
+        self,
+        user_id: int,
+        telegram_id: int,
+        username: str,
+        device_type: str
+    ) -> Dict[str, Any]:
+        """
+        Выдача нового конфига: ключи, IP и peer на сервере, запись в БД
+        
+        Args:
+            user_id: ID пользователя
+            telegram_id: Telegram ID пользователя
+            username: Username пользователя
+            device_type: Тип устройства
+            
+        Returns:
+            Dict[str, Any]: Результат как у generate_client_config
+        """
         # Генерируем новые ключи
         logger.info(f"Генерируем новый конфиг для пользователя {telegram_id}, устройство {device_type}")
-        private_key, public_key = await awg_manager.generate_keypair()
-        
-        # Получаем свободный IP
-        client_ip = await awg_manager.get_next_available_ip()
+        private_key, public_key = await server_registry.default.generate_keypair()
         
-        # Формируем имя клиента
-        device_prefix = self._get_device_prefix(device_type)
-        client_name = f"{username}_{device_prefix}" if username else f"user{telegram_id}_{device_prefix}"
+        # Выбираем сервер, выдаем IP и добавляем peer одной операцией его очереди изменений
+        client_name = self._get_client_name(telegram_id, username, device_type)
+        server_id, client_ip = await server_registry.issue_peer(public_key, client_name)
         
-        # Добавляем peer на сервер
-        await awg_manager.add_peer_to_server(
-            client_public_key=public_key,
-            client_ip=client_ip,
-            client_name=client_name
+        return await self._save_config(
+            user_id, telegram_id, username, device_type,
+            private_key, public_key, server_id, client_ip
         )
+    
+    async def _issue_bundle(
+        self,
+        user_id: int,
+        telegram_id: int,
+        username: str,
+        device_types: List[str]
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Выдача конфигов для нескольких устройств на одном сервере
         
+        Args:
+            user_id: ID пользователя
+            telegram_id: Telegram ID пользователя
+            username: Username пользователя
+            device_types: Типы устройств
+            
+        Returns:
+            Dict[str, Dict[str, Any]]: {device_type: результат как у generate_client_config}
+        """
+        logger.info(f"Генерируем новые конфиги для пользователя {telegram_id}, устройства: {', '.join(device_types)}")
+        keypairs = await asyncio.gather(*(
+            server_registry.default.generate_keypair() for _ in device_types
+        ))
+        
+        # Один сервер и одна операция его очереди изменений на все устройства
+        server_id, client_ips = await server_registry.issue_peers([
+            {"public_key": public_key, "name": self._get_client_name(telegram_id, username, device_type)}
+            for device_type, (_, public_key) in zip(device_types, keypairs)
+        ])
+        
+        results = await asyncio.gather(*(
+            self._save_config(
+                user_id, telegram_id, username, device_type,
+                private_key, public_key, server_id, client_ip
+            )
+            for device_type, (private_key, public_key), client_ip in zip(device_types, keypairs, client_ips)
+        ))
+        return dict(zip(device_types, results))
+    
+    async def _save_config(
+        self,
+        user_id: int,
+        telegram_id: int,
+        username: str,
+        device_type: str,
+        private_key: str,
+        public_key: str,
+        server_id: str,
+        client_ip: str
+    ) -> Dict[str, Any]:
+        """
+        Запись выданного конфига в БД и формирование файла
+        
+        Args:
+            user_id: ID пользователя
+            telegram_id: Telegram ID пользователя
+            username: Username пользователя
+            device_type: Тип устройства
+            private_key: Приватный ключ клиента
+            public_key: Публичный ключ клиента
+            server_id: Сервер, на котором добавлен peer
+            client_ip: Выданный IP адрес
+            
+        Returns:
+            Dict[str, Any]: Результат как у generate_client_config
+        """
         # Сохраняем конфиг в БД
         config_name = f"{username}_{device_type}.conf" if username else f"user{telegram_id}_{device_type}.conf"
-        await ConfigRepository.create_config(
-            user_id=user_id,
-            device_type=device_type,
-            client_public_key=public_key,
-            client_private_key=private_key,
-            client_ip=client_ip,
-            config_name=config_name
-        )
+        try:
+            config_id = await ConfigRepository.create_config(
+                user_id=user_id,
+                device_type=device_type,
+                client_public_key=public_key,
+                client_private_key=private_key,
+                client_ip=client_ip,
+                config_name=config_name,
+                server_id=server_id
+            )
+        except Exception:
+            # Без записи в БД peer на сервере остался бы потерянным
+            logger.error(f"Не удалось сохранить конфиг {config_name}, удаляем peer с сервера")
+            await server_registry.get(server_id).mutator.remove_peers([public_key])
+            
+            # Конфиг мог появиться параллельно (UNIQUE(user_id, device_type))
+            existing_config = await ConfigRepository.get_config(user_id, device_type)
+            if existing_config:
+                return await self._existing_result(user_id, existing_config)
+            raise
         
-        # Создаем конфигурационный файл
-        config_path = await self._create_config_file(
-            username=username or f"user{telegram_id}",
-            device_type=device_type,
-            private_key=private_key,
-            client_ip=client_ip
-        )
+        # Формируем конфиг
+        config_content = self.render_config(private_key=private_key, client_ip=client_ip, server_id=server_id)
         
         # Логируем запрос
         await RequestRepository.log_request(user_id, device_type, "new_config")
         
-        logger.info(f"Конфиг успешно создан: {config_path}")
-        return config_path
+        logger.info(f"Конфиг успешно создан: {config_name}")
+        return {
+            "config_id": config_id,
+            "content": config_content,
+            "tg_file_id": None,
+            "tg_file_hash": None
+        }
+    
+    def _get_client_name(self, telegram_id: int, username: str, device_type: str) -> str:
+        """
+        Имя клиента в clientsTable
+        
+        Args:
+            telegram_id: Telegram ID пользователя
+            username: Username пользователя
+            device_type: Тип устройства
+            
+        Returns:
+            str: Имя клиента
+        """
+        device_prefix = self._get_device_prefix(device_type)
+        return f"{username}_{device_prefix}" if username else f"user{telegram_id}_{device_prefix}"
     
     def _get_device_prefix(self, device_type: str) -> str:
         """
@@ -130,71 +417,76 @@ class ConfigGenerator:
         }
         return prefixes.get(device_type, device_type)
     
-    async def _create_config_file(
-        self,
-        username: str,
-        device_type: str,
-        private_key: str,
-        client_ip: str
-    ) -> str:
+    @staticmethod
+    def _compile_template(server: ServerProfile) -> Tuple[str, str, str]:
         """
-        Создание конфигурационного файла
+        Сборка неизменяемых частей конфига из параметров сервера
         
         Args:
-            username: Username пользователя
-            device_type: Тип устройства
-            private_key: Приватный ключ клиента
-            client_ip: IP адрес клиента
+            server: Профиль сервера
             
         Returns:
-            str: Путь к созданному файлу
+            Tuple[str, str, str]: Текст до приватного ключа, между ключом
+            и IP адресом, после IP адреса
         """
-        # Формируем имя файла
-        filename = f"{username}_{device_type}.conf"
-        config_path = self.config_dir / filename
-        
-        # Формируем содержимое конфига
-        config_content = f"""[Interface]
-PrivateKey = {private_key}
-Address = {client_ip}/32
+        obfuscation = "".join(
+            f"{key} = {server.obfuscation[key]}\n" for key in ServerProfile.OBFUSCATION_KEYS
+        )
+        suffix = f"""/32
 DNS = {settings.DNS_SERVERS}
-Jc = {settings.JC}
-Jmin = {settings.JMIN}
-Jmax = {settings.JMAX}
-S1 = {settings.S1}
-S2 = {settings.S2}
-H1 = {settings.H1}
-H2 = {settings.H2}
-H3 = {settings.H3}
-H4 = {settings.H4}
-
+{obfuscation}
 [Peer]
-PublicKey = {settings.SERVER_PUBLIC_KEY}
-PresharedKey = {settings.PRESHARED_KEY}
-Endpoint = {settings.SERVER_ENDPOINT}
+PublicKey = {server.public_key}
+PresharedKey = {server.preshared_key}
+Endpoint = {server.endpoint}
 AllowedIPs = 0.0.0.0/0, ::/0
 PersistentKeepalive = 25
 """
+        return "[Interface]\nPrivateKey = ", "\nAddress = ", suffix
+    
+    @staticmethod
+    def content_hash(content: bytes, filename: str) -> str:
+        """
+        Хэш отправляемого документа для кэша file_id
         
-        # Записываем файл асинхронно
-        async with aiofiles.open(config_path, 'w', encoding='utf-8') as f:
-            await f.write(config_content)
+        Содержимое включает ключи, IP и параметры сервера, поэтому
+        любое их изменение дает новый хэш.
         
-        logger.info(f"Конфигурационный файл создан: {config_path}")
-        return str(config_path)
+        Args:
+            content: Содержимое файла
+            filename: Имя файла документа
+            
+        Returns:
+            str: SHA-256 в hex
+        """
+        digest = hashlib.sha256(content)
+        digest.update(b"\0" + filename.encode('utf-8'))
+        return digest.hexdigest()
     
-    async def cleanup_config_file(self, config_path: str) -> None:
+    def render_config(
+        self,
+        private_key: str,
+        client_ip: str,
+        server_id: str = ServerProfile.DEFAULT_ID
+    ) -> bytes:
         """
-        Удаление временного конфигурационного файла
+        Формирование конфигурационного файла в памяти
         
         Args:
-            config_path: Путь к файлу
+            private_key: Приватный ключ клиента
+            client_ip: IP адрес клиента
+            server_id: Сервер, на котором размещен peer
+            
+        Returns:
+            bytes: Содержимое конфигурационного файла
         """
-        try:
-            Path(config_path).unlink(missing_ok=True)
-            logger.debug(f"Временный конфиг удален: {config_path}")
-        except Exception as e:
-            logger.error(f"Ошибка удаления временного конфига: {e}")
+        template = self._templates.get(server_id)
+        if template is None:
+            template = self._compile_template(server_registry.get(server_id).server)
+            self._templates[server_id] = template
+        
+        prefix, middle, suffix = template
+        return f"{prefix}{private_key}{middle}{client_ip}{suffix}".encode('utf-8')
 
 
 # Глобальный экземпляр генератора
@@ -0,0 +1,201 @@
+"""
+Постоянная shell-сессия внутри контейнера AmneziaWG
+
+Вместо запуска `docker exec` на каждую операцию держим один долгоживущий
+процесс `docker exec -i <container> sh` и обмениваемся с ним командами
+через stdin/stdout. Границы ответов отмечаются уникальными маркерами.
+"""
+import asyncio
+import shlex
+import uuid
+from typing import Optional, Tuple
+
+from src.utils.logger import logger
+
+
+class ContainerShell:
+    """Постоянная shell-сессия в Docker контейнере"""
+
+    # Лимит длины строки для чтения вывода (большие конфиги, clientsTable)
+    STREAM_LIMIT = 16 * 1024 * 1024
+
+    def __init__(self, container: str, shell: str = "sh", timeout: float = 30.0):
+        """
+        Инициализация сессии
+
+        Args:
+            container: Имя контейнера
+            shell: Командная оболочка внутри контейнера
+            timeout: Таймаут выполнения одной команды в секундах
+        """
+        self.container = container
+        self.shell = shell
+        self.timeout = timeout
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._lock = asyncio.Lock()
+        self._token = uuid.uuid4().hex
+        self._counter = 0
+
+    @property
+    def is_alive(self) -> bool:
+        """Проверка, что процесс сессии запущен"""
+        return self._process is not None and self._process.returncode is None
+
+    async def start(self) -> None:
+        """Запуск shell-сессии в контейнере"""
+        self._process = await asyncio.create_subprocess_exec(
+            "docker", "exec", "-i", self.container, self.shell,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            limit=self.STREAM_LIMIT
+        )
+        logger.info(f"Открыта shell-сессия в контейнере {self.container}")
+
+    async def close(self) -> None:
+        """Закрытие shell-сессии"""
+        process, self._process = self._process, None
+        if process is None or process.returncode is not None:
+            return
+
+        try:
+            process.stdin.write(b"exit\n")
+            await process.stdin.drain()
+            await asyncio.wait_for(process.wait(), timeout=2)
+        except Exception:
+            process.kill()
+            await process.wait()
+
+        logger.info(f"Shell-сессия в контейнере {self.container} закрыта")
+
+    async def execute(self, command: str) -> Tuple[str, str, int]:
+        """
+        Выполнение команды в контейнере
+
+        Команда выполняется в отдельном `sh -c`, поэтому синтаксическая
+        ошибка в ней не завершает саму сессию.
+
+        Args:
+            command: Команда для выполнения
+
+        Returns:
+            Tuple[str, str, int]: (stdout, stderr, return_code)
+        """
+        script = f"{self.shell} -c {shlex.quote(command)} </dev/null"
+        return await self._run(script)
+
+    async def write_file(self, path: str, content: str) -> Tuple[str, str, int]:
+        """
+        Атомарная запись файла в контейнер через временный файл
+
+        Args:
+            path: Путь к файлу внутри контейнера
+            content: Содержимое файла
+
+        Returns:
+            Tuple[str, str, int]: (stdout, stderr, return_code)
+        """
+        delimiter = f"__AWG_EOF_{uuid.uuid4().hex}__"
+        if not content.endswith("\n"):
+            content += "\n"
+
+        tmp_path = shlex.quote(f"{path}.tmp")
+        script = (
+            f"cat > {tmp_path} <<'{delimiter}'\n"
+            f"{content}"
+            f"{delimiter}\n"
+            f"mv -f {tmp_path} {shlex.quote(path)}"
+        )
+        return await self._run(script)
+
+    async def _run(self, script: str) -> Tuple[str, str, int]:
+        """
+        Отправка скрипта в сессию и чтение ответа до маркера
+
+        При отсутствии живой сессии она переоткрывается автоматически.
+
+        Args:
+            script: Фрагмент shell-скрипта
+
+        Returns:
+            Tuple[str, str, int]: (stdout, stderr, return_code)
+
+        Raises:
+            Exception: Строка вывода длиннее STREAM_LIMIT (сессия перезапускается)
+        """
+        async with self._lock:
+            if not self.is_alive:
+                await self.start()
+
+            self._counter += 1
+            marker = f"__AWG_{self._token}_{self._counter}__"
+            payload = (
+                f"{script}\n"
+                f"printf '\\n%s %d\\n' '{marker}' $?\n"
+                f"printf '\\n%s\\n' '{marker}' >&2\n"
+            )
+
+            try:
+                self._process.stdin.write(payload.encode("utf-8"))
+                await self._process.stdin.drain()
+
+                (stdout, code), (stderr, _) = await asyncio.wait_for(
+                    asyncio.gather(
+                        self._read_until(self._process.stdout, marker),
+                        self._read_until(self._process.stderr, marker)
+                    ),
+                    timeout=self.timeout
+                )
+            except (asyncio.TimeoutError, ConnectionError, EOFError) as e:
+                # Состояние сессии неизвестно - закрываем, следующий вызов переподключится
+                logger.error(f"Shell-сессия в контейнере {self.container} прервана: {e!r}")
+                await self._kill()
+                return "", f"Shell-сессия прервана: {e!r}", -1
+            except (ValueError, asyncio.LimitOverrunError) as e:
+                # Строка длиннее STREAM_LIMIT: остаток ответа остался в потоке,
+                # и следующая команда прочитала бы его как свой вывод
+                logger.error(f"Слишком длинная строка вывода в shell-сессии контейнера {self.container}: {e}")
+                await self._kill()
+                await self.start()
+                raise Exception(
+                    f"Вывод команды в контейнере {self.container} содержит строку длиннее "
+                    f"{self.STREAM_LIMIT} байт, shell-сессия перезапущена"
+                ) from e
+            except asyncio.CancelledError:
+                # Ответ не дочитан - дальнейший обмен в этой сессии невозможен
+                await self._kill()
+                raise
+
+            return stdout, stderr, code
+
+    async def _read_until(self, stream: asyncio.StreamReader, marker: str) -> Tuple[str, int]:
+        """
+        Чтение потока до строки с маркером
+
+        Args:
+            stream: Поток stdout или stderr
+            marker: Маркер конца ответа
+
+        Returns:
+            Tuple[str, int]: (вывод, код возврата из маркера или 0)
+        """
+        lines = []
+        while True:
+            line = await stream.readline()
+            if not line:
+                raise EOFError("shell-сессия закрыла поток")
+
+            text = line.decode("utf-8", errors="replace")
+            if text.startswith(marker):
+                rest = text[len(marker):].strip()
+                code = int(rest) if rest else 0
+                return "".join(lines).strip(), code
+
+            lines.append(text)
+
+    async def _kill(self) -> None:
+        """Принудительное завершение процесса сессии"""
+        process, self._process = self._process, None
+        if process is not None and process.returncode is None:
+            process.kill()
+            await process.wait()
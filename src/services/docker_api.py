@@ -0,0 +1,393 @@
+"""
+Клиент Docker Engine API через unix-сокет
+
+Команды выполняются через exec API, файлы записываются через archive API
+(tar-архив), без запуска процесса `docker` на каждый вызов. Запросы идут
+по одному постоянному соединению; вывод exec читается по отдельному
+соединению, так как Docker отдает его до закрытия сокета.
+"""
+import asyncio
+import io
+import json
+import posixpath
+import shlex
+import struct
+import tarfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote, urlencode
+
+from src.utils.logger import logger
+
+
+class DockerAPIClient:
+    """Клиент Docker Engine API с переиспользованием соединения"""
+    
+    API_VERSION = "v1.41"
+    
+    # Лимит длины строки заголовков и размера чтения
+    STREAM_LIMIT = 16 * 1024 * 1024
+    
+    def __init__(self, container: str, socket_path: str = "/var/run/docker.sock", timeout: float = 30.0):
+        """
+        Инициализация клиента
+        
+        Args:
+            container: Имя контейнера
+            socket_path: Путь к unix-сокету Docker
+            timeout: Таймаут выполнения одной операции в секундах
+        """
+        self.container = container
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock = asyncio.Lock()
+    
+    @property
+    def is_alive(self) -> bool:
+        """Проверка, что постоянное соединение открыто"""
+        return self._writer is not None and not self._writer.is_closing()
+    
+    async def _open(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        """Открытие соединения с сокетом Docker"""
+        return await asyncio.open_unix_connection(self.socket_path, limit=self.STREAM_LIMIT)
+    
+    def _path(self, path: str, params: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Формирование пути запроса с версией API
+        
+        Args:
+            path: Путь ресурса (например, /containers/x/exec)
+            params: Параметры строки запроса
+            
+        Returns:
+            str: Путь запроса
+        """
+        url = f"/{self.API_VERSION}{path}"
+        if params:
+            url += "?" + urlencode(params)
+        return url
+    
+    @staticmethod
+    def _build_request(method: str, url: str, body: bytes, content_type: str) -> bytes:
+        """
+        Формирование HTTP/1.1 запроса
+        
+        Args:
+            method: HTTP метод
+            url: Путь запроса
+            body: Тело запроса
+            content_type: Тип содержимого тела
+            
+        Returns:
+            bytes: Запрос целиком
+        """
+        head = (
+            f"{method} {url} HTTP/1.1\r\n"
+            f"Host: docker\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"\r\n"
+        )
+        return head.encode("latin-1") + body
+    
+    @staticmethod
+    async def _read_response(reader: asyncio.StreamReader) -> Tuple[int, Dict[str, str], bytes, bool]:
+        """
+        Чтение HTTP ответа
+        
+        Args:
+            reader: Поток соединения
+            
+        Returns:
+            Tuple[int, Dict[str, str], bytes, bool]: (статус, заголовки, тело,
+            можно ли переиспользовать соединение)
+        """
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError("Docker закрыл соединение")
+        
+        parts = status_line.decode("latin-1").split(" ", 2)
+        status = int(parts[1])
+        
+        headers: Dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        
+        keep_alive = headers.get("connection", "").lower() != "close"
+        
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";")[0].strip(), 16)
+                if size == 0:
+                    # Завершающие заголовки (обычно пусто)
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            return status, headers, b"".join(chunks), keep_alive
+        
+        if "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+            return status, headers, body, keep_alive
+        
+        if status in (204, 304):
+            return status, headers, b"", keep_alive
+        
+        # Потоковый ответ (exec start): тело идет до закрытия соединения
+        return status, headers, await reader.read(), False
+    
+    async def _close_connection(self) -> None:
+        """Закрытие постоянного соединения"""
+        writer, self._writer, self._reader = self._writer, None, None
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+    
+    async def request(
+        self,
+        method: str,
+        path: str,
+        body: Any = None,
+        params: Optional[Dict[str, Any]] = None,
+        content_type: str = "application/json"
+    ) -> Tuple[int, Dict[str, str], bytes]:
+        """
+        Запрос к API по постоянному соединению
+        
+        Если переиспользуемое соединение оказалось закрыто Docker'ом,
+        запрос повторяется один раз по новому соединению.
+        
+        Args:
+            method: HTTP метод
+            path: Путь ресурса без версии API
+            body: Тело (dict сериализуется в JSON, bytes передаются как есть)
+            params: Параметры строки запроса
+            content_type: Тип содержимого для bytes-тела
+            
+        Returns:
+            Tuple[int, Dict[str, str], bytes]: (статус, заголовки, тело)
+        """
+        if isinstance(body, (dict, list)):
+            payload = json.dumps(body).encode("utf-8")
+            content_type = "application/json"
+        else:
+            payload = body or b""
+        data = self._build_request(method, self._path(path, params), payload, content_type)
+        
+        async with self._lock:
+            for attempt in range(2):
+                reused = self.is_alive
+                if not reused:
+                    self._reader, self._writer = await self._open()
+                
+                try:
+                    self._writer.write(data)
+                    await self._writer.drain()
+                    status, headers, response, keep_alive = await self._read_response(self._reader)
+                except (ConnectionError, asyncio.IncompleteReadError) as e:
+                    await self._close_connection()
+                    if reused and attempt == 0:
+                        continue
+                    raise ConnectionError(f"Ошибка соединения с Docker: {e!r}") from e
+                except BaseException:
+                    # Ответ не дочитан - соединение в неизвестном состоянии
+                    await self._close_connection()
+                    raise
+                
+                if not keep_alive:
+                    await self._close_connection()
+                return status, headers, response
+    
+    async def _stream_request(self, method: str, path: str, body: Dict[str, Any]) -> Tuple[int, bytes]:
+        """
+        Запрос с потоковым ответом по отдельному соединению
+        
+        Args:
+            method: HTTP метод
+            path: Путь ресурса без версии API
+            body: JSON тело
+            
+        Returns:
+            Tuple[int, bytes]: (статус, тело)
+        """
+        reader, writer = await self._open()
+        try:
+            payload = json.dumps(body).encode("utf-8")
+            writer.write(self._build_request(method, self._path(path), payload, "application/json"))
+            await writer.drain()
+            status, _, response, _ = await self._read_response(reader)
+            return status, response
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+    
+    @staticmethod
+    def _error(action: str, status: int, body: bytes) -> Exception:
+        """
+        Исключение с сообщением Docker API
+        
+        Args:
+            action: Описание операции
+            status: HTTP статус
+            body: Тело ответа
+            
+        Returns:
+            Exception: Исключение для raise
+        """
+        try:
+            message = json.loads(body).get("message", "")
+        except (ValueError, AttributeError):
+            message = body.decode("utf-8", errors="replace")
+        return Exception(f"Docker API: {action} ({status}): {message.strip()}")
+    
+    @staticmethod
+    def _demux(raw: bytes) -> Tuple[bytes, bytes]:
+        """
+        Разделение мультиплексированного потока exec на stdout и stderr
+        
+        Args:
+            raw: Поток с 8-байтовыми заголовками кадров
+            
+        Returns:
+            Tuple[bytes, bytes]: (stdout, stderr)
+        """
+        streams = {1: bytearray(), 2: bytearray()}
+        offset = 0
+        while offset + 8 <= len(raw):
+            stream_type, size = struct.unpack(">BxxxL", raw[offset:offset + 8])
+            offset += 8
+            streams.get(stream_type, streams[1]).extend(raw[offset:offset + size])
+            offset += size
+        return bytes(streams[1]), bytes(streams[2])
+    
+    async def exec_run(self, cmd: List[str]) -> Tuple[str, str, int]:
+        """
+        Выполнение команды через exec API (create, start, inspect)
+        
+        Args:
+            cmd: Команда и аргументы
+            
+        Returns:
+            Tuple[str, str, int]: (stdout, stderr, return_code)
+        """
+        container = quote(self.container, safe="")
+        status, _, body = await self.request("POST", f"/containers/{container}/exec", {
+            "AttachStdout": True,
+            "AttachStderr": True,
+            "Tty": False,
+            "Cmd": cmd
+        })
+        if status != 201:
+            raise self._error("exec create", status, body)
+        exec_id = json.loads(body)["Id"]
+        
+        status, raw = await self._stream_request("POST", f"/exec/{exec_id}/start", {
+            "Detach": False,
+            "Tty": False
+        })
+        if status != 200:
+            raise self._error("exec start", status, raw)
+        stdout, stderr = self._demux(raw)
+        
+        status, _, body = await self.request("GET", f"/exec/{exec_id}/json")
+        if status != 200:
+            raise self._error("exec inspect", status, body)
+        exit_code = json.loads(body).get("ExitCode")
+        
+        return (
+            stdout.decode("utf-8", errors="replace").strip(),
+            stderr.decode("utf-8", errors="replace").strip(),
+            exit_code if exit_code is not None else -1
+        )
+    
+    async def put_archive(self, directory: str, name: str, content: bytes, mode: int = 0o600) -> None:
+        """
+        Загрузка файла в контейнер tar-архивом
+        
+        Args:
+            directory: Каталог назначения (должен существовать)
+            name: Имя файла
+            content: Содержимое
+            mode: Права доступа файла
+        """
+        archive = io.BytesIO()
+        with tarfile.open(fileobj=archive, mode="w") as tar:
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            info.mode = mode
+            info.mtime = int(time.time())
+            tar.addfile(info, io.BytesIO(content))
+        
+        container = quote(self.container, safe="")
+        status, _, body = await self.request(
+            "PUT",
+            f"/containers/{container}/archive",
+            archive.getvalue(),
+            params={"path": directory},
+            content_type="application/x-tar"
+        )
+        if status != 200:
+            raise self._error(f"запись {directory}/{name}", status, body)
+    
+    async def execute(self, command: str) -> Tuple[str, str, int]:
+        """
+        Выполнение shell-команды в контейнере (интерфейс ContainerShell)
+        
+        Args:
+            command: Команда для выполнения
+            
+        Returns:
+            Tuple[str, str, int]: (stdout, stderr, return_code)
+        """
+        try:
+            return await asyncio.wait_for(self.exec_run(["sh", "-c", command]), timeout=self.timeout)
+        except (asyncio.TimeoutError, ConnectionError, OSError) as e:
+            logger.error(f"Ошибка Docker API для контейнера {self.container}: {e!r}")
+            return "", f"Docker API недоступен: {e!r}", -1
+    
+    async def write_file(self, path: str, content: str) -> Tuple[str, str, int]:
+        """
+        Атомарная запись файла: архив во временный файл и переименование
+        
+        Args:
+            path: Путь к файлу внутри контейнера
+            content: Содержимое файла
+            
+        Returns:
+            Tuple[str, str, int]: (stdout, stderr, return_code)
+        """
+        if not content.endswith("\n"):
+            content += "\n"
+        
+        directory, name = posixpath.split(path)
+        try:
+            await asyncio.wait_for(
+                self.put_archive(directory or "/", f"{name}.tmp", content.encode("utf-8")),
+                timeout=self.timeout
+            )
+        except (asyncio.TimeoutError, ConnectionError, OSError) as e:
+            logger.error(f"Ошибка Docker API для контейнера {self.container}: {e!r}")
+            return "", f"Docker API недоступен: {e!r}", -1
+        except Exception as e:
+            return "", str(e), 1
+        
+        return await self.execute(f"mv -f {shlex.quote(path + '.tmp')} {shlex.quote(path)}")
+    
+    async def close(self) -> None:
+        """Закрытие постоянного соединения"""
+        async with self._lock:
+            await self._close_connection()
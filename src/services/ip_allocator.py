@@ -0,0 +1,241 @@
+"""
+Аллокатор IP адресов клиентов на основе битовой карты
+"""
+import ipaddress
+import re
+from typing import Dict, Any, Iterable, Optional
+
+from src.utils.logger import logger
+
+
+# Первый байт битовой карты, в котором есть хотя бы один свободный адрес
+_FREE_BYTE = re.compile(b"[^\xff]")
+
+
+class IPAllocator:
+    """Аллокатор адресов в сети CLIENT_NETWORK произвольного размера"""
+    
+    def __init__(self, network: str, start_ip: Optional[str] = None):
+        """
+        Инициализация аллокатора
+        
+        Args:
+            network: Сеть клиентов в формате CIDR (например, 10.8.0.0/16)
+            start_ip: Первый адрес, доступный для выдачи
+        """
+        self.network = ipaddress.IPv4Network(network, strict=False)
+        self.size = self.network.num_addresses
+        
+        # Адрес сети и broadcast не выдаются (кроме /31 и /32)
+        self._first = 1 if self.network.prefixlen < 31 else 0
+        self._end = self.size - 1 if self.network.prefixlen < 31 else self.size
+        
+        if start_ip:
+            start = ipaddress.IPv4Address(start_ip)
+            if start in self.network:
+                self._first = max(self._first, int(start) - int(self.network.network_address))
+            else:
+                logger.warning(f"CLIENT_IP_START {start_ip} вне сети {network}, используем начало сети")
+        
+        self.reset()
+    
+    @property
+    def capacity(self) -> int:
+        """Количество адресов, доступных для выдачи"""
+        return max(0, self._end - self._first)
+    
+    @property
+    def used(self) -> int:
+        """Количество занятых адресов в диапазоне выдачи"""
+        return self._used
+    
+    def reset(self) -> None:
+        """Очистка битовой карты"""
+        self._bitmap = bytearray((self.size + 7) // 8)
+        self._used = 0
+        self._hint = self._first
+        
+        # Адреса вне диапазона выдачи помечаем занятыми, чтобы поиск их пропускал
+        for index in range(0, self._first):
+            self._set(index)
+        for index in range(self._end, len(self._bitmap) * 8):
+            self._set(index)
+        self._used = 0
+    
+    def _index(self, ip: str) -> Optional[int]:
+        """
+        Индекс адреса в битовой карте
+        
+        Args:
+            ip: IP адрес (допускается маска, например 10.8.1.5/32)
+            
+        Returns:
+            Optional[int]: Индекс или None, если адрес вне сети
+        """
+        try:
+            address = ipaddress.IPv4Address(ip.split("/")[0].strip())
+        except ValueError:
+            return None
+        
+        if address not in self.network:
+            return None
+        return int(address) - int(self.network.network_address)
+    
+    def _is_set(self, index: int) -> bool:
+        return bool(self._bitmap[index >> 3] & (1 << (index & 7)))
+    
+    def _set(self, index: int) -> None:
+        self._bitmap[index >> 3] |= 1 << (index & 7)
+    
+    def _clear(self, index: int) -> None:
+        self._bitmap[index >> 3] &= ~(1 << (index & 7)) & 0xFF
+    
+    def _in_range(self, index: int) -> bool:
+        return self._first <= index < self._end
+    
+    def is_used(self, ip: str) -> bool:
+        """
+        Проверка занятости адреса
+        
+        Args:
+            ip: IP адрес
+            
+        Returns:
+            bool: True если адрес занят или не может быть выдан
+        """
+        index = self._index(ip)
+        return index is None or self._is_set(index)
+    
+    def mark_used(self, ip: str) -> bool:
+        """
+        Пометка адреса как занятого
+        
+        Args:
+            ip: IP адрес
+            
+        Returns:
+            bool: True если адрес был свободен и входит в диапазон выдачи
+        """
+        index = self._index(ip)
+        if index is None or not self._in_range(index) or self._is_set(index):
+            return False
+        
+        self._set(index)
+        self._used += 1
+        return True
+    
+    def mark_many(self, ips: Iterable[str]) -> None:
+        """
+        Пометка нескольких адресов как занятых
+        
+        Args:
+            ips: IP адреса
+        """
+        for ip in ips:
+            self.mark_used(ip)
+    
+    def release(self, ip: str) -> bool:
+        """
+        Освобождение адреса
+        
+        Args:
+            ip: IP адрес
+            
+        Returns:
+            bool: True если адрес был занят
+        """
+        index = self._index(ip)
+        if index is None or not self._in_range(index) or not self._is_set(index):
+            return False
+        
+        self._clear(index)
+        self._used -= 1
+        self._hint = min(self._hint, index)
+        return True
+    
+    def allocate(self) -> str:
+        """
+        Выдача первого свободного адреса
+        
+        Returns:
+            str: Выданный IP адрес
+            
+        Raises:
+            Exception: Если свободных адресов нет
+        """
+        index = self._find_free(self._hint)
+        if index is None:
+            raise Exception("Нет доступных IP адресов в сети")
+        
+        self._set(index)
+        self._used += 1
+        self._hint = index + 1
+        return str(self.network.network_address + index)
+    
+    def _find_free(self, start: int) -> Optional[int]:
+        """
+        Поиск свободного бита начиная с позиции
+        
+        Args:
+            start: Индекс, с которого начинается поиск
+            
+        Returns:
+            Optional[int]: Индекс свободного адреса или None
+        """
+        for begin in (max(start, self._first), self._first):
+            match = _FREE_BYTE.search(self._bitmap, begin >> 3)
+            while match:
+                byte_index = match.start()
+                byte = self._bitmap[byte_index]
+                for bit in range(8):
+                    index = (byte_index << 3) + bit
+                    if index >= begin and not byte & (1 << bit):
+                        return index if self._in_range(index) else None
+                match = _FREE_BYTE.search(self._bitmap, byte_index + 1)
+        return None
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Статистика использования пула
+        
+        Фрагментация - доля свободных адресов вне самого длинного
+        непрерывного свободного участка (0 - весь свободный пул одним блоком).
+        
+        Returns:
+            Dict[str, Any]: Статистика пула
+        """
+        free_runs = 0
+        largest_run = 0
+        run = 0
+        
+        # Адреса вне диапазона выдачи помечены занятыми, поэтому
+        # целые байты можно обрабатывать без проверки границ
+        for byte in self._bitmap:
+            if byte == 0x00:
+                run += 8
+                continue
+            
+            for bit in range(8):
+                if byte & (1 << bit):
+                    if run:
+                        free_runs += 1
+                        largest_run = max(largest_run, run)
+                        run = 0
+                else:
+                    run += 1
+        
+        if run:
+            free_runs += 1
+            largest_run = max(largest_run, run)
+        
+        free = self.capacity - self._used
+        return {
+            "network": str(self.network),
+            "capacity": self.capacity,
+            "used": self._used,
+            "free": free,
+            "utilisation": self._used / self.capacity if self.capacity else 1.0,
+            "free_runs": free_runs,
+            "largest_free_run": largest_run,
+            "fragmentation": 1 - largest_run / free if free else 0.0
+        }
@@ -0,0 +1,227 @@
+"""
+Сверка peer'ов сервера AmneziaWG с базой бота
+
+- Peer'а нет на интерфейсе и нет в clientsTable → конфиг удален через
+  приложение AmneziaVPN, запись удаляется из базы бота
+- Peer'а нет на интерфейсе, но есть в clientsTable → случайное удаление
+  (сбой, пересоздание контейнера), peer восстанавливается
+
+Используется периодической задачей бота (src/bot/jobs.py) и инструментом
+src/tools/sync_peers.py. Все изменения сервера проходят через очередь
+ServerMutator, поэтому в процессе бота сверка не мешает выдаче конфигов.
+"""
+from typing import Any, Dict, Iterable, List, Tuple
+
+from src.config.settings import settings
+from src.database.repository import ConfigRepository, UserRepository
+from src.database.request_log import request_log
+from src.services.awg_manager import AmneziaWGManager
+from src.services.sync_state import SyncState, DATABASE
+from src.utils.logger import logger
+
+
+# Источники, от которых зависит решение сверки: wg0.conf не нужен,
+# пропавший peer определяется по интерфейсу
+SYNC_SOURCES = ("interface", "clients_table", DATABASE)
+
+
+async def restore_peers(
+    manager: AmneziaWGManager,
+    configs: List[Dict[str, Any]]
+) -> Tuple[List[str], Dict[str, str]]:
+    """
+    Восстановление peer'ов на сервере одной операцией
+    
+    Все пропавшие peer'ы дописываются в wg0.conf одной записью,
+    clientsTable обновляется один раз, изменения применяются вместе.
+    
+    Args:
+        manager: Менеджер сервера
+        configs: Конфиги пропавших peer'ов
+        
+    Returns:
+        Tuple[List[str], Dict[str, str]]: Имена восстановленных peer'ов и
+            {имя: ошибка} для невосстановленных
+    """
+    if not configs:
+        return [], {}
+    
+    peers = [
+        {
+            "public_key": config['client_public_key'],
+            "ip": config['client_ip'],
+            # Убираем .conf из имени для красивого отображения
+            "name": config['config_name'].replace('.conf', '')
+        }
+        for config in configs
+    ]
+    
+    try:
+        results = await manager.mutator.restore_peers(peers)
+    except Exception as e:
+        logger.error(f"❌ Ошибка восстановления peer'ов сервера {manager.server.id}: {e}")
+        return [], {peer['name']: str(e) for peer in peers}
+    
+    restored = []
+    failed = {}
+    for peer in peers:
+        error = results.get(peer['public_key'])
+        if error is None:
+            logger.info(f"✅ Восстановлен peer: {peer['name']} ({peer['ip']})")
+            restored.append(peer['name'])
+        else:
+            logger.error(f"❌ Ошибка восстановления peer {peer['name']}: {error}")
+            failed[peer['name']] = error
+    
+    return restored, failed
+
+
+async def find_missing(manager: AmneziaWGManager) -> Tuple[List[Dict[str, Any]], int, List[Dict[str, Any]]]:
+    """
+    Конфиги сервера в базе бота, peer'ов которых нет на интерфейсе
+    
+    Конфиги читаются до интерфейса: peer выдаваемого конфига появляется
+    на интерфейсе раньше записи в базе, поэтому не считается пропавшим
+    
+    Args:
+        manager: Менеджер сервера
+        
+    Returns:
+        Tuple[List[Dict[str, Any]], int, List[Dict[str, Any]]]: Конфиги сервера,
+            число peer'ов интерфейса и пропавшие конфиги
+    """
+    bot_configs = await ConfigRepository.get_server_configs(manager.server.id)
+    current_peers = set(await manager.get_interface_peers())
+    missing = [config for config in bot_configs if config['client_public_key'] not in current_peers]
+    return bot_configs, len(current_peers), missing
+
+
+async def sync_server(manager: AmneziaWGManager) -> Dict[str, Any]:
+    """
+    Сверка одного сервера с базой бота
+    
+    Если интерфейс, clientsTable и конфиги сервера в базе не изменились с
+    последней успешной сверки, сервер не читается.
+    
+    Args:
+        manager: Менеджер сервера
+        
+    Returns:
+        Dict[str, Any]: restored (имена восстановленных peer'ов), deleted
+            (имена конфигов, удаленных из базы), failed ({имя: ошибка})
+            
+    Raises:
+        Exception: Сервер недоступен (конфиги не удаляются и не восстанавливаются)
+    """
+    server_id = manager.server.id
+    result = {"restored": [], "deleted": [], "failed": {}}
+    
+    state = await SyncState.load(manager, "sync", SYNC_SOURCES)
+    if state.unchanged:
+        logger.debug(f"[{server_id}] Источники не изменились с последней сверки, пропуск")
+        return result
+    
+    # После успешной сверки все конфиги есть на интерфейсе, а clientsTable
+    # нужен только для пропавших peer'ов: его изменение само по себе ничего не меняет
+    if state.changed == ["clients_table"]:
+        logger.debug(f"[{server_id}] Изменился только clientsTable, сверка не требуется")
+        await state.save(state.summary)
+        return result
+    
+    logger.info(f"[{server_id}] Сверка peer'ов, изменились: {', '.join(state.changed)}")
+    
+    bot_configs, peers_count, missing = await find_missing(manager)
+    
+    logger.info(f"[{server_id}] На сервере: {peers_count} peer(s), в базе бота: {len(bot_configs)} конфигураций")
+    
+    # clientsTable читается, только если есть пропавшие peer'ы. Ошибка чтения
+    # прерывает сверку: иначе все пропавшие конфиги были бы удалены из базы
+    clients_table = await manager.clients_table.get_clients() if missing else {}
+    
+    to_restore = []
+    for config in missing:
+        config_name = config['config_name']
+        
+        if config['client_public_key'] not in clients_table:
+            # Peer'а нет НИ на сервере, НИ в clientsTable
+            # = НАМЕРЕННОЕ УДАЛЕНИЕ через приложение
+            logger.warning(f"🗑️  {config_name}: удален через приложение, удаляем из базы бота")
+            try:
+                await ConfigRepository.delete_config(config['id'])
+            except Exception as e:
+                logger.error(f"Ошибка удаления конфига {config_name} из базы: {e}")
+                result['failed'][config_name] = str(e)
+                continue
+            manager.release_ip(config['client_ip'])
+            logger.info(f"🗑️  Удален из базы бота: {config_name}")
+            result['deleted'].append(config_name.replace('.conf', ''))
+        else:
+            # Peer'а нет на сервере, НО ЕСТЬ в clientsTable
+            # = СЛУЧАЙНОЕ УДАЛЕНИЕ (сбой, перезапись)
+            logger.warning(f"🔄 {config_name}: случайное удаление, восстанавливаем...")
+            to_restore.append(config)
+    
+    result['restored'], failed = await restore_peers(manager, to_restore)
+    result['failed'].update(failed)
+    
+    # Состояние сохраняется, только если все расхождения устранены:
+    # иначе следующий запуск повторит сверку
+    if result['failed']:
+        return result
+    
+    if missing:
+        # Сверка сама изменила источники: отпечатки снимаются заново, и по
+        # ним повторяется поиск расхождений. Если peer'ы пропали во время
+        # восстановления (сбой, удаление через приложение), состояние не
+        # сохраняется и следующий запуск их обработает
+        await state.refresh()
+        bot_configs, peers_count, still_missing = await find_missing(manager)
+        if still_missing:
+            logger.warning(
+                f"[{server_id}] Во время сверки пропали {len(still_missing)} peer(s), "
+                f"повтор при следующем запуске"
+            )
+            return result
+    
+    await state.save({
+        "peers": peers_count,
+        "configs": len(bot_configs),
+        "restored": len(result['restored']),
+        "deleted": len(result['deleted'])
+    })
+    
+    return result
+
+
+async def cleanup_empty_users(exclude_telegram_ids: Iterable[int] = ()) -> List[str]:
+    """
+    Удаление пользователей без конфигураций (одной транзакцией)
+    
+    Пользователи, созданные менее EMPTY_USER_GRACE_SECONDS назад, не
+    удаляются: их первый конфиг может еще выдаваться. Накопленная история
+    запросов записывается до удаления, чтобы не ссылаться на удаленных
+    пользователей.
+    
+    Args:
+        exclude_telegram_ids: Пользователи, которым сейчас выдается конфиг
+        
+    Returns:
+        List[str]: Имена удаленных пользователей
+    """
+    try:
+        await request_log.flush()
+        usernames = await UserRepository.delete_users_without_configs(
+            grace_seconds=settings.EMPTY_USER_GRACE_SECONDS,
+            exclude_telegram_ids=exclude_telegram_ids
+        )
+    except Exception as e:
+        logger.error(f"Ошибка очистки пустых пользователей: {e}")
+        return []
+    
+    for username in usernames:
+        logger.info(f"🗑️  Удален пустой пользователь: {username}")
+    
+    if usernames:
+        logger.info(f"✅ Очищено {len(usernames)} пользователей без конфигов")
+    
+    return usernames
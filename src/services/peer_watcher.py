@@ -0,0 +1,305 @@
+"""
+Наблюдение за серверами AmneziaWG для sync_peers --watch
+
+Сверка сервера запускается только когда изменился один из источников:
+wg0.conf, clientsTable или набор peer'ов интерфейса. Изменения файлов
+приходят через inotify (каталог конфигурации на хосте: бэкенд host или
+AWG_HOST_CONFIG_PATH для контейнера), остальное - через опрос отпечатков
+раз в WATCH_POLL_INTERVAL. Набор peer'ов интерфейса опрашивается всегда
+с этим интервалом; пока файлы не меняются, интервал их проверки
+удваивается до WATCH_POLL_MAX_INTERVAL и сбрасывается при первом изменении.
+Серия изменений объединяется: сверка начинается после WATCH_DEBOUNCE_MS
+без новых событий.
+"""
+import asyncio
+import ctypes
+import ctypes.util
+import os
+import struct
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Set
+
+from src.services.awg_manager import AmneziaWGManager
+from src.utils.logger import logger
+
+
+class InotifyWatch:
+    """Наблюдение за файлами в каталогах через inotify (Linux, ctypes)"""
+    
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    
+    # Атомарная запись (временный файл и переименование) приходит как IN_MOVED_TO
+    MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    
+    # Заголовок события: wd, mask, cookie, len
+    EVENT_HEADER = struct.Struct("iIII")
+    
+    def __init__(self):
+        """Инициализация дескриптора inotify"""
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        
+        self.fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        
+        # wd -> (имена файлов, обработчик)
+        self._watches: Dict[int, tuple] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+    
+    @staticmethod
+    def available() -> bool:
+        """Доступен ли inotify в этой системе"""
+        if os.uname().sysname != "Linux":
+            return False
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        try:
+            return hasattr(ctypes.CDLL(libc_name), "inotify_init1")
+        except OSError:
+            return False
+    
+    def add(self, directory: str, names: Iterable[str], callback: Callable[[str], None]) -> None:
+        """
+        Наблюдение за файлами каталога
+        
+        Наблюдается каталог, а не файлы: после атомарной записи у файла
+        новый inode, и наблюдение за старым перестало бы срабатывать.
+        
+        Args:
+            directory: Каталог
+            names: Имена файлов, изменения которых нужно сообщать
+            callback: Обработчик, получает имя измененного файла
+        """
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), self.MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_add_watch {directory}: {os.strerror(errno)}")
+        
+        self._watches[wd] = (set(names), callback)
+        
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+            self._loop.add_reader(self.fd, self._read)
+    
+    def _read(self) -> None:
+        """Чтение и разбор накопленных событий"""
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        
+        offset = 0
+        while offset + self.EVENT_HEADER.size <= len(data):
+            wd, mask, cookie, length = self.EVENT_HEADER.unpack_from(data, offset)
+            offset += self.EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0").decode("utf-8", errors="replace")
+            offset += length
+            
+            watch = self._watches.get(wd)
+            if watch is not None and name in watch[0]:
+                watch[1](name)
+    
+    def close(self) -> None:
+        """Остановка наблюдения"""
+        if self.fd < 0:
+            return
+        if self._loop is not None:
+            self._loop.remove_reader(self.fd)
+        os.close(self.fd)
+        self.fd = -1
+
+
+class PeerWatcher:
+    """Сверка серверов по событиям изменения источников"""
+    
+    # Источники, которые опрашиваются с базовым интервалом
+    INTERFACE_SOURCES = ("interface",)
+    
+    def __init__(
+        self,
+        managers: Iterable[AmneziaWGManager],
+        reconcile: Callable[[AmneziaWGManager], Awaitable[Any]],
+        poll_interval: float = 30,
+        debounce_ms: float = 500,
+        max_poll_interval: float = 300
+    ):
+        """
+        Инициализация наблюдения
+        
+        Args:
+            managers: Менеджеры наблюдаемых серверов
+            reconcile: Сверка одного сервера
+            poll_interval: Интервал опроса отпечатков (секунды)
+            debounce_ms: Ожидание окончания серии изменений (мс)
+            max_poll_interval: Предельный интервал проверки файлов без изменений (секунды)
+        """
+        self.managers = list(managers)
+        self.reconcile = reconcile
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max(poll_interval, max_poll_interval)
+        self.debounce = debounce_ms / 1000
+        
+        self._events: Dict[str, asyncio.Event] = {}
+        self._inotify: Optional[InotifyWatch] = None
+    
+    @staticmethod
+    def host_directory(manager: AmneziaWGManager) -> Optional[str]:
+        """
+        Каталог конфигурации сервера на хосте, если он доступен
+        
+        Args:
+            manager: Менеджер сервера
+            
+        Returns:
+            Optional[str]: Каталог или None
+        """
+        if manager.backend.name == "host":
+            return manager.server.config_path
+        return manager.server.host_config_path or None
+    
+    def _start_inotify(self) -> Set[str]:
+        """
+        Подписка на изменения файлов серверов с каталогом на хосте
+        
+        Returns:
+            Set[str]: Серверы, за файлами которых следит inotify
+        """
+        watched = set()
+        directories = {
+            manager.server.id: self.host_directory(manager)
+            for manager in self.managers
+            if self.host_directory(manager)
+        }
+        if not directories:
+            return watched
+        
+        if not InotifyWatch.available():
+            logger.info("inotify недоступен, изменения файлов определяются опросом отпечатков")
+            return watched
+        
+        try:
+            self._inotify = InotifyWatch()
+        except OSError as e:
+            logger.warning(f"Не удалось запустить inotify: {e}")
+            return watched
+        
+        for manager in self.managers:
+            server_id = manager.server.id
+            directory = directories.get(server_id)
+            if not directory:
+                continue
+            
+            names = {
+                os.path.basename(manager.server_config_path),
+                os.path.basename(manager.clients_table.path)
+            }
+            try:
+                self._inotify.add(directory, names, lambda name, event=self._events[server_id]: event.set())
+            except OSError as e:
+                logger.warning(f"[{server_id}] inotify для {directory} недоступен: {e}")
+                continue
+            
+            watched.add(server_id)
+            logger.info(f"[{server_id}] Изменения файлов отслеживаются через inotify: {directory}")
+        
+        return watched
+    
+    async def _wait_for_change(self, event: asyncio.Event, timeout: float) -> bool:
+        """
+        Ожидание события или интервала опроса, затем окончания серии событий
+        
+        Args:
+            event: Событие изменения файлов сервера
+            timeout: Интервал опроса (секунды)
+            
+        Returns:
+            bool: True если пришло событие изменения файлов
+        """
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        
+        # Серия записей (например, wg0.conf и затем clientsTable) - одна сверка,
+        # но не дольше десяти интервалов ожидания при непрерывных изменениях
+        for _ in range(10):
+            event.clear()
+            try:
+                await asyncio.wait_for(event.wait(), self.debounce)
+            except asyncio.TimeoutError:
+                break
+        event.clear()
+        return True
+    
+    async def _watch_server(self, manager: AmneziaWGManager) -> None:
+        """
+        Цикл наблюдения за одним сервером
+        
+        Args:
+            manager: Менеджер сервера
+        """
+        server_id = manager.server.id
+        event = self._events[server_id]
+        loop = asyncio.get_running_loop()
+        reconciled = None
+        files_interval = self.poll_interval
+        files_due = 0.0
+        
+        while True:
+            # Peer'ы интерфейса опрашиваются всегда: только так обнаруживается
+            # очистка интерфейса. Файлы без изменений проверяются все реже
+            polled_at = loop.time()
+            check_files = reconciled is None or polled_at >= files_due
+            try:
+                fingerprint = await manager.get_fingerprint(None if check_files else self.INTERFACE_SOURCES)
+                if not check_files:
+                    fingerprint = {**reconciled, **fingerprint}
+            except Exception as e:
+                logger.error(f"[{server_id}] Ошибка получения отпечатков сервера: {e}")
+                fingerprint = None
+            
+            if fingerprint is not None and fingerprint == reconciled:
+                if check_files:
+                    files_interval = min(files_interval * 2, self.max_poll_interval)
+                    files_due = polled_at + files_interval
+            elif fingerprint is not None:
+                files_interval = self.poll_interval
+                files_due = polled_at + files_interval
+                if reconciled is not None:
+                    changed = [name for name, value in fingerprint.items() if value != reconciled.get(name)]
+                    logger.info(f"[{server_id}] Изменились: {', '.join(changed)}, выполняем сверку")
+                
+                try:
+                    await self.reconcile(manager)
+                    # Сверка сама могла изменить источники - запоминаем состояние после нее
+                    reconciled = await manager.get_fingerprint()
+                except Exception as e:
+                    logger.error(f"[{server_id}] Ошибка сверки сервера: {e}", exc_info=True)
+            
+            if await self._wait_for_change(event, self.poll_interval):
+                files_interval = self.poll_interval
+                files_due = 0.0
+    
+    async def run(self) -> None:
+        """Наблюдение за всеми серверами до отмены"""
+        self._events = {manager.server.id: asyncio.Event() for manager in self.managers}
+        watched = self._start_inotify()
+        
+        for manager in self.managers:
+            if manager.server.id not in watched:
+                logger.info(
+                    f"[{manager.server.id}] Изменения определяются опросом отпечатков: интерфейс раз в "
+                    f"{self.poll_interval:g} с, файлы раз в {self.poll_interval:g}-{self.max_poll_interval:g} с"
+                )
+        
+        try:
+            await asyncio.gather(*(self._watch_server(manager) for manager in self.managers))
+        finally:
+            if self._inotify is not None:
+                self._inotify.close()
+                self._inotify = None
@@ -0,0 +1,303 @@
+"""
+Единственный писатель конфигурации сервера
+
+Все изменения wg0.conf и clientsTable проходят через очередь и
+выполняются одной задачей по порядку. Выдача адреса и добавление peer'а
+происходят внутри этой задачи, поэтому одновременные запросы не могут
+получить один и тот же IP или перезаписать изменения друг друга.
+Чтение конфигурации выполняется параллельно и очередь не использует.
+"""
+import asyncio
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from src.utils.logger import logger
+
+
+class ServerMutator:
+    """Очередь изменений конфигурации сервера с одним исполнителем"""
+    
+    # Операции, которые объединяются в одну запись wg0.conf
+    ADD_OPERATIONS = ("issue", "issue_group", "add")
+    
+    def __init__(self, manager, batch_window_ms: float = 5):
+        """
+        Инициализация очереди
+        
+        Args:
+            manager: Менеджер AmneziaWG (операции над файлами контейнера)
+            batch_window_ms: Окно накопления операций перед записью (мс)
+        """
+        self.manager = manager
+        self.batch_window_ms = batch_window_ms
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+    
+    async def issue_peer(self, public_key: str, client_name: str) -> str:
+        """
+        Выдача адреса и добавление нового peer'а одной операцией
+        
+        Args:
+            public_key: Публичный ключ клиента
+            client_name: Имя клиента
+            
+        Returns:
+            str: Выданный IP адрес
+        """
+        return await self._submit("issue", {
+            "public_key": public_key,
+            "name": client_name
+        })
+    
+    async def issue_peers(self, peers: List[Dict[str, str]]) -> List[str]:
+        """
+        Выдача адресов и добавление группы новых peer'ов одной операцией
+        
+        Группа не зависит от окна накопления: она выполняется целиком в
+        одной записи wg0.conf, а при ошибке не добавляется ни один peer.
+        
+        Args:
+            peers: Peer'ы с ключами public_key и name
+            
+        Returns:
+            List[str]: Выданные IP адреса в порядке peers
+        """
+        return await self._submit("issue_group", [
+            {"public_key": peer['public_key'], "name": peer['name']}
+            for peer in peers
+        ])
+    
+    async def add_peer(self, public_key: str, client_ip: str, client_name: str) -> None:
+        """
+        Добавление peer'а с уже известным адресом (восстановление)
+        
+        Args:
+            public_key: Публичный ключ клиента
+            client_ip: IP адрес клиента
+            client_name: Имя клиента
+        """
+        await self._submit("add", {
+            "public_key": public_key,
+            "ip": client_ip,
+            "name": client_name
+        })
+    
+    async def restore_peers(self, peers: List[Dict[str, str]]) -> Dict[str, Optional[str]]:
+        """
+        Восстановление группы peer'ов с известными адресами одной записью
+        
+        Args:
+            peers: Peer'ы с ключами public_key, ip и name
+            
+        Returns:
+            Dict[str, Optional[str]]: {public_key: None - восстановлен,
+                иначе причина пропуска}
+        """
+        return await self._submit("restore", [dict(peer) for peer in peers])
+    
+    async def remove_peers(self, public_keys: Iterable[str]) -> List[str]:
+        """
+        Удаление peer'ов из wg0.conf, clientsTable и с интерфейса
+        
+        Args:
+            public_keys: Публичные ключи peer'ов
+            
+        Returns:
+            List[str]: Ключи peer'ов, найденных в wg0.conf
+        """
+        return await self._submit("remove", list(public_keys))
+    
+    async def retain_clients(self, public_keys: Iterable[str]) -> List[Dict[str, Any]]:
+        """
+        Удаление из clientsTable всех клиентов, кроме указанных
+        
+        Args:
+            public_keys: Публичные ключи клиентов, которые нужно оставить
+            
+        Returns:
+            List[Dict[str, Any]]: Удаленные записи clientsTable
+        """
+        return await self._submit("retain", list(public_keys))
+    
+    async def check_consistency(self) -> bool:
+        """
+        Сверка peer'ов интерфейса с wg0.conf между изменениями
+        
+        Выполняется в очереди, поэтому не видит наполовину примененную
+        запись и не запускает из-за нее полную синхронизацию.
+        
+        Returns:
+            bool: True если расхождений не было
+        """
+        return await self._submit("check", None)
+    
+    async def _submit(self, operation: str, payload: Any) -> Any:
+        """
+        Постановка операции в очередь и ожидание результата
+        
+        Args:
+            operation: Тип операции
+            payload: Данные операции
+            
+        Returns:
+            Any: Результат операции
+        """
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((operation, payload, future))
+        return await future
+    
+    async def _run(self) -> None:
+        """Цикл исполнителя: операции выполняются группами по порядку"""
+        stopping = False
+        while not stopping:
+            batch = [await self._queue.get()]
+            
+            # Даем одновременным запросам попасть в ту же группу
+            await asyncio.sleep(self.batch_window_ms / 1000)
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            
+            # None - сигнал остановки от close()
+            stopping = None in batch
+            batch = [item for item in batch if item is not None]
+            
+            try:
+                await self._execute(batch)
+            except Exception as e:
+                logger.error(f"Ошибка выполнения изменений конфигурации: {e}", exc_info=True)
+                self._fail(batch, e)
+    
+    async def _execute(self, batch: List[Tuple[str, Any, asyncio.Future]]) -> None:
+        """
+        Выполнение группы операций
+        
+        Подряд идущие добавления объединяются в одну запись, остальные
+        операции выполняются по одной, сохраняя порядок постановки.
+        
+        Args:
+            batch: Операции (тип, данные, future)
+        """
+        index = 0
+        while index < len(batch):
+            operation, payload, future = batch[index]
+            
+            if operation in self.ADD_OPERATIONS:
+                end = index
+                while end < len(batch) and batch[end][0] in self.ADD_OPERATIONS:
+                    end += 1
+                await self._add_group(batch[index:end])
+                index = end
+                continue
+            
+            try:
+                if operation == "remove":
+                    result = await self._remove(payload)
+                elif operation == "retain":
+                    result = await self.manager.clients_table.retain(payload)
+                elif operation == "restore":
+                    result = await self.manager.restore_peers_to_server(payload)
+                elif operation == "check":
+                    result = await self.manager.check_consistency()
+                else:
+                    raise Exception(f"Неизвестная операция: {operation}")
+            except Exception as e:
+                self._fail([batch[index]], e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+            index += 1
+    
+    async def _add_group(self, group: List[Tuple[str, Any, asyncio.Future]]) -> None:
+        """
+        Выдача адресов и добавление группы peer'ов одной записью
+        
+        Args:
+            group: Операции issue, issue_group и add
+        """
+        peers = []
+        issued = []
+        accepted = []
+        allocator = None
+        
+        for operation, payload, future in group:
+            operation_peers = [dict(item) for item in payload] if operation == "issue_group" else [dict(payload)]
+            operation_issued = []
+            if operation != "add":
+                try:
+                    # Аллокатор проверяет wg0.conf один раз на всю группу
+                    if allocator is None:
+                        allocator = await self.manager.get_allocator()
+                    for peer in operation_peers:
+                        peer['ip'] = allocator.allocate()
+                        operation_issued.append(peer['ip'])
+                except Exception as e:
+                    # Группа peer'ов выдается целиком или не выдается
+                    for client_ip in operation_issued:
+                        self.manager.release_ip(client_ip)
+                    self._fail([(operation, payload, future)], e)
+                    continue
+            peers.extend(operation_peers)
+            issued.extend(operation_issued)
+            accepted.append((operation, operation_peers, future))
+        
+        if not peers:
+            return
+        
+        try:
+            await self.manager.add_peers_to_server(peers)
+        except Exception as e:
+            # Peer'ы не добавлены - возвращаем выданные адреса в пул
+            for client_ip in issued:
+                self.manager.release_ip(client_ip)
+            self._fail(accepted, e)
+            return
+        
+        for operation, operation_peers, future in accepted:
+            if future.done():
+                continue
+            if operation == "issue":
+                future.set_result(operation_peers[0]['ip'])
+            elif operation == "issue_group":
+                future.set_result([peer['ip'] for peer in operation_peers])
+            else:
+                future.set_result(None)
+    
+    async def _remove(self, public_keys: List[str]) -> List[str]:
+        """
+        Удаление peer'ов с сервера и из clientsTable
+        
+        Args:
+            public_keys: Публичные ключи peer'ов
+            
+        Returns:
+            List[str]: Ключи peer'ов, найденных в wg0.conf
+        """
+        removed = await self.manager.remove_peers_from_server(public_keys)
+        await self.manager.clients_table.remove(public_keys)
+        return removed
+    
+    @staticmethod
+    def _fail(operations: List[Tuple[str, Any, asyncio.Future]], error: Exception) -> None:
+        """
+        Завершение операций с ошибкой
+        
+        Args:
+            operations: Операции (тип, данные, future)
+            error: Исключение
+        """
+        for _, _, future in operations:
+            if not future.done():
+                future.set_exception(error)
+    
+    async def close(self) -> None:
+        """Завершение исполнителя после выполнения уже поставленных операций"""
+        if self._worker is None or self._worker.done():
+            return
+        
+        await self._queue.put(None)
+        await self._worker
+        self._worker = None
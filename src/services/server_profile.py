@@ -0,0 +1,164 @@
+"""
+Параметры сервера AmneziaWG
+
+Профиль содержит все, что отличает один сервер от другого: адрес и ключи
+для клиентского конфига, параметры обфускации, способ доступа (бэкенд,
+контейнер) и пул адресов клиентов. Без SERVERS_FILE используется один
+профиль из переменных окружения.
+"""
+from typing import Any, Dict
+
+from src.config.settings import settings
+
+
+class ServerProfile:
+    """Описание одного сервера AmneziaWG"""
+    
+    # Идентификатор сервера из переменных окружения (и существующих записей БД)
+    DEFAULT_ID = "default"
+    
+    # Параметры обфускации AmneziaWG в порядке вывода в конфиге
+    OBFUSCATION_KEYS = ("Jc", "Jmin", "Jmax", "S1", "S2", "H1", "H2", "H3", "H4")
+    
+    def __init__(
+        self,
+        server_id: str,
+        endpoint: str,
+        public_key: str,
+        preshared_key: str,
+        obfuscation: Dict[str, int],
+        backend: str = "docker",
+        container: str = "amnezia-awg",
+        config_path: str = "/opt/amnezia/awg",
+        docker_transport: str = "session",
+        docker_socket: str = "/var/run/docker.sock",
+        network: str = "10.8.1.0/24",
+        ip_start: str = None,
+        weight: float = 1.0,
+        host_config_path: str = ""
+    ):
+        """
+        Инициализация профиля
+        
+        Args:
+            server_id: Идентификатор сервера (хранится в configs.server_id)
+            endpoint: Адрес сервера для клиентов (IP:порт)
+            public_key: Публичный ключ сервера
+            preshared_key: PresharedKey клиентов
+            obfuscation: Параметры обфускации {Jc: 2, ..., H4: ...}
+            backend: Бэкенд доступа: docker, host или fake
+            container: Имя контейнера AmneziaWG (для docker)
+            config_path: Каталог конфигурации на сервере
+            docker_transport: session (docker exec) или api (Docker Engine API)
+            docker_socket: Сокет Docker Engine API (для транспорта api)
+            network: Сеть клиентов в формате CIDR
+            ip_start: Первый адрес, доступный для выдачи
+            weight: Вес при размещении (0 - новые peer'ы не размещаются)
+            host_config_path: Каталог хоста, смонтированный в config_path
+                контейнера (для наблюдения через inotify)
+        """
+        self.id = server_id
+        self.endpoint = endpoint
+        self.public_key = public_key
+        self.preshared_key = preshared_key
+        self.obfuscation = obfuscation
+        self.backend = backend
+        self.container = container
+        self.config_path = config_path
+        self.docker_transport = docker_transport
+        self.docker_socket = docker_socket
+        self.network = network
+        self.ip_start = ip_start
+        self.weight = weight
+        self.host_config_path = host_config_path
+    
+    @classmethod
+    def from_settings(cls) -> "ServerProfile":
+        """
+        Профиль единственного сервера из переменных окружения
+        
+        Returns:
+            ServerProfile: Профиль с идентификатором DEFAULT_ID
+        """
+        return cls(
+            server_id=cls.DEFAULT_ID,
+            endpoint=settings.SERVER_ENDPOINT,
+            public_key=settings.SERVER_PUBLIC_KEY,
+            preshared_key=settings.PRESHARED_KEY,
+            obfuscation={
+                "Jc": settings.JC,
+                "Jmin": settings.JMIN,
+                "Jmax": settings.JMAX,
+                "S1": settings.S1,
+                "S2": settings.S2,
+                "H1": settings.H1,
+                "H2": settings.H2,
+                "H3": settings.H3,
+                "H4": settings.H4
+            },
+            backend=settings.AWG_BACKEND,
+            container=settings.AWG_CONTAINER,
+            config_path=settings.AWG_CONFIG_PATH,
+            docker_transport=settings.DOCKER_TRANSPORT,
+            docker_socket=settings.DOCKER_SOCKET,
+            network=settings.CLIENT_NETWORK,
+            ip_start=settings.CLIENT_IP_START,
+            host_config_path=settings.AWG_HOST_CONFIG_PATH
+        )
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ServerProfile":
+        """
+        Профиль из записи SERVERS_FILE
+        
+        Отсутствующие поля берутся из переменных окружения, поэтому в
+        файле достаточно указать то, чем сервер отличается.
+        
+        Args:
+            data: Запись сервера (id, endpoint, public_key, preshared_key,
+                backend, container, config_path, docker_transport,
+                docker_socket, network, ip_start, weight, host_config_path и параметры
+                обфускации jc, jmin, ..., h4)
+                
+        Returns:
+            ServerProfile: Профиль сервера
+        """
+        defaults = cls.from_settings()
+        
+        if not data.get('id'):
+            raise Exception(f"Не указан id сервера: {data}")
+        
+        obfuscation = {
+            key: int(data.get(key.lower(), defaults.obfuscation[key]))
+            for key in cls.OBFUSCATION_KEYS
+        }
+        
+        # Пул адресов из окружения подходит только серверу с той же сетью
+        network = data.get('network', defaults.network)
+        ip_start = data.get('ip_start', defaults.ip_start if network == defaults.network else None)
+        
+        profile = cls(
+            server_id=str(data['id']),
+            endpoint=data.get('endpoint', defaults.endpoint),
+            public_key=data.get('public_key', defaults.public_key),
+            preshared_key=data.get('preshared_key', defaults.preshared_key),
+            obfuscation=obfuscation,
+            backend=data.get('backend', defaults.backend),
+            container=data.get('container', defaults.container),
+            config_path=data.get('config_path', defaults.config_path),
+            docker_transport=data.get('docker_transport', defaults.docker_transport),
+            docker_socket=data.get('docker_socket', defaults.docker_socket),
+            network=network,
+            ip_start=ip_start,
+            weight=float(data.get('weight', 1.0)),
+            host_config_path=data.get('host_config_path', "")
+        )
+        
+        missing = [name for name in ("endpoint", "public_key", "preshared_key") if not getattr(profile, name)]
+        if missing:
+            raise Exception(f"Сервер {profile.id}: не заданы {', '.join(missing)}")
+        
+        return profile
+    
+    def __repr__(self) -> str:
+        return f"ServerProfile({self.id}, {self.endpoint}, {self.backend})"
@@ -0,0 +1,231 @@
+"""
+Реестр серверов AmneziaWG и размещение новых peer'ов
+
+Каждый сервер обслуживается своим менеджером (бэкенд, кэш wg0.conf,
+аллокатор адресов, очередь изменений), поэтому операции на разных
+серверах выполняются независимо и одновременно. Новый peer размещается
+на сервере с наименьшей нагрузкой по политике PLACEMENT_POLICY:
+- least_peers - наименьшее число peer'ов
+- weighted - наименьшее число peer'ов на единицу веса сервера
+"""
+import asyncio
+import json
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+from src.config.settings import settings
+from src.services.awg_manager import AmneziaWGManager
+from src.services.server_profile import ServerProfile
+from src.utils.logger import logger
+
+
+class ServerRegistry:
+    """Менеджеры всех серверов и политика размещения"""
+    
+    POLICIES = ("least_peers", "weighted")
+    
+    def __init__(self, servers: List[ServerProfile], policy: str = "least_peers"):
+        """
+        Инициализация реестра
+        
+        Args:
+            servers: Профили серверов (первый - основной)
+            policy: Политика размещения: least_peers или weighted
+        """
+        if not servers:
+            raise Exception("Не задано ни одного сервера AmneziaWG")
+        if policy not in self.POLICIES:
+            raise Exception(f"Неизвестная политика размещения: {policy} (допустимо: {', '.join(self.POLICIES)})")
+        
+        self.policy = policy
+        self.managers: Dict[str, AmneziaWGManager] = {}
+        for server in servers:
+            if server.id in self.managers:
+                raise Exception(f"Повторяющийся id сервера: {server.id}")
+            self.managers[server.id] = AmneziaWGManager(server)
+        
+        # Peer'ы, размещенные на сервере, но еще не получившие адрес
+        self._placing: Dict[str, int] = {server_id: 0 for server_id in self.managers}
+    
+    @classmethod
+    def load(cls) -> "ServerRegistry":
+        """
+        Реестр из SERVERS_FILE или из переменных окружения
+        
+        SERVERS_FILE - JSON список серверов (или объект с ключом servers),
+        формат записи описан в ServerProfile.from_dict.
+        
+        Returns:
+            ServerRegistry: Реестр серверов
+        """
+        if not settings.SERVERS_FILE:
+            return cls([ServerProfile.from_settings()], settings.PLACEMENT_POLICY)
+        
+        data = json.loads(Path(settings.SERVERS_FILE).read_text(encoding='utf-8'))
+        if isinstance(data, dict):
+            data = data.get('servers', [])
+        
+        servers = [ServerProfile.from_dict(item) for item in data]
+        logger.info(f"Загружено серверов из {settings.SERVERS_FILE}: {len(servers)}")
+        return cls(servers, settings.PLACEMENT_POLICY)
+    
+    @property
+    def default(self) -> AmneziaWGManager:
+        """Менеджер основного (первого) сервера"""
+        return next(iter(self.managers.values()))
+    
+    def get(self, server_id: str) -> AmneziaWGManager:
+        """
+        Менеджер сервера по идентификатору
+        
+        Args:
+            server_id: Идентификатор сервера
+            
+        Returns:
+            AmneziaWGManager: Менеджер сервера
+        """
+        manager = self.managers.get(server_id)
+        if manager is None:
+            raise Exception(f"Сервер {server_id} не найден в реестре")
+        return manager
+    
+    def __iter__(self):
+        return iter(self.managers.values())
+    
+    def __len__(self) -> int:
+        return len(self.managers)
+    
+    async def gather(self, operation: Callable[[AmneziaWGManager], Awaitable[Any]]) -> Dict[str, Any]:
+        """
+        Одновременное выполнение операции на всех серверах
+        
+        Ошибка одного сервера не прерывает остальные и возвращается
+        в результате как исключение.
+        
+        Args:
+            operation: Функция, получающая менеджер сервера
+            
+        Returns:
+            Dict[str, Any]: {server_id: результат или исключение}
+        """
+        managers = list(self.managers.values())
+        results = await asyncio.gather(
+            *(operation(manager) for manager in managers),
+            return_exceptions=True
+        )
+        return {manager.server.id: result for manager, result in zip(managers, results)}
+    
+    async def _place(self, count: int = 1) -> AmneziaWGManager:
+        """
+        Выбор сервера для новых peer'ов
+        
+        Используется аллокатор менеджера: он строится один раз и затем
+        обновляется при каждом добавлении и удалении, поэтому выбор не
+        требует обращений к серверам. Размещенные, но еще не выданные
+        peer'ы учитываются, чтобы одновременные запросы распределялись.
+        
+        Args:
+            count: Количество peer'ов, размещаемых на одном сервере
+            
+        Returns:
+            AmneziaWGManager: Менеджер выбранного сервера
+        """
+        candidates = [manager for manager in self if manager.server.weight > 0]
+        if not candidates:
+            raise Exception("Нет серверов для размещения peer'ов (у всех weight = 0)")
+        
+        if len(candidates) == 1:
+            best = candidates[0]
+        else:
+            best = await self._least_loaded(candidates, count)
+        
+        self._placing[best.server.id] += count
+        return best
+    
+    async def _least_loaded(self, candidates: List[AmneziaWGManager], count: int = 1) -> AmneziaWGManager:
+        """
+        Сервер с наименьшей нагрузкой по политике размещения
+        
+        Args:
+            candidates: Менеджеры серверов с ненулевым весом
+            count: Количество размещаемых peer'ов
+            
+        Returns:
+            AmneziaWGManager: Менеджер выбранного сервера
+        """
+        # Аллокатор строится при первом обращении, недоступный сервер пропускается
+        missing = [manager for manager in candidates if manager.allocator is None]
+        results = await asyncio.gather(
+            *(manager.get_allocator() for manager in missing),
+            return_exceptions=True
+        )
+        for manager, result in zip(missing, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Сервер {manager.server.id} недоступен для размещения: {result}")
+        
+        best = None
+        best_load = None
+        for manager in candidates:
+            allocator = manager.allocator
+            if allocator is None:
+                continue
+            
+            peers = allocator.used + self._placing[manager.server.id]
+            if peers + count > allocator.capacity:
+                continue
+            
+            load = peers / manager.server.weight if self.policy == "weighted" else peers
+            if best is None or load < best_load:
+                best, best_load = manager, load
+        
+        if best is None:
+            raise Exception("Нет доступных серверов со свободными адресами для размещения peer'а")
+        return best
+    
+    async def issue_peer(self, public_key: str, client_name: str) -> Tuple[str, str]:
+        """
+        Размещение нового peer'а: выбор сервера, выдача адреса и добавление
+        
+        Args:
+            public_key: Публичный ключ клиента
+            client_name: Имя клиента
+            
+        Returns:
+            Tuple[str, str]: (server_id, выданный IP адрес)
+        """
+        manager = await self._place()
+        try:
+            client_ip = await manager.mutator.issue_peer(public_key, client_name)
+        finally:
+            self._placing[manager.server.id] -= 1
+        
+        return manager.server.id, client_ip
+    
+    async def issue_peers(self, peers: List[Dict[str, str]]) -> Tuple[str, List[str]]:
+        """
+        Размещение группы новых peer'ов на одном сервере одной операцией
+        
+        Args:
+            peers: Peer'ы с ключами public_key и name
+            
+        Returns:
+            Tuple[str, List[str]]: (server_id, выданные IP адреса в порядке peers)
+        """
+        manager = await self._place(len(peers))
+        try:
+            client_ips = await manager.mutator.issue_peers(peers)
+        finally:
+            self._placing[manager.server.id] -= len(peers)
+        
+        return manager.server.id, client_ips
+    
+    async def close(self) -> None:
+        """Запись отложенных изменений и закрытие всех серверов"""
+        results = await self.gather(lambda manager: manager.close())
+        for server_id, result in results.items():
+            if isinstance(result, Exception):
+                logger.error(f"Ошибка закрытия сервера {server_id}: {result}")
+
+
+# Глобальный реестр серверов
+server_registry = ServerRegistry.load()
@@ -0,0 +1,140 @@
+"""
+Отпечатки источников сверки сервера
+
+Перед сверкой отпечатки ее источников сравниваются с сохраненными после
+предыдущей успешной сверки: wg0.conf и clientsTable (размер, mtime, inode),
+набор peer'ов интерфейса (контрольная сумма `wg show allowed-ips`) и
+ревизия конфигов сервера в базе бота. Если ничего не изменилось, сверка
+завершается без чтения самих источников. Состояние хранится в таблице
+sync_state отдельно для каждого сервера и вида сверки.
+"""
+import asyncio
+from typing import Any, Dict, Iterable, List, Optional
+
+from src.database.repository import SyncStateRepository
+from src.services.awg_manager import AmneziaWGManager
+
+
+# Источник "ревизия конфигов сервера в базе бота"
+DATABASE = "database"
+
+
+class SyncState:
+    """Отпечатки источников одной сверки сервера"""
+    
+    def __init__(
+        self,
+        manager: AmneziaWGManager,
+        task: str,
+        sources: List[str],
+        fingerprint: Dict[str, Any],
+        stored: Optional[Dict[str, Any]]
+    ):
+        """
+        Инициализация состояния
+        
+        Args:
+            manager: Менеджер сервера
+            task: Вид сверки
+            sources: Источники сверки
+            fingerprint: Текущие отпечатки источников
+            stored: Состояние после предыдущей сверки или None
+        """
+        self.manager = manager
+        self.task = task
+        self.sources = sources
+        self.fingerprint = fingerprint
+        self.stored = stored
+    
+    @classmethod
+    async def load(cls, manager: AmneziaWGManager, task: str, sources: Iterable[str]) -> "SyncState":
+        """
+        Текущие и сохраненные отпечатки источников сверки
+        
+        Args:
+            manager: Менеджер сервера
+            task: Вид сверки
+            sources: Источники: wg_config, clients_table, interface, database
+            
+        Returns:
+            SyncState: Состояние сверки
+        """
+        sources = list(sources)
+        fingerprint, stored = await asyncio.gather(
+            cls._collect(manager, sources),
+            SyncStateRepository.get_state(manager.server.id, task)
+        )
+        return cls(manager, task, sources, fingerprint, stored)
+    
+    @staticmethod
+    async def _collect(manager: AmneziaWGManager, sources: List[str]) -> Dict[str, Any]:
+        """
+        Вычисление отпечатков только указанных источников
+        
+        Args:
+            manager: Менеджер сервера
+            sources: Источники сверки
+            
+        Returns:
+            Dict[str, Any]: {источник: отпечаток}
+        """
+        server_sources = [name for name in sources if name != DATABASE]
+        
+        async def server_fingerprint() -> Dict[str, Any]:
+            if not server_sources:
+                return {}
+            return await manager.get_fingerprint(server_sources)
+        
+        async def database_fingerprint() -> Dict[str, Any]:
+            if DATABASE not in sources:
+                return {}
+            return {DATABASE: await SyncStateRepository.get_config_revision(manager.server.id)}
+        
+        server, database = await asyncio.gather(server_fingerprint(), database_fingerprint())
+        return {**server, **database}
+    
+    @property
+    def changed(self) -> List[str]:
+        """Источники, изменившиеся с предыдущей сверки (недоступный источник считается измененным)"""
+        previous = self.stored['fingerprint'] if self.stored else {}
+        return [
+            name for name in self.sources
+            if self.fingerprint.get(name) is None or self.fingerprint[name] != previous.get(name)
+        ]
+    
+    @property
+    def unchanged(self) -> bool:
+        """Все источники совпадают с предыдущей сверкой"""
+        return not self.changed
+    
+    @property
+    def summary(self) -> Dict[str, Any]:
+        """Итоги предыдущей сверки"""
+        return self.stored['summary'] if self.stored else {}
+    
+    @property
+    def updated_at(self) -> Optional[str]:
+        """Время предыдущей сверки (UTC)"""
+        return self.stored['updated_at'] if self.stored else None
+    
+    async def refresh(self) -> None:
+        """
+        Повторное снятие отпечатков после того, как сверка сама изменила источники
+        
+        Изменения, сделанные другими до этого момента, попадают в новые
+        отпечатки, поэтому после refresh() сверка должна заново проверить
+        расхождения и сохранять состояние, только если их нет
+        """
+        self.fingerprint = await self._collect(self.manager, self.sources)
+    
+    async def save(self, summary: Dict[str, Any]) -> None:
+        """
+        Сохранение состояния после успешной сверки
+        
+        Сохраняются отпечатки, снятые при load() или последнем refresh(): если
+        источник изменился после этого, следующий запуск это увидит
+        
+        Args:
+            summary: Итоги сверки
+        """
+        await SyncStateRepository.save_state(self.manager.server.id, self.task, self.fingerprint, summary)
@@ -0,0 +1,242 @@
+"""
+Модель конфигурации сервера WireGuard (wg0.conf)
+
+Файл разбирается один раз на секции [Interface] и [Peer] с индексами
+по публичному ключу и IP адресу. Исходные строки сохраняются, поэтому
+сериализация обратно в текст не теряет комментарии и форматирование.
+"""
+from typing import Dict, List, Optional
+
+
+class WgSection:
+    """Секция конфигурации ([Interface] или [Peer])"""
+
+    def __init__(self, name: str, lines: List[str]):
+        """
+        Инициализация секции
+
+        Args:
+            name: Имя секции без скобок (Interface, Peer)
+            lines: Исходные строки секции, включая заголовок
+        """
+        self.name = name
+        self.lines = lines
+
+    def get(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        """
+        Получение значения параметра секции
+
+        Args:
+            key: Имя параметра (например, PublicKey)
+            default: Значение по умолчанию
+
+        Returns:
+            Optional[str]: Значение параметра
+        """
+        for line in self.lines[1:]:
+            name, sep, value = line.partition('=')
+            if sep and name.strip() == key:
+                return value.strip()
+        return default
+
+    @property
+    def public_key(self) -> Optional[str]:
+        """Публичный ключ peer'а"""
+        return self.get('PublicKey')
+
+    @property
+    def allowed_ips(self) -> List[str]:
+        """Список AllowedIPs peer'а"""
+        value = self.get('AllowedIPs', '')
+        return [ip.strip() for ip in value.split(',') if ip.strip()]
+
+    @property
+    def addresses(self) -> List[str]:
+        """Список адресов интерфейса"""
+        value = self.get('Address', '')
+        return [ip.strip() for ip in value.split(',') if ip.strip()]
+
+
+class WgServerConfig:
+    """Разобранная конфигурация сервера с индексами peer'ов"""
+
+    def __init__(self, preamble: List[str], sections: List[WgSection]):
+        """
+        Инициализация модели
+
+        Args:
+            preamble: Строки до первой секции
+            sections: Секции конфигурации в исходном порядке
+        """
+        self.preamble = preamble
+        self.sections = sections
+        self._reindex()
+
+    @classmethod
+    def parse(cls, content: str) -> "WgServerConfig":
+        """
+        Разбор текста wg0.conf
+
+        Args:
+            content: Содержимое файла
+
+        Returns:
+            WgServerConfig: Модель конфигурации
+        """
+        preamble: List[str] = []
+        sections: List[WgSection] = []
+
+        for line in content.split('\n'):
+            stripped = line.strip()
+            if stripped.startswith('[') and stripped.endswith(']'):
+                sections.append(WgSection(stripped[1:-1].strip(), [line]))
+            elif sections:
+                sections[-1].lines.append(line)
+            else:
+                preamble.append(line)
+
+        return cls(preamble, sections)
+
+    def _reindex(self) -> None:
+        """Перестроение индексов по публичному ключу и IP"""
+        self.peers: Dict[str, WgSection] = {}
+        self.peers_by_ip: Dict[str, WgSection] = {}
+
+        for section in self.sections:
+            self._index_section(section)
+
+    def _index_section(self, section: WgSection) -> None:
+        """
+        Добавление секции peer'а в индексы
+
+        Args:
+            section: Секция конфигурации
+        """
+        if section.name != 'Peer' or not section.public_key:
+            return
+        self.peers[section.public_key] = section
+        for ip in section.allowed_ips:
+            self.peers_by_ip[ip.split('/')[0]] = section
+
+    @property
+    def interface(self) -> Optional[WgSection]:
+        """Секция [Interface]"""
+        return next((s for s in self.sections if s.name == 'Interface'), None)
+
+    def get_peer(self, public_key: str) -> Optional[WgSection]:
+        """
+        Поиск peer'а по публичному ключу
+
+        Args:
+            public_key: Публичный ключ
+
+        Returns:
+            Optional[WgSection]: Секция peer'а или None
+        """
+        return self.peers.get(public_key)
+
+    def get_peer_by_ip(self, ip: str) -> Optional[WgSection]:
+        """
+        Поиск peer'а по IP адресу
+
+        Args:
+            ip: IP адрес (допускается маска)
+
+        Returns:
+            Optional[WgSection]: Секция peer'а или None
+        """
+        return self.peers_by_ip.get(ip.split('/')[0].strip())
+
+    def used_addresses(self) -> List[str]:
+        """
+        Все адреса, занятые интерфейсом и peer'ами
+
+        Returns:
+            List[str]: Адреса с масками, как в файле
+        """
+        addresses = list(self.interface.addresses) if self.interface else []
+        for peer in self.peers.values():
+            addresses.extend(peer.allowed_ips)
+        return addresses
+
+    def add_peer(self, public_key: str, preshared_key: str, client_ip: str) -> str:
+        """
+        Добавление секции [Peer] в конец конфигурации
+
+        Args:
+            public_key: Публичный ключ клиента
+            preshared_key: Общий ключ
+            client_ip: IP адрес клиента
+
+        Returns:
+            str: Текст добавленной секции для дозаписи в файл
+        """
+        text = (
+            f"\n[Peer]\n"
+            f"PublicKey = {public_key}\n"
+            f"PresharedKey = {preshared_key}\n"
+            f"AllowedIPs = {client_ip}/32\n"
+        )
+        self.append_text(text)
+        return text
+
+    def append_text(self, text: str) -> None:
+        """
+        Учет текста, дописанного в конец файла
+
+        Args:
+            text: Дописанный фрагмент
+        """
+        pieces = text.split('\n')
+        target = self.sections[-1].lines if self.sections else self.preamble
+
+        # Первый фрагмент продолжает последнюю строку файла
+        if target:
+            target[-1] += pieces[0]
+        else:
+            target.append(pieces[0])
+
+        for line in pieces[1:]:
+            stripped = line.strip()
+            if stripped.startswith('[') and stripped.endswith(']'):
+                section = WgSection(stripped[1:-1].strip(), [line])
+                self.sections.append(section)
+                self._index_section(section)
+            elif self.sections:
+                self.sections[-1].lines.append(line)
+            else:
+                self.preamble.append(line)
+
+        # Параметры последней секции могли измениться
+        if self.sections:
+            self._index_section(self.sections[-1])
+
+    def remove_peer(self, public_key: str) -> bool:
+        """
+        Удаление секции [Peer] по публичному ключу
+
+        Args:
+            public_key: Публичный ключ
+
+        Returns:
+            bool: True если peer был найден и удален
+        """
+        section = self.peers.get(public_key)
+        if section is None:
+            return False
+
+        self.sections.remove(section)
+        self._reindex()
+        return True
+
+    def serialize(self) -> str:
+        """
+        Сериализация модели обратно в текст wg0.conf
+
+        Returns:
+            str: Содержимое файла
+        """
+        lines = list(self.preamble)
+        for section in self.sections:
+            lines.extend(section.lines)
+        return '\n'.join(lines)
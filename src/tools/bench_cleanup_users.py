@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Сравнение очистки пользователей без конфигов
+
+Заполняет временную базу пользователями (часть - без конфигов) с историей
+запросов и сравнивает прежнюю очистку (проверка и удаление каждого
+пользователя отдельной транзакцией) с UserRepository.delete_users_without_configs
+(DELETE ... WHERE NOT EXISTS в одной транзакции). Проверяет, что оба способа
+удаляют одних и тех же пользователей.
+"""
+import asyncio
+from pathlib import Path
+import sys
+import tempfile
+import time
+
+# Добавляем корень проекта в путь
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from src.database.repository import UserRepository
+from src.database.models import db
+from src.utils.logger import logger
+
+
+async def seed(users: int, empty_every: int, requests_per_user: int) -> None:
+    """
+    Заполнение базы тестовыми данными
+    
+    Args:
+        users: Количество пользователей
+        empty_every: Каждый N-й пользователь остается без конфигов
+        requests_per_user: Записей истории запросов на пользователя
+    """
+    async with db.write() as conn:
+        await conn.executemany(
+            "INSERT INTO users (telegram_id, username, first_name) VALUES (?, ?, ?)",
+            ((1_000_000 + i, f"bench{i}", f"Bench {i}") for i in range(users))
+        )
+        await conn.executemany(
+            """
+            INSERT INTO configs (user_id, device_type, client_public_key, client_private_key, client_ip, config_name)
+            VALUES (?, 'phone', ?, ?, ?, ?)
+            """,
+            (
+                (i + 1, f"pub{i}", f"priv{i}", f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}", f"bench{i}_phone.conf")
+                for i in range(users)
+                if i % empty_every
+            )
+        )
+        await conn.executemany(
+            "INSERT INTO requests (user_id, device_type, action) VALUES (?, 'phone', 'get_config')",
+            ((i + 1,) for i in range(users) for _ in range(requests_per_user))
+        )
+
+
+async def cleanup_per_user() -> list:
+    """Прежняя очистка: проверка и удаление каждого пользователя отдельно"""
+    deleted = []
+    for user in await UserRepository.get_all_users():
+        async with db.write() as conn:
+            cursor = await conn.execute(
+                "SELECT COUNT(*) FROM configs WHERE user_id = ?",
+                (user['id'],)
+            )
+            count = await cursor.fetchone()
+            
+            if count[0] == 0:
+                await conn.execute("DELETE FROM requests WHERE user_id = ?", (user['id'],))
+                await conn.execute("DELETE FROM users WHERE id = ?", (user['id'],))
+                deleted.append(user.get('username') or user.get('first_name') or f"ID:{user['telegram_id']}")
+    
+    return deleted
+
+
+async def measure(tmp_dir: str, name: str, cleanup, args) -> tuple:
+    """
+    Очистка на отдельной заполненной базе с замером времени
+    
+    Returns:
+        tuple: (время в секундах, имена удаленных пользователей, осталось пользователей)
+    """
+    db.db_path = str(Path(tmp_dir) / f"{name}.db")
+    try:
+        await db.init_db()
+        await seed(args.users, args.empty_every, args.requests)
+        
+        started = time.perf_counter()
+        deleted = await cleanup()
+        elapsed = time.perf_counter() - started
+        
+        async with db.read() as conn:
+            cursor = await conn.execute("SELECT COUNT(*) FROM users")
+            remaining = (await cursor.fetchone())[0]
+    finally:
+        await db.close()
+    
+    return elapsed, deleted, remaining
+
+
+async def main():
+    """Главная функция"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Сравнение очистки пользователей без конфигов')
+    parser.add_argument('--users', type=int, default=10_000, help='Количество пользователей')
+    parser.add_argument('--empty-every', type=int, default=10, help='Каждый N-й пользователь без конфигов')
+    parser.add_argument('--requests', type=int, default=5, help='Записей истории запросов на пользователя')
+    
+    args = parser.parse_args()
+    args.empty_every = max(1, args.empty_every)
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        old_time, old_deleted, old_remaining = await measure(tmp_dir, "per_user", cleanup_per_user, args)
+        new_time, new_deleted, new_remaining = await measure(
+            tmp_dir, "set_based", UserRepository.delete_users_without_configs, args
+        )
+    
+    ok = sorted(old_deleted) == sorted(new_deleted) and old_remaining == new_remaining
+    
+    logger.info("=" * 60)
+    logger.info(f"Пользователей: {args.users}, без конфигов: {len(new_deleted)}")
+    logger.info(f"По одному пользователю: {old_time * 1000:.1f} мс")
+    logger.info(f"Одной транзакцией:      {new_time * 1000:.1f} мс ({old_time / max(new_time, 1e-9):.0f}x)")
+    logger.info("✅ Удалены одни и те же пользователи" if ok else "❌ Результаты различаются")
+    logger.info("=" * 60)
+    
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\n⏹️  Прервано пользователем")
+        sys.exit(0)
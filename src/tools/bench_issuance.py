@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Нагрузочная проверка выдачи конфигов без Docker
+
+Выдает конфиги одновременно через полный путь ConfigGenerator (база,
+ключи, размещение, очереди изменений серверов) на серверах в памяти
+(AWG_BACKEND=fake или SERVERS_FILE с "backend": "fake") и временной базе. Проверяет уникальность IP адресов и отсутствие
+потерянных записей в wg0.conf, на интерфейсе и в clientsTable.
+"""
+import asyncio
+import json
+import os
+from pathlib import Path
+import statistics
+import sys
+import tempfile
+import time
+
+# Добавляем корень проекта в путь
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+# Бенчмарк всегда работает с сервером в памяти
+os.environ["AWG_BACKEND"] = "fake"
+os.environ.setdefault("CLIENT_NETWORK", "10.64.0.0/16")
+os.environ.setdefault("CLIENT_IP_START", "10.64.0.2")
+# Лог бенчмарка выводится только в консоль и не попадает в LOG_FILE бота
+os.environ["LOG_FILE"] = os.devnull
+
+from src.database.repository import ConfigRepository
+from src.database.models import db
+from src.database.request_log import request_log
+from src.services.server_registry import server_registry
+from src.services.config_generator import config_generator
+from src.services.wg_config import WgServerConfig
+from src.utils.logger import logger
+
+
+async def issue_one(index: int, latencies: list) -> None:
+    """Выдача одного конфига с замером времени"""
+    started = time.perf_counter()
+    await config_generator.generate_client_config(
+        telegram_id=1_000_000 + index,
+        username=f"bench{index}",
+        device_type="phone"
+    )
+    latencies.append(time.perf_counter() - started)
+
+
+async def verify(count: int) -> bool:
+    """Проверка состояния серверов и базы после выдачи"""
+    ok = True
+    
+    configs = await ConfigRepository.get_all_configs()
+    if len(configs) != count:
+        logger.error(f"❌ Конфигов в базе: {len(configs)}, ожидалось {count}")
+        ok = False
+    
+    # История запросов записывается пачками и должна быть полной после close()
+    async with db.read() as conn:
+        cursor = await conn.execute("SELECT COUNT(*) FROM requests")
+        logged = (await cursor.fetchone())[0]
+    if logged != count:
+        logger.error(f"❌ Записей в истории запросов: {logged}, ожидалось {count}")
+        ok = False
+    
+    for manager in server_registry:
+        backend = manager.backend
+        server_id = manager.server.id
+        
+        ips = [c['client_ip'] for c in configs if c['server_id'] == server_id]
+        expected = len(ips)
+        if len(set(ips)) != expected:
+            logger.error(f"❌ [{server_id}] Конфигов: {expected}, уникальных IP: {len(set(ips))}")
+            ok = False
+        
+        server_config = WgServerConfig.parse(backend.files[manager.server_config_path])
+        if len(server_config.peers) != expected:
+            logger.error(f"❌ [{server_id}] Peer'ов в wg0.conf: {len(server_config.peers)}, ожидалось {expected}")
+            ok = False
+        
+        if len(backend.peers) != expected:
+            logger.error(f"❌ [{server_id}] Peer'ов на интерфейсе: {len(backend.peers)}, ожидалось {expected}")
+            ok = False
+        
+        clients = json.loads(backend.files.get(manager.clients_table.path, "[]"))
+        if len(clients) != expected:
+            logger.error(f"❌ [{server_id}] Записей в clientsTable: {len(clients)}, ожидалось {expected}")
+            ok = False
+        
+        logger.info(f"[{server_id}] Выдано конфигов: {expected}")
+    
+    return ok
+
+
+async def main():
+    """Главная функция"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Нагрузочная проверка выдачи конфигов на сервере в памяти')
+    parser.add_argument(
+        '--count',
+        type=int,
+        default=200,
+        help='Количество одновременно выдаваемых конфигов'
+    )
+    parser.add_argument(
+        '--latency-ms',
+        type=float,
+        default=0.0,
+        help='Имитация задержки одного обращения к серверу (мс)'
+    )
+    
+    args = parser.parse_args()
+    
+    # SERVERS_FILE может описывать несколько серверов, но только в памяти
+    if any(manager.backend.name != "fake" for manager in server_registry):
+        logger.error("❌ Бенчмарк работает только с серверами в памяти (backend: fake)")
+        sys.exit(1)
+    
+    for manager in server_registry:
+        manager.backend.latency = args.latency_ms / 1000
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db.db_path = str(Path(tmp_dir) / "bench.db")
+        await db.init_db()
+        
+        latencies = []
+        started = time.perf_counter()
+        try:
+            await asyncio.gather(*(issue_one(i, latencies) for i in range(args.count)))
+        finally:
+            await server_registry.close()
+            await request_log.close()
+        elapsed = time.perf_counter() - started
+        
+        try:
+            ok = await verify(args.count)
+        finally:
+            await db.close()
+    
+    latencies.sort()
+    logger.info("=" * 60)
+    logger.info(f"Выдано конфигов: {args.count} за {elapsed:.2f} с ({args.count / elapsed:.1f}/с)")
+    logger.info(
+        f"Время выдачи: медиана {statistics.median(latencies) * 1000:.1f} мс, "
+        f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f} мс"
+    )
+    logger.info(f"Обращений к серверам: {sum(manager.backend.calls for manager in server_registry)}")
+    logger.info("✅ IP адреса уникальны, записи не потеряны" if ok else "❌ Проверка не пройдена")
+    logger.info("=" * 60)
+    
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\n⏹️  Прервано пользователем")
+        sys.exit(0)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Обслуживание базы данных
+Использование: python3 src/tools/maintenance.py [--status | --run | --vacuum]
+
+--run выполняет то же, что периодическая задача бота: сворачивает историю
+запросов старше REQUESTS_RETENTION_DAYS в requests_daily, обновляет
+статистику планировщика и освобождает место. Можно запускать при работающем
+боте.
+"""
+import asyncio
+import sys
+import argparse
+from pathlib import Path
+
+# Добавляем корень проекта в путь
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from src.database import maintenance
+from src.database.models import db
+from src.config.settings import settings
+from src.utils.logger import logger
+
+
+async def show_status():
+    """Показать состояние истории запросов и файла базы"""
+    status = await maintenance.get_status()
+
+    size_mb = status['page_count'] * status['page_size'] / 1024 / 1024
+    free_mb = status['freelist_count'] * status['page_size'] / 1024 / 1024
+    modes = {0: "NONE", 1: "FULL", 2: "INCREMENTAL"}
+
+    print("\n" + "=" * 60)
+    print("📊 Состояние базы данных")
+    print("=" * 60)
+    print(f"Подробная история:  {status['raw_rows']} запросов (с {status['oldest_raw'] or '-'})")
+    print(f"Свернутая история:  {status['daily_requests']} запросов в {status['daily_rows']} строках (с {status['oldest_day'] or '-'})")
+    print(f"Срок хранения:      {settings.REQUESTS_RETENTION_DAYS} дней")
+    print(f"Размер файла:       {size_mb:.1f} МБ, свободно {free_mb:.1f} МБ")
+    print(f"auto_vacuum:        {modes.get(status['auto_vacuum'], status['auto_vacuum'])}")
+    print("=" * 60 + "\n")
+
+    if status['auto_vacuum'] != 2:
+        logger.info("Для освобождения места без полного VACUUM выполните один раз --vacuum")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Обслуживание базы данных бота')
+    parser.add_argument('--status', action='store_true', help='Показать состояние истории и файла базы')
+    parser.add_argument('--run', action='store_true', help='Свернуть старую историю, ANALYZE, incremental_vacuum')
+    parser.add_argument('--vacuum', action='store_true', help='Полный VACUUM с переходом на incremental_vacuum (блокирует запись)')
+    parser.add_argument('--retention-days', type=int, help='Срок хранения подробной истории (по умолчанию REQUESTS_RETENTION_DAYS)')
+    parser.add_argument('--batch-size', type=int, help='Строк в одной транзакции (по умолчанию MAINTENANCE_BATCH_SIZE)')
+
+    args = parser.parse_args()
+
+    try:
+        await db.init_db()
+
+        if args.run:
+            result = await maintenance.run_maintenance(
+                retention_days=args.retention_days,
+                batch_size=args.batch_size,
+                vacuum_pages=0
+            )
+            logger.info(f"✅ Свернуто запросов: {result['rolled_up']}, освобождено страниц: {result['freed_pages']}")
+        elif args.vacuum:
+            logger.info("Выполняется VACUUM, запись в базу заблокирована до завершения...")
+            await maintenance.vacuum()
+            logger.info("✅ VACUUM выполнен")
+        elif args.status:
+            await show_status()
+        else:
+            parser.print_help()
+    finally:
+        await db.close()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\n⏹️  Прервано")
+        sys.exit(0)
@@ -3,10 +3,10 @@
 Скрипт двусторонней синхронизации между базой бота и сервером AmneziaWG
 - Импортирует существующие peer'ы с сервера в базу бота
 - Очищает clientsTable от "мертвых" записей
+Каждый сервер из реестра обрабатывается независимо.
 """
 import asyncio
 import sys
-import json
 import argparse
 from pathlib import Path
 from datetime import datetime
@@ -15,119 +15,112 @@ from datetime import datetime
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
 from src.database.repository import ConfigRepository, UserRepository
-from src.services.awg_manager import awg_manager
+from src.database.models import db
+from src.services.awg_manager import AmneziaWGManager
+from src.services.server_registry import server_registry
+from src.services.sync_state import SyncState, DATABASE
 from src.config.settings import settings
 from src.utils.logger import logger
 
 
-async def get_server_peers():
+# Источники очистки clientsTable и статуса синхронизации
+CLEANUP_SOURCES = ("wg_config", "clients_table")
+STATUS_SOURCES = ("wg_config", "clients_table", DATABASE)
+
+
+async def get_server_peers(manager: AmneziaWGManager):
     """Получить список peer'ов с сервера"""
     try:
-        # Читаем wg0.conf
-        read_cmd = f"docker exec {settings.AWG_CONTAINER} cat {settings.AWG_CONFIG_PATH}/wg0.conf"
-        stdout, stderr, code = await awg_manager._execute_command(read_cmd)
-        
-        if code != 0:
-            logger.error(f"Ошибка чтения конфигурации: {stderr}")
-            return []
+        config = await manager.get_server_config()
         
         peers = []
-        current_peer = {}
-        
-        for line in stdout.split('\n'):
-            line = line.strip()
-            
-            if line.startswith('[Peer]'):
-                if current_peer:
-                    peers.append(current_peer)
-                current_peer = {}
-            elif line.startswith('PublicKey = '):
-                current_peer['public_key'] = line.split('=', 1)[1].strip()
-            elif line.startswith('AllowedIPs = '):
-                current_peer['allowed_ips'] = line.split('=', 1)[1].strip()
-            elif line.startswith('PresharedKey = '):
-                current_peer['preshared_key'] = line.split('=', 1)[1].strip()
+        for public_key, peer in config.peers.items():
+            peers.append({
+                'public_key': public_key,
+                'allowed_ips': peer.get('AllowedIPs', ''),
+                'preshared_key': peer.get('PresharedKey', '')
+            })
         
-        if current_peer:
-            peers.append(current_peer)
-        
-        logger.info(f"На сервере найдено {len(peers)} peer(s)")
+        logger.info(f"[{manager.server.id}] На сервере найдено {len(peers)} peer(s)")
         return peers
         
     except Exception as e:
-        logger.error(f"Ошибка получения peer'ов: {e}")
+        logger.error(f"[{manager.server.id}] Ошибка получения peer'ов: {e}")
         return []
 
 
-async def get_clients_table():
+async def get_clients_table(manager: AmneziaWGManager):
     """Получить clientsTable"""
     try:
-        read_cmd = f"docker exec {settings.AWG_CONTAINER} cat {settings.AWG_CONFIG_PATH}/clientsTable"
-        stdout, stderr, code = await awg_manager._execute_command(read_cmd)
-        
-        if code != 0:
-            return []
-        
-        clients = json.loads(stdout) if stdout else []
-        logger.info(f"В clientsTable {len(clients)} записей")
+        clients = list((await manager.clients_table.get_clients()).values())
+        logger.info(f"[{manager.server.id}] В clientsTable {len(clients)} записей")
         return clients
         
     except Exception as e:
-        logger.error(f"Ошибка чтения clientsTable: {e}")
+        logger.error(f"[{manager.server.id}] Ошибка чтения clientsTable: {e}")
         return []
 
 
-async def cleanup_clients_table():
+async def for_each_server(operation):
+    """Выполнить операцию на всех серверах одновременно"""
+    results = await server_registry.gather(operation)
+    for server_id, result in results.items():
+        if isinstance(result, Exception):
+            logger.error(f"❌ Сервер {server_id} пропущен: {result}")
+
+
+async def cleanup_clients_table(manager: AmneziaWGManager):
     """Очистить clientsTable от мертвых записей"""
-    logger.info("🧹 Очистка clientsTable от мертвых записей...")
+    logger.info(f"🧹 [{manager.server.id}] Очистка clientsTable от мертвых записей...")
+    
+    state = await SyncState.load(manager, "cleanup", CLEANUP_SOURCES)
+    if state.unchanged:
+        logger.info(f"✅ [{manager.server.id}] wg0.conf и clientsTable не изменились с последней очистки")
+        return
     
     # Получаем реальные peer'ы
-    peers = await get_server_peers()
+    peers = await get_server_peers(manager)
     peer_keys = {p['public_key'] for p in peers}
     
-    # Получаем clientsTable
-    clients = await get_clients_table()
-    
-    # Фильтруем только живые
-    alive_clients = [c for c in clients if c.get('clientId') in peer_keys]
-    dead_clients = [c for c in clients if c.get('clientId') not in peer_keys]
+    # Оставляем в clientsTable только живые записи
+    dead_clients = await manager.mutator.retain_clients(peer_keys)
     
     if not dead_clients:
-        logger.info("✅ Нет мертвых записей")
+        logger.info(f"✅ [{manager.server.id}] Нет мертвых записей")
+        await state.save({"removed": 0})
         return
     
-    logger.info(f"Найдено {len(dead_clients)} мертвых записей:")
+    logger.info(f"[{manager.server.id}] Найдено {len(dead_clients)} мертвых записей:")
     for client in dead_clients:
         name = client.get('userData', {}).get('clientName', 'Unknown')
         logger.info(f"  ❌ {name}")
     
-    # Записываем только живые
-    import tempfile
-    import os
+    # Записываем сразу, не дожидаясь отложенной записи
+    _, ok = await manager.clients_table.flush()
     
-    temp_file = tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.json')
-    json.dump(alive_clients, temp_file, indent=4, ensure_ascii=False)
-    temp_file.close()
-    
-    copy_cmd = f"docker cp {temp_file.name} {settings.AWG_CONTAINER}:{settings.AWG_CONFIG_PATH}/clientsTable"
-    stdout, stderr, code = await awg_manager._execute_command(copy_cmd)
-    os.unlink(temp_file.name)
-    
-    if code == 0:
+    if ok:
         logger.info(f"✅ Удалено {len(dead_clients)} мертвых записей из clientsTable")
+        
+        # Очистка сама изменила clientsTable: отпечатки снимаются заново, а
+        # мертвые записи, появившиеся до этого, оставляют очистку на следующий запуск
+        await state.refresh()
+        peer_keys = {p['public_key'] for p in await get_server_peers(manager)}
+        clients = await get_clients_table(manager)
+        if all(client.get('clientId') in peer_keys for client in clients):
+            await state.save({"removed": len(dead_clients)})
     else:
-        logger.error(f"Ошибка записи clientsTable: {stderr}")
+        logger.error("Ошибка записи clientsTable")
 
 
-async def import_peers_to_database():
+async def import_peers_to_database(manager: AmneziaWGManager):
     """Импортировать peer'ы с сервера в базу бота"""
-    logger.info("📥 Импорт peer'ов в базу бота...")
+    logger.info(f"📥 [{manager.server.id}] Импорт peer'ов в базу бота...")
     
     # Получаем peer'ы с сервера
-    peers = await get_server_peers()
+    peers = await get_server_peers(manager)
     
     # Получаем clientsTable для имен
-    clients = await get_clients_table()
+    clients = await get_clients_table(manager)
     clients_dict = {c.get('clientId'): c for c in clients}
     
     # Получаем конфиги из базы
@@ -184,31 +177,54 @@ async def import_peers_to_database():
                 client_public_key=public_key,
                 client_private_key='IMPORTED_NO_PRIVATE_KEY',  # Приватный ключ недоступен
                 client_ip=client_ip,
-                config_name=f"{username}_{device_type}.conf"
+                config_name=f"{username}_{device_type}.conf",
+                server_id=manager.server.id
             )
             logger.info(f"✅ Импортирован: {client_name} ({client_ip})")
             imported += 1
         except Exception as e:
             logger.error(f"Ошибка импорта {client_name}: {e}")
     
-    logger.info(f"\n📊 Итого: импортировано {imported}, пропущено {skipped}")
+    logger.info(f"\n📊 [{manager.server.id}] Итого: импортировано {imported}, пропущено {skipped}")
 
 
-async def show_sync_status():
-    """Показать статус синхронизации"""
+async def show_sync_status(manager: AmneziaWGManager, full: bool = False):
+    """
+    Показать статус синхронизации
+    
+    Если wg0.conf, clientsTable и конфиги сервера в базе не изменились с
+    прошлого показа, выводятся сохраненные итоги без чтения источников.
+    
+    Args:
+        manager: Менеджер сервера
+        full: Всегда читать источники и выводить списки
+    """
     print("\n" + "="*70)
-    print("📊 СТАТУС СИНХРОНИЗАЦИИ")
+    print(f"📊 СТАТУС СИНХРОНИЗАЦИИ: сервер {manager.server.id} ({manager.server.endpoint})")
     print("="*70 + "\n")
     
+    state = await SyncState.load(manager, "status", STATUS_SOURCES)
+    if state.unchanged and not full:
+        summary = state.summary
+        print(f"Источники не изменились с {state.updated_at} UTC (списки: --full)\n")
+        print(f"🔧 На сервере WireGuard: {summary.get('peers', 0)} peer(s)")
+        print(f"📋 В clientsTable: {summary.get('clients', 0)} записей")
+        print(f"💾 В базе бота: {summary.get('configs', 0)} конфигураций")
+        print(f"\n⚠️  НЕСООТВЕТСТВИЯ:")
+        print(f"   • Мертвых записей в clientsTable: {summary.get('dead_clients', 0)}")
+        print(f"   • Peer'ов без записи в базе: {summary.get('missing_in_db', 0)}")
+        print("\n" + "="*70 + "\n")
+        return
+    
     # Сервер
-    peers = await get_server_peers()
+    peers = await get_server_peers(manager)
     print(f"🔧 На сервере WireGuard: {len(peers)} peer(s)")
     for peer in peers:
         ip = peer.get('allowed_ips', 'N/A')
         print(f"   • {peer.get('public_key', 'N/A')[:20]}... ({ip})")
     
     # ClientsTable
-    clients = await get_clients_table()
+    clients = await get_clients_table(manager)
     print(f"\n📋 В clientsTable: {len(clients)} записей")
     peer_keys = {p['public_key'] for p in peers}
     for client in clients:
@@ -218,7 +234,7 @@ async def show_sync_status():
         print(f"   {status} {name}")
     
     # База бота
-    configs = await ConfigRepository.get_all_configs()
+    configs = await ConfigRepository.get_server_configs(manager.server.id)
     print(f"\n💾 В базе бота: {len(configs)} конфигураций")
     for config in configs:
         print(f"   • {config['config_name']} ({config['client_ip']})")
@@ -232,6 +248,16 @@ async def show_sync_status():
     print(f"   • Peer'ов без записи в базе: {len(missing_in_db)}")
     
     print("\n" + "="*70 + "\n")
+    
+    await state.save(
+        {
+            "peers": len(peers),
+            "clients": len(clients),
+            "configs": len(configs),
+            "dead_clients": len(dead_clients),
+            "missing_in_db": len(missing_in_db)
+        }
+    )
 
 
 async def main():
@@ -240,24 +266,34 @@ async def main():
     parser.add_argument('--cleanup', action='store_true', help='Очистить clientsTable от мертвых записей')
     parser.add_argument('--import', dest='import_peers', action='store_true', help='Импортировать peer\'ы в базу бота')
     parser.add_argument('--full-sync', action='store_true', help='Полная синхронизация (cleanup + import)')
+    parser.add_argument('--full', action='store_true', help='Со --status: читать источники и выводить списки, даже если они не изменились')
     
     args = parser.parse_args()
     
-    if args.status:
-        await show_sync_status()
-    elif args.cleanup:
-        await cleanup_clients_table()
-        print("\n✅ Очистка завершена")
-    elif args.import_peers:
-        await import_peers_to_database()
-        print("\n✅ Импорт завершен")
-    elif args.full_sync:
-        await cleanup_clients_table()
-        await import_peers_to_database()
-        print("\n✅ Полная синхронизация завершена")
-        await show_sync_status()
-    else:
-        parser.print_help()
+    try:
+        # Миграции (sync_state, config_revisions), если бот еще не перезапускался
+        await db.init_db()
+        
+        if args.status:
+            for manager in server_registry:
+                await show_sync_status(manager, full=args.full)
+        elif args.cleanup:
+            await for_each_server(cleanup_clients_table)
+            print("\n✅ Очистка завершена")
+        elif args.import_peers:
+            await for_each_server(import_peers_to_database)
+            print("\n✅ Импорт завершен")
+        elif args.full_sync:
+            await for_each_server(cleanup_clients_table)
+            await for_each_server(import_peers_to_database)
+            print("\n✅ Полная синхронизация завершена")
+            for manager in server_registry:
+                await show_sync_status(manager)
+        else:
+            parser.print_help()
+    finally:
+        await server_registry.close()
+        await db.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Проверка счетчиков статистики
+Использование: python3 src/tools/verify_stats.py [--fix]
+
+Сравнивает значения stats_counters, которые поддерживаются триггерами,
+с фактическим количеством строк в users, configs и requests.
+"""
+import asyncio
+import sys
+import argparse
+from pathlib import Path
+
+# Добавляем корень проекта в путь
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from src.database.models import db, STATS_COUNTERS_QUERY
+from src.utils.logger import logger
+
+
+async def find_mismatches() -> dict:
+    """
+    Поиск расхождений счетчиков с фактическими данными
+    
+    Returns:
+        dict: {имя счетчика: (значение счетчика, фактическое значение)}
+    """
+    async with db.read() as conn:
+        cursor = await conn.execute("SELECT name, value FROM stats_counters")
+        counters = {row[0]: row[1] for row in await cursor.fetchall()}
+        
+        cursor = await conn.execute(STATS_COUNTERS_QUERY)
+        actual = {row[0]: row[1] for row in await cursor.fetchall()}
+    
+    mismatches = {}
+    for name in sorted(set(counters) | set(actual)):
+        stored = counters.get(name, 0)
+        real = actual.get(name, 0)
+        if stored != real:
+            mismatches[name] = (stored, real)
+    
+    return mismatches
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Проверка счетчиков статистики')
+    parser.add_argument('--fix', action='store_true', help='Пересчитать счетчики при расхождении')
+    
+    args = parser.parse_args()
+    
+    try:
+        await db.init_db()
+        
+        mismatches = await find_mismatches()
+        if not mismatches:
+            logger.info("✅ Счетчики статистики совпадают с данными")
+            return
+        
+        for name, (stored, real) in mismatches.items():
+            logger.warning(f"❌ {name}: счетчик {stored}, фактически {real}")
+        
+        if not args.fix:
+            logger.info("Для пересчета запустите с --fix")
+            sys.exit(1)
+        
+        await db.rebuild_stats_counters()
+        logger.info("✅ Счетчики пересчитаны")
+    finally:
+        await db.close()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\n⏹️  Прервано")
+        sys.exit(0)
@@ -0,0 +1,71 @@
+"""
+Генерация ключей WireGuard (Curve25519 / X25519) внутри процесса бота
+
+Формат совпадает с выводом `wg genkey` и `wg pubkey`: 32 байта в base64.
+Умножение на точку кривой (RFC 7748) выполняет библиотека cryptography
+(OpenSSL) за постоянное время.
+"""
+import base64
+import os
+from typing import Tuple
+
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+
+
+def _clamp(key: bytes) -> bytes:
+    """
+    Приведение приватного ключа к формату Curve25519 (как делает `wg genkey`)
+
+    Args:
+        key: 32 байта приватного ключа
+
+    Returns:
+        bytes: Ключ с выставленными служебными битами
+    """
+    clamped = bytearray(key)
+    clamped[0] &= 248
+    clamped[31] &= 127
+    clamped[31] |= 64
+    return bytes(clamped)
+
+
+def generate_private_key() -> str:
+    """
+    Генерация приватного ключа (аналог `wg genkey`)
+
+    Returns:
+        str: Приватный ключ в base64
+    """
+    return base64.b64encode(_clamp(os.urandom(32))).decode("ascii")
+
+
+def derive_public_key(private_key: str) -> str:
+    """
+    Вычисление публичного ключа из приватного (аналог `wg pubkey`)
+
+    Args:
+        private_key: Приватный ключ в base64
+
+    Returns:
+        str: Публичный ключ в base64
+
+    Raises:
+        ValueError: Если ключ имеет неверный формат
+    """
+    raw = base64.b64decode(private_key.strip(), validate=True)
+    if len(raw) != 32:
+        raise ValueError("Ключ WireGuard должен содержать 32 байта")
+
+    public = X25519PrivateKey.from_private_bytes(raw).public_key().public_bytes_raw()
+    return base64.b64encode(public).decode("ascii")
+
+
+def generate_keypair() -> Tuple[str, str]:
+    """
+    Генерация пары ключей WireGuard
+
+    Returns:
+        Tuple[str, str]: (private_key, public_key)
+    """
+    private_key = generate_private_key()
+    return private_key, derive_public_key(private_key)
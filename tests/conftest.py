@@ -0,0 +1,45 @@
+"""
+Общие настройки тестов
+
+Тесты работают с серверами в памяти (AWG_BACKEND=fake) и временной базой,
+лог выводится только в консоль. Переменные задаются до импорта настроек.
+"""
+import os
+
+os.environ["AWG_BACKEND"] = "fake"
+os.environ["SERVERS_FILE"] = ""
+os.environ["CLIENT_NETWORK"] = "10.64.0.0/16"
+os.environ["CLIENT_IP_START"] = "10.64.0.2"
+os.environ["LOG_FILE"] = os.devnull
+
+import pytest
+
+from src.database.models import db
+from src.database.request_log import request_log
+from src.services import config_generator as config_generator_module
+from src.services import server_registry as server_registry_module
+from src.services.server_registry import ServerRegistry
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """
+    Временная база данных
+    
+    Каждый тест выполняется в своем цикле событий (asyncio.run), поэтому
+    примитивы синхронизации глобальных объектов создаются заново.
+    """
+    monkeypatch.setattr(db, "db_path", str(tmp_path / "test.db"))
+    monkeypatch.setattr(db, "_open_lock", None)
+    for name in ("_worker", "_full", "_space", "_flush_lock"):
+        monkeypatch.setattr(request_log, name, None)
+    return db
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """Новый реестр с одним сервером в памяти вместо глобального"""
+    registry = ServerRegistry.load()
+    monkeypatch.setattr(server_registry_module, "server_registry", registry)
+    monkeypatch.setattr(config_generator_module, "server_registry", registry)
+    return registry
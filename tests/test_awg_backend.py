@@ -0,0 +1,50 @@
+"""
+Команды ShellBackend (src/services/awg_backend.py)
+
+Вместо контейнера команды выполняет локальный sh, а утилиту wg заменяет
+echo или false.
+"""
+import asyncio
+
+from src.services.awg_backend import ShellBackend
+
+
+class LocalBackend(ShellBackend):
+    """Бэкенд, выполняющий команды в локальном sh"""
+    
+    name = "local"
+    
+    async def run(self, command):
+        process = await asyncio.create_subprocess_shell(
+            command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        stdout, stderr = await process.communicate()
+        return stdout.decode().strip(), stderr.decode().strip(), process.returncode
+    
+    async def read_file(self, path, if_changed_from=None):
+        raise NotImplementedError
+    
+    async def file_fingerprint(self, path):
+        raise NotImplementedError
+    
+    async def write_file(self, path, content):
+        raise NotImplementedError
+    
+    async def append_file(self, path, text):
+        raise NotImplementedError
+
+
+def test_peers_fingerprint_is_none_when_wg_show_fails():
+    async def scenario():
+        return (
+            await LocalBackend(wg_binary="echo").peers_fingerprint(),
+            await LocalBackend(interface="wg1", wg_binary="echo").peers_fingerprint(),
+            await LocalBackend(wg_binary="false").peers_fingerprint()
+        )
+    
+    wg0, wg1, failed = asyncio.run(scenario())
+    
+    assert wg0 and wg1 and wg0 != wg1
+    assert failed is None
@@ -0,0 +1,72 @@
+"""
+Выдача конфигов для всех устройств пользователя (ConfigGenerator.generate_bundle)
+
+Конфиги одного пользователя размещаются на одном сервере одной операцией
+очереди изменений, независимо от окна накопления.
+"""
+import asyncio
+
+from src.database.repository import ConfigRepository
+from src.database.request_log import request_log
+from src.services import config_generator as config_generator_module
+from src.services import server_registry as server_registry_module
+from src.services.config_generator import ConfigGenerator
+from src.services.server_profile import ServerProfile
+from src.services.server_registry import ServerRegistry
+
+
+USERS = 20
+
+SERVER = {"backend": "fake", "endpoint": "203.0.113.1:51820", "public_key": "server", "preshared_key": "psk"}
+
+
+def test_bundle_is_placed_on_one_server_in_one_write(database, monkeypatch):
+    registry = ServerRegistry([
+        ServerProfile.from_dict({**SERVER, "id": "a", "network": "10.64.0.0/16"}),
+        ServerProfile.from_dict({**SERVER, "id": "b", "network": "10.65.0.0/16"})
+    ])
+    monkeypatch.setattr(server_registry_module, "server_registry", registry)
+    monkeypatch.setattr(config_generator_module, "server_registry", registry)
+    
+    writes = []
+    for manager in registry:
+        # Без окна накопления объединение возможно только явной группой
+        manager.mutator.batch_window_ms = 0
+        add_peers_to_server = manager.add_peers_to_server
+        
+        async def record(peers, add_peers_to_server=add_peers_to_server, server_id=manager.server.id):
+            writes.append((server_id, len(peers)))
+            return await add_peers_to_server(peers)
+        
+        manager.add_peers_to_server = record
+    
+    async def scenario():
+        await database.init_db()
+        try:
+            generator = ConfigGenerator()
+            bundles = await asyncio.gather(*(
+                generator.generate_bundle(telegram_id=1_000_000 + i, username=f"test{i}")
+                for i in range(USERS)
+            ))
+            configs = await ConfigRepository.get_all_configs()
+        finally:
+            await registry.close()
+            await request_log.close()
+            await database.close()
+        return bundles, configs
+    
+    bundles, configs = asyncio.run(scenario())
+    
+    assert all(set(bundle) == set(ConfigGenerator.DEVICE_TYPES) for bundle in bundles)
+    assert len(configs) == USERS * 3
+    assert len({config['client_ip'] for config in configs}) == USERS * 3
+    
+    servers_by_user = {}
+    for config in configs:
+        servers_by_user.setdefault(config['user_id'], set()).add(config['server_id'])
+    assert all(len(servers) == 1 for servers in servers_by_user.values())
+    
+    # Пользователи распределены по обоим серверам, каждая запись - целые группы
+    assert {server_id for server_id, _ in writes} == {"a", "b"}
+    assert sum(count for _, count in writes) == USERS * 3
+    assert all(count % 3 == 0 for _, count in writes)
@@ -0,0 +1,67 @@
+"""
+Постоянная shell-сессия (src/services/container_shell.py)
+
+Вместо `docker exec -i <container> sh` запускается локальный sh: протокол
+маркеров и обработка ошибок чтения от этого не меняются.
+"""
+import asyncio
+
+import pytest
+
+from src.services.container_shell import ContainerShell
+
+
+class LocalShell(ContainerShell):
+    """Сессия с локальным sh и маленьким лимитом строки"""
+    
+    STREAM_LIMIT = 1024
+    
+    async def start(self) -> None:
+        self._process = await asyncio.create_subprocess_exec(
+            self.shell,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            limit=self.STREAM_LIMIT
+        )
+
+
+def test_commands_share_one_session():
+    async def scenario():
+        shell = LocalShell("local", timeout=5)
+        try:
+            first = await shell.execute("echo one")
+            process = shell._process
+            second = await shell.execute("echo two >&2; exit 3")
+            return first, second, process is shell._process
+        finally:
+            await shell.close()
+    
+    first, second, same_process = asyncio.run(scenario())
+    
+    assert first == ("one", "", 0)
+    assert second == ("", "two", 3)
+    assert same_process
+
+
+def test_line_longer_than_limit_respawns_session():
+    async def scenario():
+        shell = LocalShell("local", timeout=5)
+        try:
+            await shell.execute("true")
+            process = shell._process
+            
+            with pytest.raises(Exception, match="длиннее 1024 байт"):
+                await shell.execute("head -c 5000 /dev/zero | tr '\\0' a; echo; echo tail")
+            
+            # Остаток длинного ответа не попадает в вывод следующей команды
+            after = await shell.execute("echo ok")
+            return process, shell._process, after
+        finally:
+            await shell.close()
+    
+    old_process, new_process, after = asyncio.run(scenario())
+    
+    assert old_process.returncode is not None
+    assert new_process is not old_process
+    assert after == ("ok", "", 0)
@@ -0,0 +1,214 @@
+"""
+DockerAPIClient против локального HTTP сервера на unix-сокете
+
+Сервер повторяет ответы Docker Engine API: exec create (Content-Length),
+exec start (мультиплексированный поток до закрытия соединения),
+exec inspect (chunked) и archive (tar в теле запроса).
+"""
+import asyncio
+import io
+import json
+import struct
+import tarfile
+from urllib.parse import parse_qs, urlsplit
+
+from src.services.docker_api import DockerAPIClient
+
+
+def frame(stream: int, data: bytes) -> bytes:
+    """Кадр мультиплексированного потока exec"""
+    return struct.pack(">BxxxL", stream, len(data)) + data
+
+
+class FakeDockerServer:
+    """Минимальный Docker Engine API на unix-сокете"""
+    
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+        self.connections = 0
+        self.requests = []
+        self.execs = {}
+        self.files = {}
+        self._server = None
+        self._writers = set()
+    
+    async def start(self) -> None:
+        self._server = await asyncio.start_unix_server(self._handle, self.socket_path)
+    
+    async def stop(self) -> None:
+        self.drop_connections()
+        self._server.close()
+        await self._server.wait_closed()
+    
+    def drop_connections(self) -> None:
+        """Закрытие открытых соединений без Connection: close (как при перезапуске Docker)"""
+        for writer in list(self._writers):
+            writer.close()
+    
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        self._writers.add(writer)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                
+                self.requests.append((method, target))
+                if not await self._respond(method, target, body, writer):
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+    
+    @staticmethod
+    def _send(writer: asyncio.StreamWriter, status: str, body: bytes = b"", chunked: bool = False) -> None:
+        if chunked:
+            head = f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nTransfer-Encoding: chunked\r\n\r\n"
+            half = len(body) // 2
+            payload = b"".join(
+                f"{len(part):x}\r\n".encode() + part + b"\r\n"
+                for part in (body[:half], body[half:]) if part
+            ) + b"0\r\n\r\n"
+        else:
+            head = f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n"
+            payload = body
+        writer.write(head.encode("latin-1") + payload)
+    
+    async def _respond(self, method: str, target: str, body: bytes, writer: asyncio.StreamWriter) -> bool:
+        """
+        Ответ на запрос
+        
+        Returns:
+            bool: Можно ли читать следующий запрос по этому соединению
+        """
+        url = urlsplit(target)
+        parts = url.path.strip("/").split("/")[1:]
+        
+        if method == "POST" and parts[0] == "containers" and parts[2] == "exec":
+            exec_id = f"exec{len(self.execs) + 1}"
+            self.execs[exec_id] = json.loads(body)["Cmd"]
+            self._send(writer, "201 Created", json.dumps({"Id": exec_id}).encode())
+        
+        elif method == "POST" and parts[0] == "exec" and parts[2] == "start":
+            command = self.execs[parts[1]][-1]
+            # Поток exec: кадры stdout и stderr вперемешку, тело до закрытия соединения
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: application/vnd.docker.raw-stream\r\n\r\n"
+                + frame(1, f"out:{command}\n".encode())
+                + frame(2, b"warn\n")
+                + frame(1, b"done\n")
+            )
+            await writer.drain()
+            return False
+        
+        elif method == "GET" and parts[0] == "exec" and parts[2] == "json":
+            command = self.execs[parts[1]][-1]
+            exit_code = 3 if "fail" in command else 0
+            self._send(writer, "200 OK", json.dumps({"ExitCode": exit_code}).encode(), chunked=True)
+        
+        elif method == "PUT" and parts[0] == "containers" and parts[2] == "archive":
+            directory = parse_qs(url.query)["path"][0]
+            with tarfile.open(fileobj=io.BytesIO(body)) as tar:
+                for member in tar.getmembers():
+                    self.files[f"{directory}/{member.name}"] = (tar.extractfile(member).read(), member.mode)
+            self._send(writer, "200 OK")
+        
+        else:
+            self._send(writer, "404 Not Found", json.dumps({"message": "page not found"}).encode())
+        
+        await writer.drain()
+        return True
+
+
+def run(tmp_path, scenario):
+    """Выполнение сценария с запущенным сервером и клиентом"""
+    async def main():
+        server = FakeDockerServer(str(tmp_path / "docker.sock"))
+        await server.start()
+        client = DockerAPIClient("amnezia-awg", socket_path=server.socket_path, timeout=5)
+        try:
+            return await scenario(server, client)
+        finally:
+            await client.close()
+            await server.stop()
+    
+    return asyncio.run(main())
+
+
+def test_exec_create_start_inspect_demuxes_streams(tmp_path):
+    async def scenario(server, client):
+        ok = await client.execute("echo hi")
+        failed = await client.execute("fail")
+        return server, ok, failed
+    
+    server, ok, failed = run(tmp_path, scenario)
+    
+    assert ok == ("out:echo hi\ndone", "warn", 0)
+    assert failed == ("out:fail\ndone", "warn", 3)
+    assert server.execs["exec1"] == ["sh", "-c", "echo hi"]
+    assert [method for method, _ in server.requests[:3]] == ["POST", "POST", "GET"]
+    assert server.requests[0][1].startswith(f"/{DockerAPIClient.API_VERSION}/containers/amnezia-awg/exec")
+
+
+def test_keep_alive_reuses_connection(tmp_path):
+    async def scenario(server, client):
+        for _ in range(3):
+            await client.execute("true")
+        return server.connections
+    
+    # Одно постоянное соединение для create/inspect и по одному на каждый exec start
+    assert run(tmp_path, scenario) == 1 + 3
+
+
+def test_reconnects_after_server_closes_connection(tmp_path):
+    async def scenario(server, client):
+        await client.execute("first")
+        server.drop_connections()
+        await asyncio.sleep(0.05)
+        second = await client.execute("second")
+        return server.connections, second
+    
+    connections, second = run(tmp_path, scenario)
+    
+    assert second == ("out:second\ndone", "warn", 0)
+    # Первый exec: 2 соединения, второй: новое постоянное и поток
+    assert connections == 4
+
+
+def test_put_archive_and_atomic_write(tmp_path):
+    async def scenario(server, client):
+        await client.put_archive("/opt/amnezia/awg", "clientsTable", b"[]\n", mode=0o640)
+        result = await client.write_file("/opt/amnezia/awg/wg0.conf", "[Interface]")
+        return server, result
+    
+    server, result = run(tmp_path, scenario)
+    
+    assert server.files["/opt/amnezia/awg/clientsTable"] == (b"[]\n", 0o640)
+    assert server.files["/opt/amnezia/awg/wg0.conf.tmp"] == (b"[Interface]\n", 0o600)
+    assert result[2] == 0
+    assert server.execs["exec1"][-1] == "mv -f /opt/amnezia/awg/wg0.conf.tmp /opt/amnezia/awg/wg0.conf"
+
+
+def test_api_error_message(tmp_path):
+    async def scenario(server, client):
+        client.container = "missing/name"
+        status, _, body = await client.request("GET", "/unknown")
+        return status, client._error("проверка", status, body)
+    
+    status, error = run(tmp_path, scenario)
+    
+    assert status == 404
+    assert str(error) == "Docker API: проверка (404): page not found"
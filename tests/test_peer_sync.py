@@ -0,0 +1,104 @@
+"""
+Сверка peer'ов сервера с базой бота (src/services/peer_sync.py)
+
+Проверяется, что peer'ы, пропавшие во время восстановления, не считаются
+обработанными: состояние сверки не сохраняется, и следующий запуск их
+восстанавливает. Очистка пустых пользователей не трогает пользователей,
+которым еще выдается первый конфиг.
+"""
+import asyncio
+
+from src.database.repository import SyncStateRepository, UserRepository
+from src.database.request_log import request_log
+from src.services.config_generator import ConfigGenerator
+from src.services.peer_sync import cleanup_empty_users, sync_server
+
+
+COUNT = 6
+
+
+def test_peer_lost_during_restore_is_synced_again(database, registry):
+    manager = registry.default
+    backend = manager.backend
+    
+    async def scenario():
+        await database.init_db()
+        try:
+            generator = ConfigGenerator()
+            for i in range(COUNT):
+                await generator.generate_client_config(telegram_id=1_000_000 + i, username=f"test{i}", device_type="phone")
+            await manager.clients_table.flush()
+            
+            # Перезапуск контейнера очистил интерфейс
+            backend.peers.clear()
+            
+            # Во время восстановления один peer снова пропадает с интерфейса
+            restore_peers = manager.mutator.restore_peers
+            
+            async def restore_and_lose_one(peers):
+                results = await restore_peers(peers)
+                backend.peers.pop(peers[0]['public_key'])
+                manager.mutator.restore_peers = restore_peers
+                return results
+            
+            manager.mutator.restore_peers = restore_and_lose_one
+            
+            first = await sync_server(manager)
+            saved_after_first = await SyncStateRepository.get_state(manager.server.id, "sync")
+            second = await sync_server(manager)
+            third = await sync_server(manager)
+            interface = set(backend.peers)
+        finally:
+            await registry.close()
+            await request_log.close()
+            await database.close()
+        return first, saved_after_first, second, third, interface
+    
+    first, saved_after_first, second, third, interface = asyncio.run(scenario())
+    
+    assert len(first['restored']) == COUNT
+    assert saved_after_first is None
+    assert len(second['restored']) == 1
+    assert third == {"restored": [], "deleted": [], "failed": {}}
+    assert len(interface) == COUNT
+
+
+def test_cleanup_keeps_new_and_active_users(database, registry):
+    async def scenario():
+        await database.init_db()
+        try:
+            ids = {}
+            for name in ("old", "new", "active", "with_config"):
+                ids[name] = await UserRepository.create_user(telegram_id=len(ids) + 1, username=name)
+            
+            # Все, кроме new, созданы час назад
+            async with database.write() as conn:
+                await conn.execute(
+                    "UPDATE users SET created_at = datetime('now', '-1 hour') WHERE username != 'new'"
+                )
+            await ConfigGenerator().generate_client_config(telegram_id=4, username="with_config", device_type="phone")
+            
+            # Событие в буфере истории пустого пользователя
+            await request_log.log(ids["old"], "phone", "existing_config")
+            
+            deleted = await cleanup_empty_users(exclude_telegram_ids=[3])
+            await request_log.flush()
+            
+            async with database.read() as conn:
+                cursor = await conn.execute("SELECT username FROM users ORDER BY id")
+                remaining = [row[0] for row in await cursor.fetchall()]
+                cursor = await conn.execute(
+                    "SELECT COUNT(*) FROM requests WHERE user_id NOT IN (SELECT id FROM users)"
+                )
+                orphans = (await cursor.fetchone())[0]
+        finally:
+            await registry.close()
+            await request_log.close()
+            await database.close()
+        return deleted, remaining, orphans
+    
+    deleted, remaining, orphans = asyncio.run(scenario())
+    
+    assert deleted == ["old"]
+    assert remaining == ["new", "active", "with_config"]
+    assert orphans == 0
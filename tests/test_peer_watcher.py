@@ -0,0 +1,115 @@
+"""
+Опрос отпечатков в PeerWatcher (src/services/peer_watcher.py)
+
+Пока файлы сервера не меняются, интервал их проверки растет до предельного
+и сбрасывается после изменения. Peer'ы интерфейса опрашиваются с базовым
+интервалом всегда, поэтому очищенный интерфейс простаивающего сервера
+восстанавливается в пределах одного интервала.
+"""
+import asyncio
+
+from src.database.request_log import request_log
+from src.services.config_generator import ConfigGenerator
+from src.services.peer_sync import sync_server
+from src.services.peer_watcher import PeerWatcher
+
+
+COUNT = 5
+
+
+class FakeManager:
+    """Менеджер, отпечатки которого меняются вручную"""
+    
+    def __init__(self):
+        self.server = type("Server", (), {"id": "test", "host_config_path": ""})()
+        self.backend = type("Backend", (), {"name": "fake"})()
+        self.versions = {"wg_config": 0, "clients_table": 0, "interface": 0}
+        self.file_polls = []
+        self.interface_polls = []
+    
+    async def get_fingerprint(self, sources=None):
+        now = asyncio.get_running_loop().time()
+        names = list(self.versions) if sources is None else list(sources)
+        if "wg_config" in names:
+            self.file_polls.append(now)
+        if "interface" in names:
+            self.interface_polls.append(now)
+        return {name: self.versions[name] for name in names}
+
+
+def test_file_checks_back_off_while_idle_and_reset_on_change():
+    manager = FakeManager()
+    reconciled = []
+    
+    async def reconcile(manager):
+        reconciled.append(dict(manager.versions))
+    
+    async def scenario():
+        watcher = PeerWatcher([manager], reconcile, poll_interval=0.01, max_poll_interval=0.08)
+        task = asyncio.create_task(watcher.run())
+        
+        await asyncio.sleep(0.5)
+        idle_file_polls = list(manager.file_polls)
+        idle_interface_polls = list(manager.interface_polls)
+        
+        manager.versions["wg_config"] = 1
+        await asyncio.sleep(0.15)
+        
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return idle_file_polls, idle_interface_polls
+    
+    idle_file_polls, idle_interface_polls = asyncio.run(scenario())
+    
+    gaps = [b - a for a, b in zip(idle_file_polls, idle_file_polls[1:])]
+    # Файлы без изменений: 0.02, 0.04, 0.08, 0.08... вместо проверки каждые 0.01 с
+    assert len(idle_file_polls) < 14
+    assert gaps[-1] >= 0.07
+    assert max(gaps) < 0.12
+    # Интерфейс опрашивается с базовым интервалом
+    assert len(idle_interface_polls) > 25
+    assert len(reconciled) == 2 and reconciled[-1]["wg_config"] == 1
+    # После изменения интервал проверки файлов снова минимальный
+    assert len(manager.file_polls) - len(idle_file_polls) >= 4
+
+
+def test_wiped_interface_of_idle_server_is_restored_within_poll_interval(database, registry):
+    manager = registry.default
+    backend = manager.backend
+    poll_interval = 0.1
+    
+    async def scenario():
+        await database.init_db()
+        try:
+            generator = ConfigGenerator()
+            for i in range(COUNT):
+                await generator.generate_client_config(telegram_id=1_000_000 + i, username=f"test{i}", device_type="phone")
+            await manager.clients_table.flush()
+            
+            watcher = PeerWatcher([manager], sync_server, poll_interval=poll_interval, max_poll_interval=10)
+            task = asyncio.create_task(watcher.run())
+            
+            # Сервер простаивает, интервал проверки файлов успел вырасти
+            await asyncio.sleep(1.0)
+            
+            loop = asyncio.get_running_loop()
+            wiped_at = loop.time()
+            backend.peers.clear()
+            while len(backend.peers) < COUNT and loop.time() - wiped_at < 3:
+                await asyncio.sleep(0.01)
+            elapsed = loop.time() - wiped_at
+            
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            restored = len(backend.peers)
+        finally:
+            await registry.close()
+            await request_log.close()
+            await database.close()
+        return restored, elapsed
+    
+    restored, elapsed = asyncio.run(scenario())
+    
+    assert restored == COUNT
+    # Один базовый интервал опроса и время самой сверки
+    assert elapsed < poll_interval * 2
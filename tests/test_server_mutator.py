@@ -0,0 +1,155 @@
+"""
+Одновременная выдача конфигов через ConfigGenerator и ServerMutator
+
+Проверяется, что при сотнях одновременных запросов адреса не повторяются,
+а wg0.conf, интерфейс, clientsTable и база содержат одни и те же peer'ы,
+в том числе после отложенной записи clientsTable. Адрес удаленного peer'а
+не выдается повторно, пока на него ссылается запись в базе.
+"""
+import asyncio
+import json
+
+from src.database.repository import ConfigRepository
+from src.database.request_log import request_log
+from src.services.config_generator import ConfigGenerator
+from src.services.peer_sync import sync_server
+from src.services.wg_config import WgServerConfig
+
+
+COUNT = 300
+
+
+async def issue(generator: ConfigGenerator, count: int, offset: int = 0) -> None:
+    """Одновременная выдача count конфигов разным пользователям"""
+    await asyncio.gather(*(
+        generator.generate_client_config(
+            telegram_id=1_000_000 + offset + i,
+            username=f"test{offset + i}",
+            device_type="phone"
+        )
+        for i in range(count)
+    ))
+
+
+def server_state(manager) -> dict:
+    """Публичные ключи peer'ов в wg0.conf, на интерфейсе и в clientsTable"""
+    backend = manager.backend
+    server_config = WgServerConfig.parse(backend.files[manager.server_config_path])
+    clients = json.loads(backend.files.get(manager.clients_table.path, "[]"))
+    return {
+        "wg_config": set(server_config.peers),
+        "interface": set(backend.peers),
+        "clients_table": {client['clientId'] for client in clients}
+    }
+
+
+def test_concurrent_issuance_keeps_sources_consistent(database, registry):
+    manager = registry.default
+    manager.clients_table.flush_delay = 0.05
+    
+    async def scenario():
+        await database.init_db()
+        try:
+            await issue(ConfigGenerator(), COUNT)
+            configs = await ConfigRepository.get_all_configs()
+            
+            # Отложенная запись clientsTable без принудительного flush()
+            await asyncio.sleep(0.3)
+            state = server_state(manager)
+        finally:
+            await registry.close()
+            await request_log.close()
+            await database.close()
+        return configs, state
+    
+    configs, state = asyncio.run(scenario())
+    
+    ips = [config['client_ip'] for config in configs]
+    keys = {config['client_public_key'] for config in configs}
+    
+    assert len(configs) == COUNT
+    assert len(set(ips)) == COUNT
+    assert state["wg_config"] == keys
+    assert state["interface"] == keys
+    assert state["clients_table"] == keys
+
+
+def test_concurrent_removal_does_not_lose_other_peers(database, registry):
+    manager = registry.default
+    generator = ConfigGenerator()
+    
+    async def scenario():
+        await database.init_db()
+        try:
+            await issue(generator, COUNT)
+            configs = await ConfigRepository.get_all_configs()
+            removed = {config['client_public_key'] for config in configs[::3]}
+            
+            # Удаление части peer'ов одновременно с новой выдачей
+            await asyncio.gather(
+                issue(generator, COUNT // 2, offset=COUNT),
+                *(manager.mutator.remove_peers([key]) for key in removed)
+            )
+            configs = await ConfigRepository.get_all_configs()
+            
+            # Сверка удаляет из базы конфиги peer'ов, удаленных с сервера
+            await manager.clients_table.flush()
+            synced = await sync_server(manager)
+            remaining = await ConfigRepository.get_all_configs()
+        finally:
+            await registry.close()
+            await request_log.close()
+            await database.close()
+        return configs, removed, synced, remaining, server_state(manager)
+    
+    configs, removed, synced, remaining, state = asyncio.run(scenario())
+    
+    # Пока конфиги удаленных peer'ов в базе, их адреса не выдаются повторно
+    ips = [config['client_ip'] for config in configs]
+    assert len(configs) == COUNT + COUNT // 2
+    assert len(set(ips)) == len(ips)
+    
+    expected = {config['client_public_key'] for config in configs} - removed
+    assert len(synced['deleted']) == len(removed)
+    assert synced['restored'] == []
+    assert {config['client_public_key'] for config in remaining} == expected
+    assert state["wg_config"] == expected
+    assert state["interface"] == expected
+    assert state["clients_table"] == expected
+
+
+def test_consistency_check_does_not_race_with_issuance(database, registry):
+    manager = registry.default
+    backend = manager.backend
+    backend.latency = 0.001
+    syncs = []
+    sync_config = backend.sync_config
+    
+    async def record(config_path):
+        syncs.append(config_path)
+        await sync_config(config_path)
+    
+    backend.sync_config = record
+    
+    async def scenario():
+        await database.init_db()
+        try:
+            async def check_repeatedly():
+                results = []
+                for _ in range(20):
+                    results.append(await manager.mutator.check_consistency())
+                    await asyncio.sleep(0.002)
+                return results
+            
+            _, results = await asyncio.gather(issue(ConfigGenerator(), COUNT // 3), check_repeatedly())
+        finally:
+            await registry.close()
+            await request_log.close()
+            await database.close()
+        return results
+    
+    results = asyncio.run(scenario())
+    
+    # Проверка между изменениями не видит расхождений и не запускает syncconf
+    assert all(results)
+    assert syncs == []
@@ -0,0 +1,68 @@
+"""
+Модель wg0.conf (src/services/wg_config.py)
+
+Сериализация должна совпадать с файлом байт в байт после дозаписи и
+удаления peer'ов, иначе собственная запись бота выглядит как внешнее
+изменение wg0.conf.
+"""
+import asyncio
+
+from src.database.request_log import request_log
+from src.services.config_generator import ConfigGenerator
+from src.services.wg_config import WgServerConfig
+
+
+SERVER_CONFIG = (
+    "[Interface]\n"
+    "PrivateKey = server\n"
+    "Address = 10.64.0.1/16\n"
+    "ListenPort = 51820\n"
+)
+
+
+def test_appended_peers_serialize_like_the_file():
+    content = SERVER_CONFIG
+    config = WgServerConfig.parse(content)
+    
+    for i in range(3):
+        content += config.add_peer(f"key{i}", "psk", f"10.64.0.{i + 2}")
+    
+    assert "\n\n[Peer]\nPublicKey = key0\n" in content
+    assert config.serialize() == content
+    assert WgServerConfig.parse(content).serialize() == content
+    
+    config.remove_peer("key1")
+    assert config.serialize() == SERVER_CONFIG + (
+        "\n[Peer]\nPublicKey = key0\nPresharedKey = psk\nAllowedIPs = 10.64.0.2/32\n"
+        "\n[Peer]\nPublicKey = key2\nPresharedKey = psk\nAllowedIPs = 10.64.0.4/32\n"
+    )
+
+
+def test_own_writes_do_not_look_like_external_changes(database, registry):
+    manager = registry.default
+    backend = manager.backend
+    
+    async def scenario():
+        await database.init_db()
+        try:
+            generator = ConfigGenerator()
+            for i in range(5):
+                await generator.generate_client_config(telegram_id=1_000_000 + i, username=f"test{i}", device_type="phone")
+            allocator = manager.allocator
+            
+            # Изменились только метаданные файла (touch, копирование)
+            backend._touch(manager.server_config_path)
+            config = await manager.get_server_config()
+            file_content = backend.files[manager.server_config_path]
+        finally:
+            await registry.close()
+            await request_log.close()
+            await database.close()
+        return allocator, config, file_content
+    
+    allocator, config, file_content = asyncio.run(scenario())
+    
+    assert allocator is not None
+    assert manager.allocator is allocator
+    assert config.serialize() == file_content
+    assert "\n\n[Peer]\n" in file_content
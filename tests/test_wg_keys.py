@@ -0,0 +1,46 @@
+"""
+Ключи WireGuard (src/utils/wg_keys.py) по тестовым векторам RFC 7748
+"""
+import base64
+
+import pytest
+
+from src.utils import wg_keys
+
+
+# RFC 7748, раздел 6.1: пары ключей Alice и Bob
+RFC7748_KEYPAIRS = [
+    (
+        "77076d0a7318a57d3c16c17251b26645df4c2f87ebc0992ab177fba51db92c2a",
+        "8520f0098930a754748b7ddcb43ef75a0dbf3a0d26381af4eba4a98eaa9b4e6a",
+    ),
+    (
+        "5dab087e624a8a4b79e17f8b83800ee66f3bb1292618b6fd1c2f8b27ff88e0eb",
+        "de9edb7d7b7dc1b4d35b61c2ece435373f8343c85b78674dadfc7e146f882b4f",
+    ),
+]
+
+
+def b64(hex_key: str) -> str:
+    return base64.b64encode(bytes.fromhex(hex_key)).decode("ascii")
+
+
+@pytest.mark.parametrize("private_hex, public_hex", RFC7748_KEYPAIRS)
+def test_derive_public_key_matches_rfc7748(private_hex, public_hex):
+    assert wg_keys.derive_public_key(b64(private_hex)) == b64(public_hex)
+
+
+def test_generated_keypair_is_clamped_like_wg_genkey():
+    private_key, public_key = wg_keys.generate_keypair()
+    raw = base64.b64decode(private_key)
+    
+    assert len(raw) == 32
+    assert raw[0] & 7 == 0
+    assert raw[31] & 0xC0 == 0x40
+    assert wg_keys.derive_public_key(private_key) == public_key
+    assert len(base64.b64decode(public_key)) == 32
+
+
+def test_invalid_key_is_rejected():
+    with pytest.raises(ValueError):
+        wg_keys.derive_public_key(base64.b64encode(b"short").decode("ascii"))